@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Cohort analytics over a students x subjects marks matrix
+
+Loads every theory and lab mark of a term once into dense NumPy arrays and
+computes SGPA, pass/fail, ranks, percentiles, subject statistics,
+subject-to-subject correlations and at-risk cohorts with vectorised
+operations. Matrices are cached per term until the term's TermVersion
+token changes (i.e. until the next import or revaluation), so whole-cohort
+reports after the first load are a few milliseconds.
+
+    python analytics.py --year 1 --semester 1
+"""
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select, literal
+
+from app import app, db
+from models import Student, Enrollment, Subject, TheorySubject, LabCourse, TermVersion
+
+GRADE_POINTS = {'S': 10, 'A': 9, 'B': 8, 'C': 7, 'D': 6, 'E': 5, 'F': 0}
+
+# At-risk thresholds
+BORDERLINE_MARKS = (40, 45)
+LOW_SGPA = 6.0
+
+
+class TermMatrix:
+    """Marks of one term as aligned NumPy arrays (rows: students, columns: subjects)"""
+
+    def __init__(self, year, semester, version, student_ids, names, subjects, marks, grade_points):
+        self.year = year
+        self.semester = semester
+        self.version = version
+        self.student_ids = student_ids            # list of roll numbers, row order
+        self.names = names
+        self.subjects = subjects                  # list of (code, name, is_lab, credits), column order
+        self.row_of = {sid: i for i, sid in enumerate(student_ids)}
+        self.marks = marks                        # float32, NaN where a student has no row
+        self.grade_points = grade_points          # int8, -1 where a student has no row
+        self.credits = np.array([credits for _, _, _, credits in subjects], dtype=np.float64)
+        self._compute()
+
+    @classmethod
+    def load(cls, year, semester):
+        """Build the matrix for a term with two queries"""
+        version = TermVersion.token(year, semester)
+        term = (Enrollment.year == year) & (Enrollment.semester == semester)
+        students = db.session.execute(
+            select(Enrollment.id, Student.student_id, Student.name).join(Student).where(term)
+            .order_by(Student.student_id)).all()
+        rows = db.session.execute(
+            select(TheorySubject.enrollment_id, Subject.code, Subject.name,
+                   TheorySubject.marks, TheorySubject.grade, literal(False), Subject.credits)
+            .join(Enrollment, Enrollment.id == TheorySubject.enrollment_id)
+            .join(Subject, Subject.id == TheorySubject.subject_id).where(term)
+            .union_all(
+                select(LabCourse.enrollment_id, Subject.code, Subject.name,
+                       LabCourse.total_marks, LabCourse.grade, literal(True), Subject.credits)
+                .join(Enrollment, Enrollment.id == LabCourse.enrollment_id)
+                .join(Subject, Subject.id == LabCourse.subject_id).where(term))).all()
+
+        student_ids = [r[1] for r in students]
+        names = [r[2] for r in students]
+        row_of = {r[0]: i for i, r in enumerate(students)}  # enrollment id -> row
+
+        subjects = sorted({(r[1], r[2], bool(r[5]), r[6]) for r in rows}, key=lambda s: (s[2], s[0]))
+        col_of = {s[0]: j for j, s in enumerate(subjects)}
+
+        marks = np.full((len(student_ids), len(subjects)), np.nan, dtype=np.float32)
+        grade_points = np.full(marks.shape, -1, dtype=np.int8)
+        if rows:
+            r_idx = np.fromiter((row_of[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+            c_idx = np.fromiter((col_of[r[1]] for r in rows), dtype=np.int64, count=len(rows))
+            marks[r_idx, c_idx] = np.fromiter((r[3] for r in rows), dtype=np.float32, count=len(rows))
+            grade_points[r_idx, c_idx] = np.fromiter((GRADE_POINTS.get(r[4], 0) for r in rows),
+                                                     dtype=np.int8, count=len(rows))
+        return cls(year, semester, version, student_ids, names, subjects, marks, grade_points)
+
+    def _compute(self):
+        present = self.grade_points >= 0
+        failed = present & (self.grade_points == 0)
+        earning = self.grade_points > 0
+
+        # Same rule as Student.calculate_cgpa: failed subjects carry no credits
+        earned_credits = (earning * self.credits).sum(axis=1)
+        weighted = (np.where(earning, self.grade_points, 0) * self.credits).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.sgpa = np.round(np.where(earned_credits > 0, weighted / earned_credits, 0.0), 2)
+            counted = present.sum(axis=1)
+            self.total_marks = np.nansum(self.marks, axis=1, dtype=np.float64)
+            self.percentage = np.round(np.where(counted > 0, self.total_marks / (counted * 100) * 100, 0.0), 2)
+
+        self.fail_counts = failed.sum(axis=1)
+        self.passed = self.fail_counts == 0
+
+        # Competition ranking (ties share a rank): passed students first, then by SGPA.
+        # SGPA ignores failed subjects, so without the pass key a failing student could top the class.
+        n = len(self.sgpa)
+        self.rank_key = self.sgpa + np.where(self.passed, 100.0, 0.0)
+        ordered = np.sort(self.rank_key)
+        self.rank = n - np.searchsorted(ordered, self.rank_key, side='right') + 1
+
+        # Percentile rank of SGPA within the class
+        ascending = np.sort(self.sgpa)
+        below = np.searchsorted(ascending, self.sgpa, side='left')
+        at_or_below = np.searchsorted(ascending, self.sgpa, side='right')
+        self.percentile = np.round((below + 0.5 * (at_or_below - below)) / n * 100, 1) if n else self.sgpa
+
+    def class_statistics(self):
+        """Same numbers as routes.get_class_statistics used to compute student by student"""
+        total = len(self.student_ids)
+        passed = int(self.passed.sum())
+        positive = self.sgpa[self.sgpa > 0]
+        return {
+            'total_students': total,
+            'passed': passed,
+            'failed': total - passed,
+            'average_cgpa': round(float(positive.mean()), 2) if positive.size else 0.0,
+        }
+
+    def subject_statistics(self):
+        stats = []
+        with np.errstate(invalid='ignore'):
+            for j, (code, name, is_lab, credits) in enumerate(self.subjects):
+                column = self.marks[:, j]
+                taken = ~np.isnan(column)
+                values = column[taken]
+                fails = int((self.grade_points[:, j] == 0).sum())
+                stats.append({
+                    'code': code,
+                    'name': name,
+                    'type': 'lab' if is_lab else 'theory',
+                    'credits': credits,
+                    'students': int(taken.sum()),
+                    'mean': round(float(values.mean()), 2) if values.size else None,
+                    'std': round(float(values.std()), 2) if values.size else None,
+                    'min': int(values.min()) if values.size else None,
+                    'max': int(values.max()) if values.size else None,
+                    'failed': fails,
+                    'pass_rate': round(1 - fails / values.size, 4) if values.size else None,
+                })
+        return stats
+
+    def correlations(self):
+        """Pearson correlation between subjects' marks (missing marks filled with the subject mean)"""
+        if not self.subjects or len(self.student_ids) < 2:
+            return []
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.nanmean(self.marks, axis=0)
+            filled = np.where(np.isnan(self.marks), means, self.marks)
+            matrix = np.corrcoef(filled, rowvar=False)
+        matrix = np.atleast_2d(matrix)
+        return [[None if np.isnan(v) else round(float(v), 3) for v in row] for row in matrix]
+
+    def at_risk(self):
+        """Student ids of cohorts that need follow-up"""
+        lo, hi = BORDERLINE_MARKS
+        with np.errstate(invalid='ignore'):
+            borderline = ((self.marks >= lo) & (self.marks < hi)).any(axis=1)
+        ids = np.array(self.student_ids, dtype=object)
+        return {
+            'multiple_failures': ids[self.fail_counts >= 2].tolist(),
+            'single_failure': ids[self.fail_counts == 1].tolist(),
+            'borderline_pass': ids[self.passed & borderline].tolist(),
+            'low_sgpa': ids[self.passed & (self.sgpa < LOW_SGPA)].tolist(),
+        }
+
+    def student_summary(self, student_id):
+        i = self.row_of.get(student_id)
+        if i is None:
+            return None
+        return {
+            'student_id': student_id,
+            'name': self.names[i],
+            'sgpa': float(self.sgpa[i]),
+            'percentage': float(self.percentage[i]),
+            'total_marks': int(self.total_marks[i]),
+            'failed_subjects': int(self.fail_counts[i]),
+            'result': 'PASS' if self.passed[i] else 'FAIL',
+            'rank': int(self.rank[i]),
+            'percentile': float(self.percentile[i]),
+        }
+
+    def toppers(self, count=10):
+        order = np.argsort(self.rank, kind='stable')[:count]
+        return [self.student_summary(self.student_ids[i]) for i in order]
+
+    def report(self):
+        return {
+            'year': self.year,
+            'semester': self.semester,
+            'version': self.version,
+            'class_statistics': self.class_statistics(),
+            'subjects': self.subject_statistics(),
+            'correlations': {
+                'subjects': [s[0] for s in self.subjects],
+                'matrix': self.correlations(),
+            },
+            'at_risk': self.at_risk(),
+            'toppers': self.toppers(),
+        }
+
+
+_matrices = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def get_term_matrix(year, semester):
+    """Cached TermMatrix for a term, rebuilt when the term's version token changes"""
+    key = (year, semester)
+    version = TermVersion.token(year, semester)
+    cached = _matrices.get(key)
+    if cached is not None and cached.version == version:
+        return cached
+    with _locks_guard:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        cached = _matrices.get(key)
+        if cached is None or cached.version != version:
+            cached = _matrices[key] = TermMatrix.load(year, semester)
+        return cached
+
+
+def invalidate(year=None, semester=None):
+    """Drop cached matrices (all terms, or one)"""
+    if year is None:
+        _matrices.clear()
+    else:
+        _matrices.pop((year, semester), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--semester', type=int, required=True)
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        matrix = get_term_matrix(args.year, args.semester)
+        loaded = time.perf_counter()
+        report = matrix.report()
+        reported = time.perf_counter()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Year {args.year}, Semester {args.semester}: {len(matrix.student_ids)} students x "
+          f"{len(matrix.subjects)} subjects")
+    print(f"Matrix load: {(loaded - started) * 1000:.1f} ms, full report: {(reported - loaded) * 1000:.1f} ms")
+    print(f"Class statistics: {report['class_statistics']}")
+    for subject in report['subjects']:
+        print(f"  {subject['code']:<8} {subject['name'][:40]:<40} mean {subject['mean']}  "
+              f"pass rate {subject['pass_rate']}")
+    print("At risk: " + ', '.join(f"{k}={len(v)}" for k, v in report['at_risk'].items()))
+
+
+if __name__ == '__main__':
+    main()
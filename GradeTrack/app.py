@@ -16,18 +16,61 @@ db = SQLAlchemy(model_class=Base)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "academic-tracker-secret-key-2024")
 
-# Configure SQLite database
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///academic_tracker.db"
+# Configure SQLite database (DATABASE_URL lets tools point the app at another file)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///academic_tracker.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Initialize the app with the extension
 db.init_app(app)
 
+# Compress HTML/JSON responses (registered first so it runs after every other hook)
+from compression import init_compression
+init_compression(app)
+
 with app.app_context():
     # Import models to ensure tables are created
     import models
     # Create all database tables
     db.create_all()
+    # Bring tables created by older versions up to date
+    from migrations import upgrade
+    upgrade()
     
     # Import and register routes
     import routes
+
+# Share concurrent renders of the same result page / PDF (see coalesce.py)
+from coalesce import init_coalescing
+init_coalescing(app)
+
+# Pages and PDFs rendered ahead of time after imports (see prewarm.py)
+from prewarm import init_prerender
+init_prerender(app)
+
+# PDFs that are not pre-rendered are built by background processes (see pdfjobs.py)
+from pdfjobs import init_pdf_jobs
+init_pdf_jobs(app)
+
+# Optional in-memory result snapshot (RESULT_SNAPSHOT=1, see snapshot.py)
+from snapshot import init_snapshot
+init_snapshot(app)
+
+# Batches moved to read-only archive files by archive.py (ARCHIVE_DIR, see archive.py)
+from archive import init_archive
+init_archive(app)
+
+# Reconnect after shadow_import.py swaps in a new database file (see dbwatch.py)
+from dbwatch import init_database_watch
+init_database_watch(app)
+
+# Opt-in request profiling (PROFILE_SAMPLE_RATE / PROFILE_SLOW_MS, see profiling.py)
+from profiling import init_profiling
+init_profiling(app)
+
+# Slow-query log with query plans (SLOW_QUERY_MS, see sqllog.py)
+from sqllog import init_query_log
+init_query_log(app)
+
+# Fingerprinted static bundles (see build_assets.py)
+from assets import init_assets
+init_assets(app)
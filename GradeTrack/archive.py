@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Move completed batches out of the live database into archive files
+
+Every batch and term lives in academic_tracker.db, so its tables and
+indexes keep growing while traffic is on the latest results. This script
+moves one batch (roll numbers starting with its two digits) into its own
+SQLite file, ARCHIVE_DIR/batch_<batch>.db (default instance/archive/):
+
+1. The batch's term summaries are brought up to date (see revaluation.py),
+   so the archived enrollments carry their SGPA and result.
+2. Its students, enrollments, theory subjects and labs, and a copy of the
+   subject catalog, are copied into a side file with the app's schema.
+   The file is analyzed and vacuumed once, made read-only and renamed into
+   place.
+3. The archive is checked to hold exactly the batch's rows, then they are
+   deleted from the live database and the batch's terms get a new version,
+   so caches and the snapshot are rebuilt and class statistics recomputed
+   without them.
+4. The changed terms are pre-rendered again (unless --no-prewarm), and with
+   --vacuum the live file is compacted. VACUUM locks out readers while it
+   runs.
+
+Archived results stay on the site. With RESULT_SNAPSHOT=1 the snapshot
+loads every archive along with the live database. Otherwise, when a roll
+number is not in the live database, snapshot.find_result() ATTACHes its
+batch's file read-only and reads the result from there, through an LRU
+cache (ArchiveCache). freeze.py reads the snapshot, so static mirrors keep
+archived pages. Class statistics on those pages are the term's live ones.
+
+For queries over every batch, history() attaches all archives to a
+read-only connection with the views history_enrollments and history_marks,
+which union the live rows with each partition's.
+
+    python archive.py --list
+    python archive.py --batch 21 --vacuum
+    python archive.py --query "SELECT partition, COUNT(*) FROM history_enrollments GROUP BY partition"
+
+A batch imported again (final_import.py or shadow_import.py refill the
+whole database) can be archived again: its rows are only deleted once the
+existing archive is found to hold the same results.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+
+LIVE = 'live'
+BATCH_PATTERN = re.compile(r'[0-9A-Za-z]{2}')
+IN_BATCH = "substr(st.student_id, 1, 2) = :batch"
+ARCHIVE_CACHE_SIZE = 4096
+
+# Rows of a partition, without the partition column; {schema} is main or an attached archive
+ENROLLMENT_ROWS = (
+    "SELECT st.student_id, st.name, e.year, e.semester, e.branch, e.cgpa, e.percentage, e.passed "
+    "FROM {schema}.enrollments e JOIN {schema}.students st ON st.id = e.student_pk")
+MARKS_ROWS = (
+    "SELECT st.student_id, e.year, e.semester, 'theory' AS kind, s.code, s.name AS subject, s.credits, "
+    "NULL AS internal, NULL AS external, t.marks AS total, t.grade "
+    "FROM {schema}.theory_subjects t JOIN {schema}.enrollments e ON e.id = t.enrollment_id "
+    "JOIN {schema}.students st ON st.id = e.student_pk JOIN {schema}.subjects s ON s.id = t.subject_id "
+    "UNION ALL "
+    "SELECT st.student_id, e.year, e.semester, 'lab', s.code, s.name, s.credits, "
+    "l.internal_marks, l.external_marks, l.total_marks, l.grade "
+    "FROM {schema}.lab_courses l JOIN {schema}.enrollments e ON e.id = l.enrollment_id "
+    "JOIN {schema}.students st ON st.id = e.student_pk JOIN {schema}.subjects s ON s.id = l.subject_id")
+VIEWS = {'history_enrollments': ENROLLMENT_ROWS, 'history_marks': MARKS_ROWS}
+
+
+def archive_dir():
+    from flask import current_app
+    return current_app.config['ARCHIVE_DIR']
+
+
+def schema_name(batch):
+    return f"batch_{batch}"
+
+
+def archive_path(batch, directory=None):
+    if not BATCH_PATTERN.fullmatch(batch):
+        raise ValueError(f"Not a batch: {batch!r}")
+    return os.path.join(directory or archive_dir(), f"{schema_name(batch)}.db")
+
+
+def archived_batches(directory=None):
+    """Batches with an archive file, sorted"""
+    directory = directory or archive_dir()
+    if not os.path.isdir(directory):
+        return []
+    names = (re.fullmatch(r'batch_(\w{2})\.db', name) for name in os.listdir(directory))
+    return sorted(match.group(1) for match in names if match)
+
+
+def _uri(path, mode=None):
+    return f"file:{quote(os.path.abspath(path))}" + (f"?mode={mode}" if mode else '')
+
+
+@contextmanager
+def history(batches=None):
+    """Read-only connection to the live database with archives attached and the history views
+
+    Attaches the given batches, or every archived one. SQLite attaches at
+    most 10 databases to a connection by default.
+    """
+    from app import db
+
+    batches = archived_batches() if batches is None else batches
+    conn = sqlite3.connect(_uri(db.engine.url.database, 'ro'), uri=True)
+    try:
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(batches) > limit:
+            raise ValueError(f"{len(batches)} archives but SQLite attaches at most {limit}; pass fewer batches")
+        partitions = [(LIVE, 'main')]
+        for batch in batches:
+            conn.execute(f"ATTACH DATABASE ? AS {schema_name(batch)}", (_uri(archive_path(batch), 'ro'),))
+            partitions.append((schema_name(batch), schema_name(batch)))
+        for view, rows in VIEWS.items():
+            union = " UNION ALL ".join(f"SELECT '{partition}' AS partition, * FROM ({rows.format(schema=schema)})"
+                                       for partition, schema in partitions)
+            conn.execute(f"CREATE TEMP VIEW {view} AS {union}")
+        yield conn
+    finally:
+        conn.close()
+
+
+class ArchiveCache:
+    """LRU cache of archived lookups keyed by (archive file, roll number, year, semester)
+
+    Misses are cached too, so a wrong roll number in an archived batch
+    opens its file once. Archive files are never written once in place; the
+    key includes the file's inode and mtime, so a batch archived again
+    after its file was moved away is read afresh.
+    """
+
+    def __init__(self, max_entries=ARCHIVE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        record = load()
+        with self.lock:
+            self.entries[key] = record
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return record
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+archive_cache = ArchiveCache()
+
+
+def find_archived(student_id, year, semester):
+    """Result record from the student's batch archive, or None (needs an app context)"""
+    batch = student_id[:2]
+    if not BATCH_PATTERN.fullmatch(batch):
+        return None
+    path = archive_path(batch)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (path, stat.st_ino, stat.st_mtime_ns, student_id, year, semester)
+    return archive_cache.get(key, lambda: _read_archived(batch, student_id, year, semester))
+
+
+def _read_archived(batch, student_id, year, semester):
+    from snapshot import Snapshot, SubjectEntry, TermLayout, ResultRecord
+
+    schema = schema_name(batch)
+    with history([batch]) as conn:
+        found = conn.execute(
+            f"SELECT e.id, st.student_id, st.name FROM {schema}.enrollments e "
+            f"JOIN {schema}.students st ON st.id = e.student_pk "
+            "WHERE st.student_id = ? AND e.year = ? AND e.semester = ?", (student_id, year, semester)).fetchone()
+        if found is None:
+            return None
+        enrollment_id, roll, name = found
+        theory = conn.execute(
+            f"SELECT s.code, s.name, s.credits, t.marks, t.grade FROM {schema}.theory_subjects t "
+            f"JOIN {schema}.subjects s ON s.id = t.subject_id WHERE t.enrollment_id = ? ORDER BY t.id",
+            (enrollment_id,)).fetchall()
+        labs = conn.execute(
+            f"SELECT s.code, s.name, s.credits, l.internal_marks, l.external_marks, l.total_marks, l.grade "
+            f"FROM {schema}.lab_courses l JOIN {schema}.subjects s ON s.id = l.subject_id "
+            "WHERE l.enrollment_id = ? ORDER BY l.id", (enrollment_id,)).fetchall()
+
+    # A snapshot of one record, so archived results render like live ones
+    holder = Snapshot(versions=None)
+    for *_, marks, grade in theory:
+        holder.values.extend((marks, len(holder.grades)))
+        holder.grades.append(grade)
+    for *_, internal, external, total, grade in labs:
+        holder.values.extend((internal, external, total, len(holder.grades)))
+        holder.grades.append(grade)
+    layout = TermLayout(tuple(SubjectEntry(*row[:3]) for row in theory),
+                        tuple(SubjectEntry(*row[:3]) for row in labs))
+    record = ResultRecord(roll, name, year, semester, layout, 0, holder)
+    holder.by_roll[roll] = (record,)
+    holder.count = 1
+    return record
+
+
+@contextmanager
+def partition_rows(batch):
+    """One archive's (subjects, enrollments, theory, labs) rows, in the order snapshot.py reads the live ones"""
+    schema = schema_name(batch)
+    with history([batch]) as conn:
+        yield (conn.execute(f"SELECT id, code, name, credits FROM {schema}.subjects"),
+               conn.execute(f"SELECT e.id, st.student_id, st.name, e.year, e.semester FROM {schema}.enrollments e "
+                            f"JOIN {schema}.students st ON st.id = e.student_pk ORDER BY e.id"),
+               conn.execute(f"SELECT enrollment_id, subject_id, marks, grade FROM {schema}.theory_subjects "
+                            "ORDER BY enrollment_id, id"),
+               conn.execute(f"SELECT enrollment_id, subject_id, internal_marks, external_marks, total_marks, grade "
+                            f"FROM {schema}.lab_courses ORDER BY enrollment_id, id"))
+
+
+def init_archive(app):
+    app.config.setdefault('ARCHIVE_DIR', os.environ.get('ARCHIVE_DIR')
+                          or os.path.join(app.instance_path, 'archive'))
+
+
+def batch_terms(batch):
+    """(year, semester) terms the batch has enrollments in, in the live database"""
+    from sqlalchemy import text
+    from app import db
+
+    return [tuple(row) for row in db.session.execute(text(
+        "SELECT DISTINCT e.year, e.semester FROM enrollments e JOIN students st ON st.id = e.student_pk "
+        f"WHERE {IN_BATCH} ORDER BY e.year, e.semester"), {'batch': batch})]
+
+
+def _columns(table):
+    return ', '.join(column.name for column in table.columns)
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_archive(batch, live, path):
+    """Copy the batch into a new archive file at path; (students, enrollments) copied"""
+    from sqlalchemy import create_engine
+    from app import db
+    from models import Subject, Student, Enrollment, TheorySubject, LabCourse
+
+    side = path + '.tmp'
+    for stale in (side, side + '-journal'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    engine = create_engine(f"sqlite:///{side}")
+    tables = [model.__table__ for model in (Subject, Student, Enrollment, TheorySubject, LabCourse)]
+    db.metadata.create_all(engine, tables=tables)
+    engine.dispose()
+
+    students = f"SELECT st.id FROM main.students st WHERE {IN_BATCH}"
+    enrollments = f"SELECT e.id FROM main.enrollments e WHERE e.student_pk IN ({students})"
+    filters = {'subjects': '',
+               'students': f"WHERE id IN ({students})",
+               'enrollments': f"WHERE id IN ({enrollments})",
+               'theory_subjects': f"WHERE enrollment_id IN ({enrollments})",
+               'lab_courses': f"WHERE enrollment_id IN ({enrollments})"}
+    conn = sqlite3.connect(live, timeout=30, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (side,))
+        conn.execute("BEGIN")
+        for table in tables:
+            columns = _columns(table)
+            conn.execute(f"INSERT INTO archive.{table.name} ({columns}) "
+                         f"SELECT {columns} FROM main.{table.name} {filters[table.name]}", {'batch': batch})
+        conn.execute("COMMIT")
+        copied = conn.execute("SELECT (SELECT COUNT(*) FROM archive.students), "
+                              "(SELECT COUNT(*) FROM archive.enrollments)").fetchone()
+        conn.execute("DETACH DATABASE archive")
+    finally:
+        conn.close()
+
+    # Compacted once: the file is never written again
+    conn = sqlite3.connect(side, isolation_level=None)
+    try:
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.chmod(side, 0o444)
+    _fsync(side)
+    os.replace(side, path)
+    _fsync(os.path.dirname(path))
+    return copied
+
+
+def unarchived_rows(batch, live, path):
+    """Rows of the batch in the live database that its archive does not hold (0 when it is safe to delete)"""
+    conn = sqlite3.connect(_uri(live, 'ro'), uri=True)
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (_uri(path, 'ro'),))
+        missing = 0
+        for rows in (ENROLLMENT_ROWS, MARKS_ROWS):
+            live_rows, archived = rows.format(schema='main'), rows.format(schema='archive')
+            missing += conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT * FROM ({live_rows}) WHERE substr(student_id, 1, 2) = :batch "
+                f"EXCEPT SELECT * FROM ({archived}))", {'batch': batch}).fetchone()[0]
+        return missing
+    finally:
+        conn.close()
+
+
+def delete_batch(batch, terms):
+    """Delete the batch from the live database and give its terms a new version (commits)"""
+    from sqlalchemy import text
+    from app import db
+    from models import TermVersion
+
+    students = f"SELECT st.id FROM students st WHERE {IN_BATCH}"
+    enrollments = f"SELECT e.id FROM enrollments e WHERE e.student_pk IN ({students})"
+    params = {'batch': batch}
+    for statement in (f"DELETE FROM theory_subjects WHERE enrollment_id IN ({enrollments})",
+                      f"DELETE FROM lab_courses WHERE enrollment_id IN ({enrollments})",
+                      f"DELETE FROM enrollments WHERE id IN ({enrollments})",
+                      f"DELETE FROM students WHERE id IN ({students})"):
+        db.session.execute(text(statement), params)
+    for year, semester in terms:
+        TermVersion.bump(year, semester)
+    db.session.commit()
+
+
+def archive_batch(batch, force=False):
+    """Move a batch into its archive file; the terms it had in the live database (needs an app context)"""
+    from sqlalchemy import text
+    from app import db
+    import revaluation
+
+    live = db.engine.url.database
+    path = archive_path(batch)
+    terms = batch_terms(batch)
+    if not terms:
+        raise ValueError(f"Batch {batch} has no results in the live database"
+                         + (" (already archived)" if os.path.exists(path) else ''))
+    newest = db.session.execute(text("SELECT MAX(substr(student_id, 1, 2)) FROM students")).scalar()
+    if batch == newest and not force:
+        raise ValueError(f"Batch {batch} is the newest in the database; pass --force to archive it anyway")
+
+    # Summaries are archived with the rows, and compared with an existing archive's
+    for year, semester in terms:
+        revaluation.ensure_summaries(year, semester)
+    db.session.remove()
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        students, enrollments = write_archive(batch, live, path)
+        print(f"Wrote {path}: {students} students, {enrollments} enrollments, "
+              f"{os.path.getsize(path) / 1e6:.1f} MB")
+
+    missing = unarchived_rows(batch, live, path)
+    if missing:
+        raise ValueError(f"{path} lacks {missing} of the batch's live rows; "
+                         "it was archived from different results (move the file away to archive again)")
+    delete_batch(batch, terms)
+    # Class statistics without the batch
+    for year, semester in terms:
+        revaluation.ensure_summaries(year, semester)
+    return terms
+
+
+def vacuum(live):
+    started = time.perf_counter()
+    before = os.path.getsize(live)
+    conn = sqlite3.connect(live, timeout=30, isolation_level=None)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    print(f"Vacuumed {live}: {before / 1e6:.1f} MB -> {os.path.getsize(live) / 1e6:.1f} MB "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+def print_partitions():
+    with history() as conn:
+        rows = conn.execute(
+            "SELECT partition, substr(student_id, 1, 2), COUNT(DISTINCT student_id), COUNT(*), "
+            "MIN(year || '-' || semester), MAX(year || '-' || semester) "
+            "FROM history_enrollments GROUP BY 1, 2 ORDER BY 2, 1").fetchall()
+    print(f"{'partition':<12}{'batch':<7}{'students':>10}{'enrollments':>13}  terms")
+    for partition, batch, students, enrollments, first, last in rows:
+        print(f"{partition:<12}{batch:<7}{students:>10}{enrollments:>13}  {first} to {last}")
+    for batch in archived_batches():
+        path = archive_path(batch)
+        print(f"{os.path.basename(path)}: {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch', nargs='+', help='batches to archive, e.g. 21 (first two digits of the roll number)')
+    parser.add_argument('--force', action='store_true', help='archive the newest batch too')
+    parser.add_argument('--no-prewarm', action='store_true', help='skip pre-rendering the changed terms')
+    parser.add_argument('--vacuum', action='store_true', help='compact the live database afterwards')
+    parser.add_argument('--list', action='store_true', help='show batches per partition')
+    parser.add_argument('--query', help='run SQL against the history views and print the rows')
+    parser.add_argument('--database', help='SQLite file to use instead of the app\'s database')
+    parser.add_argument('--archive-dir', help='directory of the archive files (default: ARCHIVE_DIR)')
+    args = parser.parse_args()
+    if not (args.batch or args.vacuum or args.list or args.query):
+        parser.error("nothing to do: pass --batch, --vacuum, --list or --query")
+
+    # Must be set before the app module is imported
+    if args.database:
+        if not os.path.exists(args.database):
+            parser.exit(1, f"No database at {args.database}\n")
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(args.database)}"
+    if args.archive_dir:
+        os.environ['ARCHIVE_DIR'] = os.path.abspath(args.archive_dir)
+    from app import app, db
+
+    with app.app_context():
+        live = db.engine.url.database
+        terms = set()
+        for batch in args.batch or []:
+            try:
+                moved = archive_batch(batch, args.force)
+            except ValueError as e:
+                sys.exit(str(e))
+            terms.update(moved)
+            print(f"Batch {batch} moved out of {live} ({', '.join(f'Y{y}S{s}' for y, s in moved)})")
+        db.session.remove()
+        db.engine.dispose()
+
+        if args.vacuum:
+            vacuum(live)
+        if args.list:
+            print_partitions()
+        if args.query:
+            with history() as conn:
+                cursor = conn.execute(args.query)
+                print('\t'.join(column[0] for column in cursor.description or ()))
+                for row in cursor:
+                    print('\t'.join('' if value is None else str(value) for value in row))
+
+    if terms and not args.no_prewarm:
+        from prewarm import prewarm_terms
+        print("Pre-rendering the changed terms...")
+        prewarm_terms(sorted(terms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Fingerprinted static asset bundles
+
+build_assets.py vendors the third-party CSS/JS/fonts, bundles them with our
+own files, minifies, content-hashes and precompresses the result into
+static/dist/ and writes static/dist/manifest.json. This module serves those
+files with far-future immutable caching and gives templates an
+asset_tags() helper. When the bundles have not been built (a fresh
+checkout), asset_tags() falls back to the CDN links and raw static files.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+from flask import request, send_from_directory, url_for
+from markupsafe import Markup, escape
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+VENDOR_DIR = os.path.join(STATIC_DIR, 'vendor')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+# Third-party files fetched by build_assets.py: vendor path -> source URL
+VENDOR_FILES = {
+    'bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+    'chartjs/chart.umd.min.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js',
+    'fonts/poppins.css': 'https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600;700&display=swap',
+}
+
+# Bundle name -> (files under static/ in load order, fallback URLs when unbuilt)
+BUNDLES = {
+    'base.css': (
+        ['vendor/bootstrap/bootstrap.min.css', 'vendor/fontawesome/css/all.min.css',
+         'vendor/fonts/poppins.css', 'css/style.css'],
+        [VENDOR_FILES['bootstrap/bootstrap.min.css'], VENDOR_FILES['fontawesome/css/all.min.css'],
+         VENDOR_FILES['fonts/poppins.css'], 'css/style.css'],
+    ),
+    'base.js': (
+        ['vendor/bootstrap/bootstrap.bundle.min.js'],
+        [VENDOR_FILES['bootstrap/bootstrap.bundle.min.js']],
+    ),
+    'result.js': (
+        ['vendor/chartjs/chart.umd.min.js', 'js/charts.js'],
+        [VENDOR_FILES['chartjs/chart.umd.min.js'], 'js/charts.js'],
+    ),
+}
+
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+_manifest = {'mtime': None, 'files': {}}
+_manifest_lock = threading.Lock()
+
+
+def load_manifest():
+    """Return the bundle -> hashed filename map, reloading when the file changes"""
+    try:
+        mtime = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return {}
+    if mtime != _manifest['mtime']:
+        with _manifest_lock:
+            if mtime != _manifest['mtime']:
+                with open(MANIFEST_PATH) as fh:
+                    _manifest['files'] = json.load(fh)
+                _manifest['mtime'] = mtime
+    return _manifest['files']
+
+
+def manifest_fingerprint():
+    """Short hash of the current manifest; pages rendered under another one link stale bundles"""
+    files = load_manifest()
+    return hashlib.sha1(json.dumps(files, sort_keys=True).encode()).hexdigest()[:12] if files else 'raw'
+
+
+def asset_urls(bundle):
+    """URLs to load for a bundle: one fingerprinted file, or the unbuilt fallbacks"""
+    hashed = load_manifest().get(bundle)
+    if hashed:
+        return [url_for('hashed_asset', filename=hashed)]
+    return [url if url.startswith('http') else url_for('static', filename=url)
+            for url in BUNDLES[bundle][1]]
+
+
+def asset_tags(bundle):
+    """<link>/<script> tags for a bundle, for use in templates"""
+    if bundle.endswith('.css'):
+        template = '<link href="{}" rel="stylesheet">'
+    else:
+        template = '<script src="{}"></script>'
+    return Markup('\n    '.join(template.format(escape(url)) for url in asset_urls(bundle)))
+
+
+def serve_hashed_asset(filename):
+    """Serve a fingerprinted file, preferring a precompressed variant the client accepts"""
+    accepted = request.accept_encodings
+    for encoding, suffix in PRECOMPRESSED:
+        if accepted[encoding] and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            response = send_from_directory(DIST_DIR, filename + suffix, max_age=31536000)
+            response.headers['Content-Encoding'] = encoding
+            response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, max_age=31536000)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    """Register the /assets route and the asset_tags template helper"""
+    app.add_url_rule('/assets/<path:filename>', 'hashed_asset', serve_hashed_asset)
+    app.jinja_env.globals['asset_tags'] = asset_tags
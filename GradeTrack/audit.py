@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Whole-database integrity audit
+
+Replaces check_data.py and verify_data.py, which loaded a few hard-coded
+students one at a time. This audit checks every row with three aggregate
+queries:
+
+1. one pass over all theory and lab rows: rows whose enrollment or subject
+   is missing, subjects of another term or of the wrong kind, marks out of
+   range, lab totals that are not internal + external, unknown grades, and
+   grades outside the band of their marks
+2. one pass over the enrollments, grouped by term: missing theory subjects
+   (compared with the subjects the term's results use), duplicated subject
+   rows, enrollments without results or without a student, plus the
+   per-term counts
+3. one query over the per-term bookkeeping: term versions, class
+   statistics that no longer match the enrollments, unfinished import
+   checkpoints
+
+Only checks that found something run a second query for up to --examples
+offending rows. Grades outside their band and the bookkeeping checks are
+warnings: the sheet's grade is the university's and may differ from the
+marks, and stale statistics are rebuilt by prewarm.py. Everything else is
+an error and makes the script exit with status 1.
+
+    python audit.py                          # audit the app's database
+    python audit.py --database instance/academic_tracker.db.shadow --json audit.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from curriculum import GRADE_BANDS, LETTER_GRADES
+
+ERROR = 'error'
+WARNING = 'warning'
+
+GRADE_LIST = ', '.join(f"'{grade}'" for grade in LETTER_GRADES)
+BAND = 'CASE ' + ' '.join(f"WHEN m.total >= {bound} THEN '{grade}'" for bound, grade in GRADE_BANDS) + " ELSE 'F' END"
+
+# Every marks row, theory and lab alike, with its enrollment and subject (either may be missing)
+MARKS_ROWS = """
+    (SELECT 'theory' AS kind, id, enrollment_id, subject_id, marks AS total, grade,
+            NULL AS internal, NULL AS external FROM theory_subjects
+     UNION ALL
+     SELECT 'lab', id, enrollment_id, subject_id, total_marks, grade, internal_marks, external_marks
+     FROM lab_courses) m
+    LEFT JOIN enrollments e ON e.id = m.enrollment_id
+    LEFT JOIN subjects s ON s.id = m.subject_id
+"""
+
+# (key, severity, description, condition on m, e and s)
+ROW_CHECKS = [
+    ('orphan_enrollment', ERROR, "marks rows whose enrollment does not exist", "e.id IS NULL"),
+    ('orphan_subject', ERROR, "marks rows whose subject is not in the catalog", "s.id IS NULL"),
+    ('wrong_term', ERROR, "marks rows for a subject of another term",
+     "e.id IS NOT NULL AND s.id IS NOT NULL AND (s.year <> e.year OR s.semester <> e.semester)"),
+    ('wrong_kind', ERROR, "theory rows for a lab or lab rows for a theory subject", "s.kind <> m.kind"),
+    ('marks_range', ERROR, "marks outside 0-100",
+     "m.total NOT BETWEEN 0 AND 100 OR m.internal NOT BETWEEN 0 AND 100 OR m.external NOT BETWEEN 0 AND 100"),
+    ('lab_total', ERROR, "lab totals that are not internal + external",
+     "m.kind = 'lab' AND m.total <> m.internal + m.external"),
+    ('unknown_grade', ERROR, "grades that are not a letter grade", f"m.grade NOT IN ({GRADE_LIST})"),
+    ('grade_band', WARNING, "grades outside the band of their marks",
+     f"m.grade IN ({GRADE_LIST}) AND m.grade <> {BAND}"),
+]
+
+# One row per enrollment with its result counts and the number of theory subjects its term uses
+ENROLLMENT_ROWS = """
+    (SELECT e.id, e.year, e.semester, e.student_pk, e.cgpa, e.passed,
+            COALESCE(t.n, 0) AS theory_rows, COALESCE(t.subjects, 0) AS theory_subjects,
+            COALESCE(l.n, 0) AS lab_rows, COALESCE(l.subjects, 0) AS lab_subjects,
+            COALESCE(x.expected, 0) AS expected, st.student_id
+     FROM enrollments e
+     LEFT JOIN (SELECT enrollment_id, COUNT(*) AS n, COUNT(DISTINCT subject_id) AS subjects
+                FROM theory_subjects GROUP BY enrollment_id) t ON t.enrollment_id = e.id
+     LEFT JOIN (SELECT enrollment_id, COUNT(*) AS n, COUNT(DISTINCT subject_id) AS subjects
+                FROM lab_courses GROUP BY enrollment_id) l ON l.enrollment_id = e.id
+     LEFT JOIN (SELECT e2.year, e2.semester, COUNT(DISTINCT t2.subject_id) AS expected
+                FROM theory_subjects t2 JOIN enrollments e2 ON e2.id = t2.enrollment_id
+                GROUP BY e2.year, e2.semester) x ON x.year = e.year AND x.semester = e.semester
+     LEFT JOIN students st ON st.id = e.student_pk) r
+"""
+
+ENROLLMENT_CHECKS = [
+    ('missing_subjects', ERROR, "enrollments missing theory subjects their term has",
+     "r.theory_subjects < r.expected"),
+    ('duplicate_subjects', ERROR, "enrollments with a subject recorded more than once",
+     "r.theory_rows > r.theory_subjects OR r.lab_rows > r.lab_subjects"),
+    ('no_results', ERROR, "enrollments without any theory or lab result", "r.theory_rows = 0 AND r.lab_rows = 0"),
+    ('orphan_student', ERROR, "enrollments whose student does not exist", "r.student_id IS NULL"),
+]
+
+# (key, severity, description, query returning (year, semester, detail) rows)
+TERM_CHECKS = [
+    ('no_term_version', ERROR, "terms without a version (caches would never refresh)",
+     "SELECT DISTINCT e.year, e.semester, NULL FROM enrollments e WHERE NOT EXISTS "
+     "(SELECT 1 FROM term_versions v WHERE v.year = e.year AND v.semester = e.semester)"),
+    ('stale_statistics', WARNING, "class statistics that do not match the enrollments",
+     "SELECT c.year, c.semester, 'statistics say ' || c.total_students || ', enrollments ' || COALESCE(n.n, 0) "
+     "FROM class_statistics c LEFT JOIN (SELECT year, semester, COUNT(*) AS n FROM enrollments "
+     "GROUP BY year, semester) n ON n.year = c.year AND n.semester = c.semester "
+     "WHERE c.total_students <> COALESCE(n.n, 0)"),
+    ('unfinished_import', WARNING, "workbooks whose import did not finish",
+     "SELECT year, semester, source || ': ' || rows_done || ' of ' || total_rows || ' rows' "
+     "FROM import_checkpoints WHERE completed_at IS NULL"),
+]
+
+
+def _sum(condition):
+    return f"SUM(CASE WHEN {condition} THEN 1 ELSE 0 END)"
+
+
+def audit_rows(session, examples):
+    """Counts and examples of the ROW_CHECKS, and the number of marks rows"""
+    from sqlalchemy import text
+
+    counts = session.execute(text(
+        f"SELECT COUNT(*), {', '.join(_sum(f'({condition})') for _, _, _, condition in ROW_CHECKS)} "
+        f"FROM {MARKS_ROWS}")).one()
+    results = []
+    for (key, severity, description, condition), count in zip(ROW_CHECKS, counts[1:]):
+        rows = []
+        if count:
+            rows = [dict(row._mapping) for row in session.execute(text(
+                f"SELECT st.student_id, e.year, e.semester, m.kind, m.id, s.code, m.total, m.internal, "
+                f"m.external, m.grade FROM {MARKS_ROWS} LEFT JOIN students st ON st.id = e.student_pk "
+                f"WHERE {condition} LIMIT :limit"), {'limit': examples})]
+        results.append({'check': key, 'severity': severity, 'description': description,
+                        'count': count or 0, 'examples': rows})
+    return results, counts[0]
+
+
+def audit_enrollments(session, examples):
+    """Counts and examples of the ENROLLMENT_CHECKS, and the per-term counts"""
+    from sqlalchemy import text
+
+    terms = []
+    totals = [0] * len(ENROLLMENT_CHECKS)
+    for row in session.execute(text(
+            f"SELECT r.year, r.semester, COUNT(*), SUM(r.theory_rows), SUM(r.lab_rows), MAX(r.expected), "
+            f"{_sum('r.passed = 1')}, {_sum('r.passed = 0')}, {_sum('r.cgpa IS NULL')}, "
+            f"{', '.join(_sum(f'({condition})') for _, _, _, condition in ENROLLMENT_CHECKS)} "
+            f"FROM {ENROLLMENT_ROWS} GROUP BY r.year, r.semester ORDER BY r.year, r.semester")):
+        year, semester, enrollments, theory_rows, lab_rows, expected, passed, failed, unsummarized = row[:9]
+        terms.append({'year': year, 'semester': semester, 'enrollments': enrollments,
+                      'theory_rows': theory_rows, 'lab_rows': lab_rows, 'theory_subjects': expected,
+                      'passed': passed, 'failed': failed, 'unsummarized': unsummarized})
+        totals = [total + (count or 0) for total, count in zip(totals, row[9:])]
+
+    results = []
+    for (key, severity, description, condition), count in zip(ENROLLMENT_CHECKS, totals):
+        rows = []
+        if count:
+            rows = [dict(row._mapping) for row in session.execute(text(
+                f"SELECT r.student_id, r.year, r.semester, r.id AS enrollment_id, r.theory_rows, "
+                f"r.theory_subjects, r.expected, r.lab_rows FROM {ENROLLMENT_ROWS} "
+                f"WHERE {condition} LIMIT :limit"), {'limit': examples})]
+        results.append({'check': key, 'severity': severity, 'description': description,
+                        'count': count, 'examples': rows})
+    return results, terms
+
+
+def audit_terms(session, examples):
+    from sqlalchemy import text
+
+    results = []
+    for key, severity, description, sql in TERM_CHECKS:
+        rows = session.execute(text(sql)).all()
+        results.append({'check': key, 'severity': severity, 'description': description, 'count': len(rows),
+                        'examples': [{'year': year, 'semester': semester, 'detail': detail}
+                                     for year, semester, detail in rows[:examples]]})
+    return results
+
+
+def audit(examples=5):
+    """Run every check on the app's database (inside an app context); the report as a dict"""
+    from app import db
+
+    started = time.perf_counter()
+    row_checks, marks_rows = audit_rows(db.session, examples)
+    enrollment_checks, terms = audit_enrollments(db.session, examples)
+    checks = row_checks + enrollment_checks + audit_terms(db.session, examples)
+    return {
+        'database': db.engine.url.render_as_string(hide_password=True),
+        'elapsed_s': round(time.perf_counter() - started, 3),
+        'marks_rows': marks_rows,
+        'terms': terms,
+        'checks': checks,
+        'errors': sum(check['count'] for check in checks if check['severity'] == ERROR),
+        'warnings': sum(check['count'] for check in checks if check['severity'] == WARNING),
+    }
+
+
+def print_report(report):
+    print(f"=== AUDIT of {report['database']} ({report['elapsed_s']:.2f}s, {report['marks_rows']} marks rows) ===")
+    print(f"{'term':<8}{'students':>10}{'subjects':>10}{'theory':>10}{'labs':>10}{'passed':>10}{'failed':>10}")
+    for term in report['terms']:
+        print(f"{'Y%dS%d' % (term['year'], term['semester']):<8}{term['enrollments']:>10}"
+              f"{term['theory_subjects']:>10}{term['theory_rows']:>10}{term['lab_rows']:>10}"
+              f"{term['passed']:>10}{term['failed']:>10}"
+              + (f"  ({term['unsummarized']} without a stored summary)" if term['unsummarized'] else ''))
+    print()
+    for check in report['checks']:
+        mark = 'ok' if not check['count'] else check['severity'].upper()
+        print(f"[{mark:>7}] {check['description']}: {check['count']}")
+        for example in check['examples']:
+            print("          " + ', '.join(f"{key}={value}" for key, value in example.items() if value is not None))
+    print(f"\n{report['errors']} errors, {report['warnings']} warnings")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLite file to audit instead of the app\'s database')
+    parser.add_argument('--examples', type=int, default=5, help='offending rows shown per check')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    if args.database:
+        if not os.path.exists(args.database):
+            parser.exit(1, f"No database at {args.database}\n")
+        # Must be set before the app module is imported
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(args.database)}"
+    from app import app
+
+    with app.app_context():
+        report = audit(args.examples)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2, default=str)
+    if report['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
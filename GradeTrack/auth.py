@@ -0,0 +1,31 @@
+"""
+Token check for administrative endpoints
+
+Bulk exports and other staff-only endpoints require the token configured in
+the ADMIN_TOKEN environment variable, sent as an X-Admin-Token header (or a
+token query parameter for browser downloads). With no token configured the
+endpoints are disabled.
+"""
+import hmac
+import os
+from functools import wraps
+
+from flask import abort, request
+
+
+def admin_token():
+    return os.environ.get('ADMIN_TOKEN', '')
+
+
+def require_admin(view):
+    """Decorator rejecting requests without the configured admin token"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = admin_token()
+        if not expected:
+            abort(403, description='Admin endpoints are disabled (ADMIN_TOKEN is not set)')
+        supplied = request.headers.get('X-Admin-Token') or request.args.get('token', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), expected.encode('utf-8')):
+            abort(401)
+        return view(*args, **kwargs)
+    return wrapper
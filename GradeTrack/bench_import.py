@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Import pipeline benchmark with per-stage timing and memory
+
+Generates result workbooks of increasing size with the cohort generator
+(or takes existing ones), imports each into a throwaway SQLite database
+with final_import.py and reports, per stage:
+
+    read_excel   pd.read_excel of the sheet
+    layout       header detection (cached per header format)
+    extract      vectorized conversion of every row (includes grading)
+    grading      grade column check and derivation from marks
+    catalog      subject and lab catalog rows for the term
+    checkpoint   workbook digest and import checkpoint
+    convert      marks columns converted to stored integers
+    existence    per-batch query for students already imported
+    build        ORM rows for each student
+    insert       flushing the batch's rows
+    commit       checkpoint update and commit
+    sql          time inside SQL statements, whatever the stage
+
+Stages are the phases final_import.py marks with profiling.phase(); grading
+runs inside extract and sql inside the others. Each workbook is imported
+--repeat times for timing and the fastest run is kept. A separate run under
+tracemalloc measures each stage's peak memory above what was allocated when
+it started (tracemalloc slows Python down, so it is not timed).
+
+    python bench_import.py                                # 250, 1000 and 4000 students
+    python bench_import.py --sizes 500 5000 --output bench_import.json
+    python bench_import.py --workbook "attached_assets/2-1 SEMESTER RESULTS_1756310657928.xlsx"
+    python bench_import.py --compare bench_import.json    # exit 1 if a stage got slower
+
+With --compare, a workbook size or stage is a regression when its rows per
+second dropped by more than --tolerance (default 25%). Stages under 5% of
+the import are left out of the comparison; they are too short to time
+reliably.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import redirect_stdout
+
+STAGES = ['read_excel', 'layout', 'extract', 'grading', 'catalog', 'checkpoint', 'convert',
+          'existence', 'build', 'insert', 'commit', 'sql']
+NESTED = {'grading', 'sql'}  # measured inside other stages, not added to the total
+
+# Stages below this share of the import are not compared against a baseline
+MIN_COMPARED_SHARE = 0.05
+
+
+def make_capture(path, trace_memory):
+    """A profiling Capture that also counts calls and tracks peak memory per phase"""
+    from profiling import Capture
+
+    class StageCapture(Capture):
+        def __init__(self):
+            super().__init__('IMPORT', path, sampled=False)
+            self.calls = Counter()
+            self.peaks = Counter()     # stage -> bytes above its starting level
+            self.peak = 0              # whole import, bytes above the starting level
+            self._memory = []          # open stages: (name, bytes traced when it started)
+            self._base = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+
+        def fold(self):
+            """Credit the peak since the last reset to every open stage"""
+            if not trace_memory:
+                return
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            for name, started in self._memory:
+                self.peaks[name] = max(self.peaks[name], peak - started)
+            self.peak = max(self.peak, peak - self._base)
+            return current
+
+        def begin(self, name):
+            if trace_memory:
+                self._memory.append((name, self.fold()))
+            self.calls[name] += 1
+            super().begin(name)
+
+        def end(self, name):
+            super().end(name)
+            if trace_memory:
+                self.fold()
+                index = max(i for i, (open_name, _) in enumerate(self._memory) if open_name == name)
+                del self._memory[index]
+
+    return StageCapture()
+
+
+def run_import(path, year, semester, batch_size, trace_memory=False):
+    """Import one workbook into an emptied database; the capture and wall time"""
+    from app import app, db
+    from final_import import import_correct_semester_data
+    from models import Enrollment
+    from profiling import capturing
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        if trace_memory:
+            tracemalloc.start()
+        capture = make_capture(path, trace_memory)
+        started = time.perf_counter()
+        try:
+            with capturing(capture), open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                ok = import_correct_semester_data(path, year, semester, batch_size)
+            wall = time.perf_counter() - started
+            capture.fold()
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+        if not ok:
+            sys.exit(f"Import of {path} failed; run final_import.py on it to see the error")
+        capture.students = Enrollment.query.filter_by(year=year, semester=semester).count()
+    return capture, wall
+
+
+def measure(path, year, semester, batch_size, repeat, memory):
+    """Fastest of repeat timed imports, plus one traced import for memory"""
+    runs = [run_import(path, year, semester, batch_size) for _ in range(repeat)]
+    capture, wall = min(runs, key=lambda run: run[1])
+    traced = run_import(path, year, semester, batch_size, trace_memory=True)[0] if memory else None
+
+    rows = capture.students
+    stages = {}
+    for name in STAGES:
+        seconds = capture.phases.get(name, 0.0)
+        stages[name] = {
+            'seconds': round(seconds, 4),
+            'share': round(seconds / wall, 4) if wall else 0.0,
+            'rows_per_s': round(rows / seconds, 1) if seconds else None,
+            'calls': capture.calls[name],
+            'peak_kb': round(traced.peaks[name] / 1024, 1) if traced else None,
+        }
+    staged = sum(capture.phases.get(name, 0.0) for name in STAGES if name not in NESTED)
+    return {
+        'workbook': os.path.basename(path),
+        'year': year,
+        'semester': semester,
+        'students': rows,
+        'wall_s': round(wall, 4),
+        'rows_per_s': round(rows / wall, 1) if wall else None,
+        'unstaged_s': round(wall - staged, 4),
+        'peak_kb': round(traced.peak / 1024, 1) if traced else None,
+        'stages': stages,
+    }
+
+
+def synthetic_workbook(students, out_dir, seed=0):
+    """One class's 1-1 workbook with the given number of students"""
+    from generate_cohort import generate, write_workbooks
+
+    directory = os.path.join(out_dir, f"{students}")
+    return write_workbooks(generate(['23'], ['32'], [(1, 1)], students, seed=seed), directory)[0]
+
+
+def term_of(path):
+    match = re.match(r'(\d)-(\d)', os.path.basename(path))
+    if not match:
+        sys.exit(f"Cannot tell the term of {path} from its name; pass --term")
+    return int(match.group(1)), int(match.group(2))
+
+
+def print_report(results):
+    for result in results:
+        print(f"\n=== {result['workbook']} | {result['students']} students | "
+              f"{result['wall_s']:.2f}s | {result['rows_per_s']} rows/s"
+              + (f" | peak {result['peak_kb'] / 1024:.1f} MB" if result['peak_kb'] is not None else '') + " ===")
+        print(f"{'stage':<12}{'seconds':>10}{'share':>8}{'rows/s':>12}{'calls':>8}{'peak KB':>12}")
+        for name, stage in result['stages'].items():
+            if not stage['calls']:
+                continue
+            label = f"  {name}" if name in NESTED else name
+            rate = f"{stage['rows_per_s']:.0f}" if stage['rows_per_s'] else '-'
+            peak = f"{stage['peak_kb']:.0f}" if stage['peak_kb'] is not None else '-'
+            print(f"{label:<12}{stage['seconds']:>10.3f}{stage['share']:>8.1%}{rate:>12}{stage['calls']:>8}{peak:>12}")
+        print(f"{'(other)':<12}{result['unstaged_s']:>10.3f}")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a previous report, matched by workbook size"""
+    previous = {result['students']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result['students'])
+        if old is None:
+            continue
+        checks = [('total', old['rows_per_s'], result['rows_per_s'])]
+        for name, stage in result['stages'].items():
+            old_stage = old['stages'].get(name)
+            if old_stage and old_stage['rows_per_s'] and stage['rows_per_s'] \
+                    and max(stage['share'], old_stage['share']) >= MIN_COMPARED_SHARE:
+                checks.append((name, old_stage['rows_per_s'], stage['rows_per_s']))
+        for name, before, after in checks:
+            if before and after < before * (1 - tolerance):
+                regressions.append(f"{result['students']} students, {name}: "
+                                   f"{before:.0f} -> {after:.0f} rows/s ({after / before - 1:+.0%})")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[250, 1000, 4000],
+                        help='students per synthetic workbook')
+    parser.add_argument('--workbook', nargs='+', help='benchmark these workbooks instead of synthetic ones')
+    parser.add_argument('--term', help='year-semester of --workbook, e.g. 2-1 (default: from the file name)')
+    parser.add_argument('--batch-size', type=int, help='students per commit (default: final_import.BATCH_SIZE)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed imports per workbook; the fastest is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic marks random seed')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='largest accepted drop in rows per second (default 0.25)')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench-import-')
+    # Must be set before the app module is imported
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ['PRERENDER_DIR'] = os.path.join(work_dir, 'prerendered')
+    os.environ['PDF_JOB_WORKERS'] = '0'
+    logging.disable(logging.INFO)
+    from final_import import BATCH_SIZE
+    batch_size = args.batch_size or BATCH_SIZE
+
+    if args.workbook:
+        workbooks = [(os.path.abspath(path), *(term_of(path) if not args.term else
+                                               map(int, args.term.split('-'))))
+                     for path in args.workbook]
+    else:
+        workbooks = []
+        for size in args.sizes:
+            print(f"Generating a workbook with {size} students...")
+            workbooks.append((synthetic_workbook(size, work_dir, args.seed), 1, 1))
+
+    results = []
+    for path, year, semester in workbooks:
+        print(f"Importing {os.path.basename(path)} ({args.repeat} timed run(s)"
+              f"{'' if args.no_memory else ' and one traced'})...")
+        results.append(measure(path, year, semester, batch_size, args.repeat, not args.no_memory))
+    print_report(results)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'config': {
+            'batch_size': batch_size,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'synthetic': not args.workbook,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        if regressions:
+            print(f"\nSlower than {args.compare} by more than {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
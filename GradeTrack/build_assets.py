@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Build fingerprinted, minified and precompressed static bundles
+
+    python build_assets.py            # vendor (if missing) + build
+    python build_assets.py --refresh  # re-download the vendored files first
+
+Third-party files are downloaded once into static/vendor/ (including the
+Font Awesome and Poppins font files), bundled with our own CSS/JS per
+assets.BUNDLES, minified, named <bundle>.<hash>.<ext> in static/dist/ and
+written alongside .gz (and .br when the brotli module is installed) copies.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import urllib.request
+from urllib.parse import urljoin
+
+from assets import BUNDLES, DIST_DIR, MANIFEST_PATH, STATIC_DIR, VENDOR_DIR, VENDOR_FILES
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Google Fonts only returns woff2 to browsers it recognises
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.ttf', '.eot')
+
+
+def fetch(url):
+    req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(req, timeout=60) as response:
+        return response.read()
+
+
+def vendor(refresh=False):
+    """Download third-party CSS/JS and every font file their CSS references"""
+    for rel_path, url in VENDOR_FILES.items():
+        dest = os.path.join(VENDOR_DIR, rel_path)
+        if os.path.exists(dest) and not refresh:
+            continue
+        print(f"Fetching {url}")
+        data = fetch(url)
+        if rel_path.endswith('.css'):
+            data = localize_css_urls(data.decode('utf-8'), url, os.path.dirname(dest)).encode('utf-8')
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, 'wb') as fh:
+            fh.write(data)
+
+
+def localize_css_urls(css, css_url, css_dir):
+    """Download url(...) targets of a remote stylesheet next to it and point at the local copies"""
+    def replace(match):
+        target = match.group(2).strip()
+        if target.startswith('data:'):
+            return match.group(0)
+        absolute = urljoin(css_url, target)
+        clean = absolute.split('#')[0].split('?')[0]
+        if target.startswith(('http://', 'https://')):
+            # Absolute font URLs (Google Fonts) are stored under files/ next to the CSS
+            local_rel = 'files/' + re.sub(r'[^A-Za-z0-9._-]', '_', clean.rsplit('/', 1)[-1])
+        else:
+            local_rel = os.path.normpath(target.split('#')[0].split('?')[0]).replace(os.sep, '/')
+        local_path = os.path.normpath(os.path.join(css_dir, local_rel))
+        if not os.path.exists(local_path):
+            print(f"  fetching {clean}")
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            with open(local_path, 'wb') as fh:
+                fh.write(fetch(clean))
+        return f"url({local_rel})"
+
+    return URL_PATTERN.sub(replace, css)
+
+
+def _strip_comments(text, quotes, line_comments):
+    """Text without comments, indentation, trailing spaces and blank lines; strings are copied as they are
+
+    In JS, comments are only recognised at the start of a line or after
+    whitespace or punctuation, so a regex literal such as /a\/\/b/ is left alone.
+    """
+    out = []
+    i, n = 0, len(text)
+    line_start = True
+    while i < n:
+        c = text[i]
+        if line_start and c in ' \t\r\n':
+            i += 1
+            continue
+        line_start = False
+        if c in quotes:
+            end = i + 1
+            while end < n and text[end] != c and (c == '`' or text[end] != '\n'):
+                end += 2 if text[end] == '\\' else 1
+            end = min(end + 1, n) if end < n and text[end] == c else end
+            out.append(text[i:end])
+            i = end
+            continue
+        comment_allowed = not line_comments or i == 0 or text[i - 1] in ' \t\r\n;{}(),'
+        if text.startswith('/*', i) and comment_allowed:
+            end = text.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            # A comment spanning lines still ends a statement in JS
+            c = '\n' if '\n' in text[i:end] else ' ' if line_comments else ''
+            i = end - 1
+        elif line_comments and text.startswith('//', i) and comment_allowed:
+            end = text.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        if c == '\n':
+            while out and out[-1] in (' ', '\t', '\r'):
+                out.pop()
+            line_start = True
+            if out and out[-1] == '\n':
+                c = ''  # the line held only comments
+        if c:
+            out.append(c)
+        i += 1
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(css):
+    """Comments and layout whitespace only; selectors and strings are left as written"""
+    return _strip_comments(css, '"\'', line_comments=False)
+
+
+def minify_js(js):
+    """Conservative minifier for our own scripts: comments and indentation only"""
+    return _strip_comments(js, '"\'`', line_comments=True)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{content_hash(data)}{ext}"
+
+
+def write_output(name, data, written):
+    """Write a dist file plus its precompressed variants"""
+    path = os.path.join(DIST_DIR, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.write(data)
+    written.add(name)
+    if name.endswith(COMPRESSIBLE):
+        with open(path + '.gz', 'wb') as fh:
+            fh.write(gzip.compress(data, compresslevel=9, mtime=0))
+        written.add(name + '.gz')
+        if brotli is not None:
+            with open(path + '.br', 'wb') as fh:
+                fh.write(brotli.compress(data, quality=11))
+            written.add(name + '.br')
+
+
+def rewrite_css_urls(css, source_path, written):
+    """Copy files referenced from a stylesheet into dist/ under hashed names"""
+    def replace(match):
+        target = match.group(2).strip()
+        if target.startswith(('data:', 'http://', 'https://', '/')):
+            return match.group(0)
+        clean = target.split('#')[0].split('?')[0]
+        fragment = target[len(clean):]
+        path = os.path.normpath(os.path.join(os.path.dirname(source_path), clean))
+        if not os.path.isfile(path):
+            print(f"  warning: {target} referenced from {source_path} not found")
+            return match.group(0)
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        name = 'files/' + hashed_name(os.path.basename(path), data)
+        if name not in written:
+            write_output(name, data, written)
+        return f"url({name}{fragment})"
+
+    return URL_PATTERN.sub(replace, css)
+
+
+def build_bundle(bundle, sources, written):
+    parts = []
+    for rel_path in sources:
+        path = os.path.join(STATIC_DIR, rel_path)
+        with open(path, encoding='utf-8') as fh:
+            text = fh.read()
+        already_minified = '.min.' in os.path.basename(rel_path)
+        if bundle.endswith('.css'):
+            text = rewrite_css_urls(text, path, written)
+            parts.append(text if already_minified else minify_css(text))
+        else:
+            parts.append(text if already_minified else minify_js(text))
+    # Separate JS files with ';' so concatenation cannot merge statements
+    joiner = '\n' if bundle.endswith('.css') else ';\n'
+    data = joiner.join(parts).encode('utf-8')
+    name = hashed_name(bundle, data)
+    write_output(name, data, written)
+    return name
+
+
+def build(clean=True):
+    written = set()
+    manifest = {}
+    for bundle, (sources, _) in BUNDLES.items():
+        manifest[bundle] = build_bundle(bundle, sources, written)
+        size = os.path.getsize(os.path.join(DIST_DIR, manifest[bundle]))
+        gz_size = os.path.getsize(os.path.join(DIST_DIR, manifest[bundle] + '.gz'))
+        print(f"{bundle:<10} -> {manifest[bundle]:<28} {size:>8} bytes, {gz_size:>7} gzipped")
+
+    if clean:
+        # Drop outputs of earlier builds that the new manifest no longer references
+        for root, _, files in os.walk(DIST_DIR):
+            for filename in files:
+                rel = os.path.relpath(os.path.join(root, filename), DIST_DIR).replace(os.sep, '/')
+                if rel not in written and rel != 'manifest.json':
+                    os.remove(os.path.join(root, filename))
+
+    tmp_path = MANIFEST_PATH + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--refresh', action='store_true', help='re-download vendored files')
+    parser.add_argument('--no-clean', action='store_true', help='keep outputs of previous builds')
+    args = parser.parse_args()
+
+    if args.refresh and os.path.isdir(VENDOR_DIR):
+        shutil.rmtree(VENDOR_DIR)
+    try:
+        vendor(refresh=args.refresh)
+    except OSError as e:
+        print(f"Could not download vendored assets: {e}")
+        return 1
+    if brotli is None:
+        print("brotli module not installed, writing gzip variants only")
+    build(clean=not args.no_clean)
+    print(f"Manifest written to {MANIFEST_PATH}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
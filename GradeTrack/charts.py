@@ -0,0 +1,136 @@
+"""
+Server-side rendering of the performance chart
+
+Draws the same marks (bars) and grade points (line) chart that charts.js
+shows in the browser as a ReportLab Drawing, so it can be embedded in the
+PDF directly and served as SVG/PNG for the result page fallback. Rendered
+output is cached per student-term and re-rendered when the marks change.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from reportlab.graphics.shapes import Drawing, Group, Line, PolyLine, Rect, String, Circle
+from reportlab.lib import colors
+
+# Colours match the Chart.js datasets in static/js/charts.js
+MARKS_COLOR = colors.Color(59 / 255, 130 / 255, 246 / 255)
+GRADE_POINT_COLOR = colors.Color(16 / 255, 185 / 255, 129 / 255)
+GRID_COLOR = colors.Color(0, 0, 0, alpha=0.1)
+
+CHART_WIDTH = 460
+CHART_HEIGHT = 260
+CACHE_SIZE = 2048
+
+CONTENT_TYPES = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+
+def build_chart_drawing(chart_data, width=CHART_WIDTH, height=CHART_HEIGHT):
+    """Build a ReportLab Drawing from the dict returned by routes.get_chart_data"""
+    drawing = Drawing(width, height)
+    left, right, top, bottom = 40, 40, 12, 95
+    plot_w = width - left - right
+    plot_h = height - top - bottom
+    x0, y0 = left, bottom
+
+    subjects = chart_data.get('subjects', [])
+    marks = chart_data.get('marks', [])
+    grade_points = chart_data.get('grade_points', [])
+
+    # Grid lines and both axes (marks 0-100 on the left, grade points 0-10 on the right)
+    for step in range(0, 11, 2):
+        y = y0 + plot_h * step / 10
+        drawing.add(Line(x0, y, x0 + plot_w, y, strokeColor=GRID_COLOR, strokeWidth=0.5))
+        drawing.add(String(x0 - 4, y - 3, str(step * 10), fontName='Helvetica', fontSize=7, textAnchor='end'))
+        drawing.add(String(x0 + plot_w + 4, y - 3, str(step), fontName='Helvetica', fontSize=7))
+    drawing.add(Line(x0, y0, x0, y0 + plot_h, strokeColor=colors.black, strokeWidth=0.5))
+    drawing.add(Line(x0 + plot_w, y0, x0 + plot_w, y0 + plot_h, strokeColor=colors.black, strokeWidth=0.5))
+
+    if subjects:
+        slot = plot_w / len(subjects)
+        bar_w = slot * 0.6
+        points = []
+        for i, name in enumerate(subjects):
+            centre = x0 + slot * (i + 0.5)
+            value = max(0, min(100, marks[i] if i < len(marks) else 0))
+            drawing.add(Rect(centre - bar_w / 2, y0, bar_w, plot_h * value / 100,
+                             fillColor=MARKS_COLOR, strokeColor=MARKS_COLOR, strokeWidth=1))
+            gp = grade_points[i] if i < len(grade_points) else 0
+            points.extend([centre, y0 + plot_h * max(0, min(10, gp)) / 10])
+
+            label = name if len(name) <= 24 else name[:23] + '…'
+            tick = Group(String(0, 0, label, fontName='Helvetica', fontSize=6.5, textAnchor='end'))
+            tick.translate(centre + 2, y0 - 6)
+            tick.rotate(45)
+            drawing.add(tick)
+
+        drawing.add(PolyLine(points, strokeColor=GRADE_POINT_COLOR, strokeWidth=2))
+        for px, py in zip(points[::2], points[1::2]):
+            drawing.add(Circle(px, py, 3, fillColor=GRADE_POINT_COLOR, strokeColor=colors.white, strokeWidth=1))
+
+    # Legend
+    legend_y = 8
+    drawing.add(Rect(width / 2 - 110, legend_y, 10, 8, fillColor=MARKS_COLOR, strokeColor=None))
+    drawing.add(String(width / 2 - 96, legend_y + 1, 'Marks (out of 100)', fontName='Helvetica', fontSize=8))
+    drawing.add(Circle(width / 2 + 15, legend_y + 4, 4, fillColor=GRADE_POINT_COLOR, strokeColor=None))
+    drawing.add(String(width / 2 + 24, legend_y + 1, 'Grade Points (out of 10)', fontName='Helvetica', fontSize=8))
+    return drawing
+
+
+def render_chart(chart_data, fmt='svg'):
+    """Render the chart to SVG or PNG bytes"""
+    drawing = build_chart_drawing(chart_data)
+    if fmt == 'svg':
+        from reportlab.graphics import renderSVG
+        return renderSVG.drawToString(drawing).encode('utf-8')
+    if fmt == 'png':
+        # Needs ReportLab's raster backend (rlPyCairo); callers fall back to SVG without it
+        from reportlab.graphics import renderPM
+        return renderPM.drawToString(drawing, fmt='PNG', dpi=144)
+    raise ValueError(f"Unsupported chart format: {fmt}")
+
+
+class ChartCache:
+    """LRU cache of rendered charts keyed by (student_id, year, semester, format)
+
+    Entries remember a fingerprint of the chart data they were rendered
+    from, so a re-import that changes the marks renders a fresh chart.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(chart_data):
+        return hashlib.sha1(json.dumps(chart_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, key, chart_data, fmt='svg'):
+        fingerprint = self.fingerprint(chart_data)
+        cache_key = key + (fmt,)
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry and entry[0] == fingerprint:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        rendered = render_chart(chart_data, fmt)
+        with self.lock:
+            self.entries[cache_key] = (fingerprint, rendered)
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return rendered
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+chart_cache = ChartCache()
@@ -0,0 +1,120 @@
+"""
+Single-flight request coalescing with a short-lived result cache
+
+When results are published, hundreds of students refresh the same result
+and PDF URLs within seconds. Coalescer.get() makes concurrent requests for
+the same key share one computation: the first caller renders, the others
+wait for its value instead of querying and rendering again. Finished values
+are then kept for COALESCE_TTL_SECONDS (default 5), so a refresh storm is
+served from memory; after an import a page can be stale for at most that
+long. Per-kind counters show how much work was deduplicated.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    """A computation in progress that other requests can wait on"""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Coalescer:
+    """Single-flight execution per key plus a small TTL cache of the results"""
+
+    def __init__(self, ttl=5.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._cache = OrderedDict()  # key -> (expires, value)
+        self._stats = {}
+
+    def _count(self, kind, counter):
+        stats = self._stats.get(kind)
+        if stats is None:
+            stats = self._stats[kind] = {'requests': 0, 'computed': 0, 'coalesced': 0, 'cache_hits': 0, 'errors': 0}
+        stats[counter] += 1
+
+    def get(self, key, compute):
+        """Value for key: cached, shared with an in-flight call, or computed here
+
+        key is a tuple whose first item names the kind of work ('result', 'pdf').
+        A None result is handed to waiting callers but not cached.
+        """
+        kind = key[0]
+        with self._lock:
+            self._count(kind, 'requests')
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self._count(kind, 'cache_hits')
+                    return entry[1]
+                del self._cache[key]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._count(kind, 'coalesced')
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is not None:
+                    self._count(kind, 'errors')
+                else:
+                    self._count(kind, 'computed')
+                    if call.value is not None and self.ttl > 0:
+                        self._cache[key] = (time.monotonic() + self.ttl, call.value)
+                        while len(self._cache) > self.max_entries:
+                            self._cache.popitem(last=False)
+            call.event.set()
+        return call.value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def discard(self, match):
+        """Drop cached values whose key satisfies match(key); returns how many"""
+        with self._lock:
+            keys = [key for key in self._cache if match(key)]
+            for key in keys:
+                del self._cache[key]
+        return len(keys)
+
+    def stats(self):
+        """Counters per kind; deduplicated = coalesced + cache_hits"""
+        with self._lock:
+            report = {kind: dict(counters) for kind, counters in self._stats.items()}
+            in_flight = len(self._calls)
+            cached = len(self._cache)
+        for counters in report.values():
+            counters['deduplicated'] = counters['coalesced'] + counters['cache_hits']
+        return {'kinds': report, 'in_flight': in_flight, 'cached': cached}
+
+
+def init_coalescing(app):
+    """Create the app's Coalescer from COALESCE_* config"""
+    coalescer = Coalescer(app.config.setdefault('COALESCE_TTL_SECONDS', 5.0),
+                          app.config.setdefault('COALESCE_CACHE_ENTRIES', 1024))
+    app.extensions['coalescer'] = coalescer
+    return coalescer
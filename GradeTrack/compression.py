@@ -0,0 +1,137 @@
+"""
+Response compression for HTML and JSON
+
+An after_request hook that gzip/brotli-compresses text responses above a
+size threshold when the client accepts it. PDFs, files sent with
+send_file (including the precompressed /assets bundles) and anything that
+already carries a Content-Encoding are left alone. Compressed bodies are
+kept in a small LRU keyed by a hash of the payload, so identical pages
+served repeatedly are only compressed once.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml',
+    'application/json', 'application/javascript', 'image/svg+xml',
+)
+
+
+class CompressedCache:
+    """LRU of compressed bodies bounded by total bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class Compressor:
+    """Compression policy and counters, installed by init_compression()"""
+
+    def __init__(self, app):
+        self.min_size = app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        self.mimetypes = set(app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES))
+        self.gzip_level = app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        self.brotli_quality = app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
+        self.cache = CompressedCache(app.config.setdefault('COMPRESS_CACHE_BYTES', 16 * 1024 * 1024))
+        self.stats = {'compressed': 0, 'skipped': 0, 'cache_hits': 0, 'bytes_in': 0, 'bytes_out': 0}
+        self.stats_lock = threading.Lock()
+
+    def choose_encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, data, encoding):
+        key = (encoding, hashlib.sha1(data).digest())
+        cached = self.cache.get(key)
+        if cached is not None:
+            with self.stats_lock:
+                self.stats['cache_hits'] += 1
+            return cached
+        if encoding == 'br':
+            body = brotli.compress(data, quality=self.brotli_quality)
+        else:
+            body = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+        self.cache.put(key, body)
+        return body
+
+    def should_compress(self, response):
+        if response.status_code < 200 or response.status_code >= 300 or response.status_code == 204:
+            return False
+        if response.direct_passthrough or response.is_streamed:
+            return False
+        if 'Content-Encoding' in response.headers:
+            return False
+        if response.mimetype not in self.mimetypes:
+            return False
+        length = response.calculate_content_length()
+        return length is not None and length >= self.min_size
+
+    def after_request(self, response):
+        if not self.should_compress(response):
+            with self.stats_lock:
+                self.stats['skipped'] += 1
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        body = self.compress(data, encoding)
+        if len(body) >= len(data):
+            return response
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if response.get_etag()[0]:
+            etag, weak = response.get_etag()
+            response.set_etag(f"{etag}-{encoding}", weak)
+        with self.stats_lock:
+            self.stats['compressed'] += 1
+            self.stats['bytes_in'] += len(data)
+            self.stats['bytes_out'] += len(body)
+        return response
+
+
+def init_compression(app):
+    """Register the compression hook and return the Compressor (for its stats)"""
+    compressor = Compressor(app)
+    app.after_request(compressor.after_request)
+    app.extensions['compressor'] = compressor
+    return compressor
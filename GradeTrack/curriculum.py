@@ -0,0 +1,161 @@
+"""
+Curriculum: the subjects and credits of each term, per regulation
+
+This is the single source for the subject lists the importers used to carry
+as dict literals. ensure_term_catalog() writes a term's entries into the
+subjects table; marks rows then reference those rows by id. Importers use
+ensure_sheet_catalog() instead, which names each subject as the result
+sheet does and takes only the credits from these lists. The lists
+themselves need no app context, so generate_cohort.py --no-db can use them
+without touching the database.
+"""
+
+DEFAULT_REGULATION = 'R23'
+
+# Branch codes: characters 7-8 of a JNTU-style roll number (232G1A3224 is branch 32)
+BRANCHES = {
+    '01': 'CIVIL', '02': 'EEE', '03': 'MECH', '04': 'ECE',
+    '05': 'CSE', '12': 'IT', '32': 'CSE (DATA SCIENCE)',
+}
+
+# Marks -> letter grade: the first band whose lower bound the marks reach, else F
+GRADE_BANDS = [(90, 'S'), (80, 'A'), (70, 'B'), (60, 'C'), (50, 'D'), (40, 'E')]
+LETTER_GRADES = ['S', 'A', 'B', 'C', 'D', 'E', 'F']
+
+
+def grade_for(marks):
+    """Letter grade of a marks total"""
+    for bound, grade in GRADE_BANDS:
+        if marks >= bound:
+            return grade
+    return 'F'
+
+
+# Credits for subjects that are not listed below
+DEFAULT_THEORY_CREDITS = 3.0
+DEFAULT_LAB_CREDITS = 1.5
+LABS_PER_TERM = 3
+
+# (regulation, year, semester) -> theory subjects as (name, credits)
+THEORY_SUBJECTS = {
+    ('R23', 1, 1): [("ENGINEERING PHYSICS", 3.0), ("LINEAR ALGEBRA & CALCULUS", 3.0),
+                    ("BASIC ELECTRICAL & ELECTRONICS ENGINEERING", 3.0), ("ENGINEERING CHEMISTRY", 3.0),
+                    ("PROBLEM SOLVING USING C", 3.0)],
+    ('R23', 1, 2): [("ENGINEERING MATHEMATICS-II", 3.0), ("ENGINEERING PHYSICS-II", 3.0),
+                    ("BASIC MECHANICAL ENGINEERING", 3.0), ("BASIC CIVIL ENGINEERING", 3.0),
+                    ("ENGINEERING GRAPHICS", 3.0), ("ENVIRONMENTAL STUDIES", 0.0)],
+    ('R23', 2, 1): [("MATHEMATICAL FOUNDATIONS FOR COMPUTER SCIENCE", 3.0), ("COMPUTER PROGRAMMING", 3.0),
+                    ("DIGITAL LOGIC DESIGN", 3.0), ("COMPUTER ORGANIZATION", 3.0), ("DATA STRUCTURES", 3.0),
+                    ("ENVIRONMENTAL SCIENCE", 0.0)],
+    ('R23', 2, 2): [("DESIGN AND ANALYSIS OF ALGORITHMS", 3.0), ("DATABASE MANAGEMENT SYSTEMS", 3.0),
+                    ("FORMAL LANGUAGES AND AUTOMATA THEORY", 3.0), ("COMPUTER NETWORKS", 3.0),
+                    ("OPERATING SYSTEMS", 3.0), ("STATISTICAL METHODS FOR DATA SCIENCE", 3.0)],
+}
+
+# (regulation, year, semester) -> labs as (name, credits); terms not listed get LABS_PER_TERM generic labs
+LAB_COURSES = {
+    ('R23', 1, 1): [("IT WORKSHOP", 1.5), ("ENGINEERING PHYSICS LAB", 1.5), ("COMPUTER PROGRAMMING LAB", 1.5),
+                    ("ELECTRICAL & ELECTRONICS ENGINEERING WORKSHOP", 1.5),
+                    ("NSS/NCC/SCOUTS & GUIDES/COMMUNITY SERVICE", 0.0)],
+}
+
+
+def branch_of(roll_number):
+    return roll_number[6:8]
+
+
+def theory_code(year, semester, position):
+    return f"TS{year}{semester}{position:02d}"
+
+
+def lab_code(year, semester, position):
+    return f"LAB{year}{semester}{position:02d}"
+
+
+def term_subjects(year, semester, regulation=DEFAULT_REGULATION):
+    """Theory entries of a term as (code, name, credits), in sheet order"""
+    names = THEORY_SUBJECTS.get((regulation, year, semester))
+    if names is None:
+        names = [(f"Subject {i + 1}", DEFAULT_THEORY_CREDITS) for i in range(5)]
+    return [(theory_code(year, semester, i + 1), name, credits) for i, (name, credits) in enumerate(names)]
+
+
+def term_labs(year, semester, regulation=DEFAULT_REGULATION):
+    """Lab entries of a term as (code, name, credits), in sheet order"""
+    labs = LAB_COURSES.get((regulation, year, semester))
+    if labs is None:
+        labs = [(f"Lab {i + 1} (Y{year}S{semester})", DEFAULT_LAB_CREDITS) for i in range(LABS_PER_TERM)]
+    return [(lab_code(year, semester, i + 1), name, credits) for i, (name, credits) in enumerate(labs)]
+
+
+def ensure_subject(year, semester, kind, code, name, credits, position, regulation=DEFAULT_REGULATION):
+    """Return the catalog row for a subject, adding it if missing (caller commits)"""
+    from app import db
+    from models import Subject
+
+    subject = Subject.query.filter_by(regulation=regulation, year=year, semester=semester, code=code).first()
+    if subject is None:
+        subject = Subject(regulation=regulation, year=year, semester=semester, kind=kind, code=code,
+                          name=name, credits=credits, position=position)
+        db.session.add(subject)
+        db.session.flush()
+    return subject
+
+
+def ensure_term_catalog(year, semester, regulation=DEFAULT_REGULATION):
+    """Make sure a term's curriculum is in the subjects table; returns (theory, labs) Subject lists"""
+    from models import Subject
+
+    theory = [ensure_subject(year, semester, Subject.THEORY, code, name, credits, i + 1, regulation)
+              for i, (code, name, credits) in enumerate(term_subjects(year, semester, regulation))]
+    labs = [ensure_subject(year, semester, Subject.LAB, code, name, credits, i + 1, regulation)
+            for i, (code, name, credits) in enumerate(term_labs(year, semester, regulation))]
+    return theory, labs
+
+
+def subject_key(name):
+    """A subject name reduced for comparison: case, spacing and punctuation are ignored"""
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in name.upper()).split())
+
+
+def sheet_entry(entries, name, position, default_credits):
+    """(name, credits) of a sheet block, given the curriculum's (code, name, credits) entries
+
+    The block keeps the sheet's name; the curriculum entry of that name (or
+    the only one it is a truncation of) supplies the credits, else the
+    default. A block whose header has no name to match takes the curriculum
+    entry at its position.
+    """
+    key = subject_key(name)
+    if not key and position <= len(entries):
+        return entries[position - 1][1:]
+    matches = [credits for _, listed, credits in entries if subject_key(listed) == key]
+    if not matches:
+        matches = [credits for _, listed, credits in entries if subject_key(listed).startswith(key + ' ')]
+    return name, matches[0] if len(matches) == 1 else default_credits
+
+
+def ensure_sheet_catalog(year, semester, theory_names, lab_names, regulation=DEFAULT_REGULATION):
+    """Catalog rows for the subjects and labs a result sheet has, in sheet order
+
+    Codes follow the sheet position; names come from the sheet (see
+    sheet_entry). A row that an earlier catalog gave another subject's name
+    is renamed and given the matching credits, since the sheet is what the
+    marks were entered against.
+    """
+    from models import Subject
+
+    def ensure(kind, code, entries, names, default_credits):
+        rows = []
+        for position, sheet_name in enumerate(names, 1):
+            name, credits = sheet_entry(entries, sheet_name, position, default_credits)
+            subject = ensure_subject(year, semester, kind, code(year, semester, position), name, credits,
+                                     position, regulation)
+            if subject_key(subject.name) != subject_key(name):
+                subject.name, subject.credits = name, credits
+            rows.append(subject)
+        return rows
+
+    return (ensure(Subject.THEORY, theory_code, term_subjects(year, semester, regulation), theory_names,
+                   DEFAULT_THEORY_CREDITS),
+            ensure(Subject.LAB, lab_code, term_labs(year, semester, regulation), lab_names, DEFAULT_LAB_CREDITS))
@@ -2,7 +2,8 @@
 Database setup script to populate the Academic Performance Tracker with sample data
 """
 from app import app, db
-from models import Student, TheorySubject, LabCourse, ClassStatistics
+from models import Enrollment, TheorySubject, LabCourse, ClassStatistics, TermVersion
+from curriculum import ensure_term_catalog
 
 def get_grade_from_marks(marks):
     """Convert marks to grade based on standard grading system"""
@@ -28,46 +29,31 @@ def setup_database():
         db.drop_all()
         db.create_all()
         
+        # Year 1, Semester 1 curriculum
+        subjects, labs = ensure_term_catalog(1, 1)
+        
         # Sample student data based on the provided PDF
-        sample_student = Student(
-            student_id='232G1A3224',
-            name='KHAZI NISHATH FATHIMA',
-            year=1,
-            semester=1
-        )
-        db.session.add(sample_student)
+        sample_student = Enrollment.create('232G1A3224', 'KHAZI NISHATH FATHIMA', 1, 1)
         
         # Theory subjects for the sample student
-        theory_subjects_data = [
-            ('Theory Subject 1 (Y1S1)', 'TS101', 76),
-            ('Theory Subject 2 (Y1S1)', 'TS102', 68),
-            ('Theory Subject 3 (Y1S1)', 'TS103', 80),
-            ('Theory Subject 4 (Y1S1)', 'TS104', 84),
-            ('Theory Subject 5 (Y1S1)', 'TS105', 64)
-        ]
+        theory_marks = [76, 68, 80, 84, 64]
         
-        for subject_name, subject_code, marks in theory_subjects_data:
+        for subject, marks in zip(subjects, theory_marks):
             theory_subject = TheorySubject(
-                student_id='232G1A3224',
-                subject_name=subject_name,
-                subject_code=subject_code,
+                enrollment=sample_student,
+                subject=subject,
                 marks=marks,
                 grade=get_grade_from_marks(marks)
             )
             db.session.add(theory_subject)
         
         # Lab courses for the sample student
-        lab_courses_data = [
-            ('Lab 1 (Y1S1)', 'LAB101', 26, 69, 95),
-            ('Lab 2 (Y1S1)', 'LAB102', 29, 56, 85),
-            ('Lab 3 (Y1S1)', 'LAB103', 25, 69, 94)
-        ]
+        lab_marks = [(26, 69, 95), (29, 56, 85), (25, 69, 94)]
         
-        for lab_name, lab_code, internal, external, total in lab_courses_data:
+        for lab, (internal, external, total) in zip(labs, lab_marks):
             lab_course = LabCourse(
-                student_id='232G1A3224',
-                lab_name=lab_name,
-                lab_code=lab_code,
+                enrollment=sample_student,
+                subject=lab,
                 internal_marks=internal,
                 external_marks=external,
                 total_marks=total,
@@ -84,35 +70,27 @@ def setup_database():
         ]
         
         for student_id, name, year, semester in additional_students:
-            student = Student(
-                student_id=student_id,
-                name=name,
-                year=year,
-                semester=semester
-            )
-            db.session.add(student)
+            student = Enrollment.create(student_id, name, year, semester)
             
             # Add random theory subjects
-            for i in range(1, 6):
+            for i, subject in enumerate(subjects, 1):
                 marks = 65 + (i * 3)  # Varying marks
                 theory_subject = TheorySubject(
-                    student_id=student_id,
-                    subject_name=f'Theory Subject {i} (Y1S1)',
-                    subject_code=f'TS10{i}',
+                    enrollment=student,
+                    subject=subject,
                     marks=marks,
                     grade=get_grade_from_marks(marks)
                 )
                 db.session.add(theory_subject)
             
             # Add random lab courses
-            for i in range(1, 4):
+            for i, lab in enumerate(labs, 1):
                 internal = 25 + i
                 external = 60 + (i * 2)
                 total = internal + external
                 lab_course = LabCourse(
-                    student_id=student_id,
-                    lab_name=f'Lab {i} (Y1S1)',
-                    lab_code=f'LAB10{i}',
+                    enrollment=student,
+                    subject=lab,
                     internal_marks=internal,
                     external_marks=external,
                     total_marks=total,
@@ -131,6 +109,7 @@ def setup_database():
             topper_student_id='232G1A3224'
         )
         db.session.add(class_stats)
+        TermVersion.bump(1, 1)
         
         # Commit all changes
         db.session.commit()
@@ -0,0 +1,78 @@
+"""
+Reconnect when the database file is swapped
+
+shadow_import.py replaces the SQLite file with os.replace(). Connections
+that are already open keep reading the old file, and new ones open the new
+file. Every DATABASE_SWAP_CHECK_SECONDS (default 1) a request hook compares
+the file's inode with the one this process started with. When it changed,
+the engine's pool is disposed and this process's coalesced pages are
+dropped. The term versions in the new file differ, so analytics matrices,
+the result snapshot and pre-rendered pages follow on their own.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+class DatabaseWatch:
+    """Inode check of one SQLite file, rate-limited to one stat per interval"""
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.inode = _inode(path) if path else None
+        self.swaps = 0
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def check(self, app, engine):
+        """Dispose engine if the file was replaced since the last check; True if it was"""
+        if not self.path or time.monotonic() - self._checked < self.interval:
+            return False
+        with self._lock:
+            self._checked = time.monotonic()
+            inode = _inode(self.path)
+            if inode is None or inode == self.inode:
+                return False
+            self.inode = inode
+            self.swaps += 1
+        engine.dispose()
+        app.extensions['coalescer'].clear()
+        logger.info("Database file %s was replaced; reconnected", self.path)
+        return True
+
+
+def check_database_swap():
+    """Run the app's swap check; for request hooks and long-lived worker processes"""
+    from flask import current_app
+    from app import db
+
+    watch = current_app.extensions.get('database_watch')
+    return watch is not None and watch.check(current_app, db.engine)
+
+
+def init_database_watch(app):
+    from app import db
+
+    with app.app_context():
+        path = db.engine.url.database if db.engine.url.get_backend_name() == 'sqlite' else None
+    if path == ':memory:':
+        path = None
+    watch = DatabaseWatch(path, app.config.setdefault('DATABASE_SWAP_CHECK_SECONDS', 1.0))
+    app.extensions['database_watch'] = watch
+    app.before_request(_before_request)
+    return watch
+
+
+def _before_request():
+    check_database_swap()  # a before_request hook must return None
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Streaming bulk export of a term's results
+
+Writes one row per student (identity, per-subject marks and grades, lab
+marks and the CGPA/percentage/result summary) for a year and semester as
+CSV, Parquet or XLSX. Students, theory rows and lab rows are read through
+three ordered server-side cursors and merged with generators, so memory
+stays flat regardless of class size and CSV/Parquet output starts
+immediately. The summary columns are the stored ones (see revaluation.py),
+built first if the term's summaries are missing or stale.
+
+    python export_results.py --year 1 --semester 1 --format csv --output y1s1.csv
+    curl -H "X-Admin-Token: $ADMIN_TOKEN" http://localhost:5000/export/1/1.parquet -o y1s1.parquet
+"""
+import argparse
+import csv
+import importlib.util
+import io
+import sys
+import tempfile
+from itertools import groupby
+
+from sqlalchemy import select
+
+from app import app, db
+from models import Student, Enrollment, Subject, TheorySubject, LabCourse
+import revaluation
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Package each format's writer needs beyond the web app's own
+REQUIRES = {'parquet': 'pyarrow', 'xlsx': 'openpyxl'}
+
+BATCH_SIZE = 1000
+SUMMARY_COLUMNS = ['total_marks', 'percentage', 'cgpa', 'result']
+
+
+def missing_package(fmt):
+    """Name of the package the format needs but is not installed, or None"""
+    package = REQUIRES.get(fmt)
+    if package and importlib.util.find_spec(package) is None:
+        return package
+    return None
+
+
+def term_columns(year, semester):
+    """Subject and lab (code, name) lists for the term, in sheet order"""
+    term = (Enrollment.year == year) & (Enrollment.semester == semester)
+    subjects = db.session.execute(
+        select(Subject.code, Subject.name)
+        .join(TheorySubject, TheorySubject.subject_id == Subject.id)
+        .join(Enrollment, Enrollment.id == TheorySubject.enrollment_id)
+        .where(term).group_by(Subject.id).order_by(Subject.position, Subject.code)).all()
+    labs = db.session.execute(
+        select(Subject.code, Subject.name)
+        .join(LabCourse, LabCourse.subject_id == Subject.id)
+        .join(Enrollment, Enrollment.id == LabCourse.enrollment_id)
+        .where(term).group_by(Subject.id).order_by(Subject.position, Subject.code)).all()
+    return [tuple(r) for r in subjects], [tuple(r) for r in labs]
+
+
+def header_for(subjects, labs):
+    header = ['student_id', 'name', 'year', 'semester']
+    for code, _ in subjects:
+        header += [f"{code}_marks", f"{code}_grade"]
+    for code, _ in labs:
+        header += [f"{code}_internal", f"{code}_external", f"{code}_total", f"{code}_grade"]
+    return header + SUMMARY_COLUMNS
+
+
+def _stream(statement, batch_size):
+    """Execute with a server-side cursor and yield rows batch by batch"""
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions():
+        yield from partition
+
+
+def iter_term_rows(year, semester, subjects, labs, batch_size=BATCH_SIZE):
+    """Yield one flat list per student, aligned with header_for(subjects, labs)"""
+    term = (Enrollment.year == year) & (Enrollment.semester == semester)
+    students = _stream(
+        select(Student.student_id, Student.name, Enrollment.percentage, Enrollment.cgpa, Enrollment.passed)
+        .join(Enrollment).where(term).order_by(Student.student_id),
+        batch_size)
+    theory = _stream(
+        select(Student.student_id, Subject.code, TheorySubject.marks, TheorySubject.grade)
+        .select_from(TheorySubject).join(Enrollment).join(Student)
+        .join(Subject, Subject.id == TheorySubject.subject_id).where(term)
+        .order_by(Student.student_id), batch_size)
+    lab_rows = _stream(
+        select(Student.student_id, Subject.code, LabCourse.internal_marks,
+               LabCourse.external_marks, LabCourse.total_marks, LabCourse.grade)
+        .select_from(LabCourse).join(Enrollment).join(Student)
+        .join(Subject, Subject.id == LabCourse.subject_id).where(term)
+        .order_by(Student.student_id), batch_size)
+
+    subject_index = {code: i for i, (code, _) in enumerate(subjects)}
+    lab_index = {code: i for i, (code, _) in enumerate(labs)}
+    theory_groups = groupby(theory, key=lambda r: r[0])
+    lab_groups = groupby(lab_rows, key=lambda r: r[0])
+    next_theory = next(theory_groups, None)
+    next_lab = next(lab_groups, None)
+
+    for student_id, name, percentage, cgpa, passed in students:
+        # Advance each ordered stream up to this student (skips rows of unknown students)
+        while next_theory and next_theory[0] < student_id:
+            next_theory = next(theory_groups, None)
+        while next_lab and next_lab[0] < student_id:
+            next_lab = next(lab_groups, None)
+        student_theory = list(next_theory[1]) if next_theory and next_theory[0] == student_id else []
+        student_labs = list(next_lab[1]) if next_lab and next_lab[0] == student_id else []
+
+        row = [student_id, name, year, semester]
+        theory_cells = [None] * (2 * len(subjects))
+        lab_cells = [None] * (4 * len(labs))
+        total_marks = 0
+
+        for _, code, marks, grade in student_theory:
+            i = subject_index[code]
+            theory_cells[2 * i:2 * i + 2] = [marks, grade]
+            total_marks += marks
+        for _, code, internal, external, total, grade in student_labs:
+            i = lab_index[code]
+            lab_cells[4 * i:4 * i + 4] = [internal, external, total, grade]
+            total_marks += total
+
+        yield row + theory_cells + lab_cells + [total_marks, percentage, cgpa, 'PASS' if passed else 'FAIL']
+
+
+def csv_chunks(header, rows, rows_per_chunk=500):
+    """Yield encoded CSV text a few hundred rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % rows_per_chunk == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_chunks(header, rows, rows_per_group=10000):
+    """Yield a Parquet file one row group at a time (check missing_package('parquet') first)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, _parquet_type(pa, name)) for name in header])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    batch = []
+
+    def flush():
+        writer.write_table(pa.table({name: [r[i] for r in batch] for i, name in enumerate(header)}, schema=schema))
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= rows_per_group:
+            flush()
+            yield sink.drain()
+    if batch:
+        flush()
+    writer.close()
+    yield sink.drain()
+
+
+def _parquet_type(pa, column):
+    if column in ('student_id', 'name', 'result') or column.endswith('_grade'):
+        return pa.string()
+    if column in ('percentage', 'cgpa'):
+        return pa.float32()
+    if column == 'total_marks':
+        return pa.int32()
+    return pa.int16()
+
+
+def xlsx_chunks(header, rows, chunk_size=64 * 1024):
+    """Write a write-only workbook to a temporary file, then yield it in chunks
+
+    XLSX is a zip archive that is finalised on save, so unlike CSV/Parquet
+    nothing can be sent before the last row; memory still stays flat.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Results')
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    with tempfile.TemporaryFile() as fh:
+        wb.save(fh)
+        fh.seek(0)
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+WRITERS = {'csv': csv_chunks, 'parquet': parquet_chunks, 'xlsx': xlsx_chunks}
+
+
+def export_chunks(year, semester, fmt, batch_size=BATCH_SIZE):
+    """Generator of output bytes for a whole term (needs an app context)
+
+    Builds the term's stored summaries first when they are missing or stale,
+    so that happens before the first byte is sent.
+    """
+    revaluation.ensure_summaries(year, semester)
+    subjects, labs = term_columns(year, semester)
+    header = header_for(subjects, labs)
+    return WRITERS[fmt](header, iter_term_rows(year, semester, subjects, labs, batch_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--semester', type=int, required=True)
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--output', help='output file (default: stdout for csv)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not args.output and args.format != 'csv':
+        parser.error('--output is required for parquet and xlsx')
+    missing = missing_package(args.format)
+    if missing:
+        parser.error(f'{args.format} export needs the {missing} package')
+
+    with app.app_context():
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_chunks(args.year, args.semester, args.format, args.batch_size):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    if args.output:
+        print(f"Exported Year {args.year}, Semester {args.semester} to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,183 +1,204 @@
 #!/usr/bin/env python3
 """
 Final correct import script based on exact Excel structure analysis
+
+Students are committed in batches of --batch-size rows. Each batch commit
+also records the number of sheet rows done in import_checkpoints, and the
+session is cleared between batches so memory does not grow with the
+workbook. If an import stops (an error in one batch, a crash), run again
+with --resume: committed data is kept and every workbook continues after
+its last committed batch. Finished workbooks are skipped, and a workbook
+whose contents changed starts over. The term version is bumped with the
+last batch, so caches only switch once the term is complete.
+
+    python final_import.py                # clear the database and import everything
+    python final_import.py --resume       # continue an interrupted import
+
+Each step runs as a named phase (read_excel, layout, extract, catalog,
+checkpoint, convert, existence, build, insert, commit); bench_import.py
+times them.
+
+This writes to the database in place. To reload a live site, use
+shadow_import.py, which runs this script against a side file and swaps it
+in when it is complete.
 """
-import pandas as pd
+import argparse
+import hashlib
+import sys
+from datetime import datetime
+
+from sqlalchemy import select
+
 from app import app, db
-from models import Student, TheorySubject, LabCourse
+from models import Student, Enrollment, TheorySubject, LabCourse, TermVersion, ImportCheckpoint
+from curriculum import ensure_sheet_catalog
+from sheet_layout import read_raw, detect_layout, extract, stored_marks
+from prewarm import prewarm_terms
+from profiling import phase
 
-def get_grade_from_marks(marks):
-    """Convert marks to grade"""
-    if marks == "LONG ABSENT" or marks == "" or marks is None or str(marks).strip() == "":
-        return 'F'
-    try:
-        marks_num = float(marks)
-        if marks_num >= 90: return 'S'
-        elif marks_num >= 80: return 'A'  
-        elif marks_num >= 70: return 'B'
-        elif marks_num >= 60: return 'C'
-        elif marks_num >= 50: return 'D'
-        elif marks_num >= 40: return 'E'
-        else: return 'F'
-    except (ValueError, TypeError):
-        return 'F'
+BATCH_SIZE = 200
 
-def clean_marks_value(marks):
-    """Clean marks value"""
-    if marks == "LONG ABSENT" or str(marks).strip() == "" or marks is None:
-        return None
-    try:
-        return int(float(marks))
-    except (ValueError, TypeError):
-        return None
+# Result workbooks and the term each one holds
+WORKBOOKS = [
+    ("attached_assets/1-1 SEMESTER RESULTS_1756310639227.xlsx", 1, 1),
+    ("attached_assets/1-2 SEMESTER RESULTS_1756310650480.xlsx", 1, 2),
+    ("attached_assets/2-1 SEMESTER RESULTS_1756310657928.xlsx", 2, 1),
+    ("attached_assets/2-2 SEMESTER RESULTS_1756310665347.xlsx", 2, 2),
+]
 
-def import_correct_semester_data(excel_file, year, semester):
-    """Import semester data correctly based on exact column mapping"""
-    print(f"\nImporting {excel_file} -> Year {year}, Semester {semester}")
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def add_students(sheet, theory, lab_columns, subject_ids, lab_ids, year, semester, rows):
+    """Add the enrollments and marks of the given sheet rows to the session"""
+    batch_ids = [sheet.student_ids[i] for i in rows]
+    with phase('existence'):
+        # The batch's known students, and which of them already have this term
+        found = db.session.execute(
+            select(Student, Enrollment.id)
+            .outerjoin(Enrollment, (Enrollment.student_pk == Student.id)
+                       & (Enrollment.year == year) & (Enrollment.semester == semester))
+            .where(Student.student_id.in_(batch_ids))).all()
+        students = {student.student_id: student for student, _ in found}
+        existing = {student.student_id for student, enrollment_id in found if enrollment_id is not None}
     
-    try:
-        # Read with header=1 to get the right structure
-        df = pd.read_excel(excel_file, header=1)
-        
-        # Filter valid students
-        df = df.dropna(subset=[df.columns[0]])
-        df = df[df.iloc[:, 0] != 'STUDENT ID']
-        df = df[df.iloc[:, 0].notna()]
-        
-        print(f"Processing {len(df)} students")
-        
-        # Subject names for each semester
-        subject_names = {
-            (1,1): ["ENGINEERING PHYSICS", "LINEAR ALGEBRA & CALCULUS", 
-                   "BASIC ELECTRICAL & ELECTRONICS ENGINEERING", "ENGINEERING CHEMISTRY", 
-                   "PROBLEM SOLVING USING C"],
-            (1,2): ["ENGINEERING MATHEMATICS-II", "ENGINEERING PHYSICS-II", 
-                   "BASIC MECHANICAL ENGINEERING", "BASIC CIVIL ENGINEERING", 
-                   "ENGINEERING GRAPHICS", "ENVIRONMENTAL STUDIES"],
-            (2,1): ["MATHEMATICAL FOUNDATIONS FOR COMPUTER SCIENCE", "COMPUTER PROGRAMMING", 
-                   "DIGITAL LOGIC DESIGN", "COMPUTER ORGANIZATION", "DATA STRUCTURES"],
-            (2,2): ["DESIGN AND ANALYSIS OF ALGORITHMS", "DATABASE MANAGEMENT SYSTEMS", 
-                   "FORMAL LANGUAGES AND AUTOMATA THEORY", "COMPUTER NETWORKS", 
-                   "OPERATING SYSTEMS"]
-        }
+    with phase('build'):
+        for i in rows:
+            student_id, student_name = sheet.student_ids[i], sheet.names[i]
+            # Check if student exists
+            if student_id in existing:
+                print(f"Student {student_id} exists, skipping...")
+                continue
+            existing.add(student_id)
         
-        subjects = subject_names.get((year, semester), [f"Subject {i+1}" for i in range(5)])
+            student = Enrollment.create(student_id, student_name, year, semester, students)
         
-        # Theory marks are in columns 2, 4, 6, 8, 10 (TOTAL columns)
-        theory_cols = [2, 4, 6, 8, 10]
+            for subject_id, (marks, grades) in zip(subject_ids, theory):
+                db.session.add(TheorySubject(enrollment=student, subject_id=subject_id,
+                                             marks=int(marks[i]), grade=str(grades[i])))
         
-        for index, row in df.iterrows():
-            try:
-                student_id = str(row.iloc[0]).strip()
-                student_name = str(row.iloc[1]).strip()
-                
-                if student_id in ['nan', 'NaN', ''] or student_name in ['nan', 'NaN', '']:
-                    continue
-                
-                # Check if student exists
-                existing = Student.query.filter_by(
-                    student_id=student_id, year=year, semester=semester).first()
-                if existing:
-                    print(f"Student {student_id} exists, skipping...")
-                    continue
-                
-                # Create student
-                student = Student(
-                    student_id=student_id,
-                    name=student_name,
-                    year=year,
-                    semester=semester
-                )
-                db.session.add(student)
-                
-                # Import theory subjects from correct columns
-                for i, col_idx in enumerate(theory_cols):
-                    if i < len(subjects) and col_idx < len(df.columns):
-                        marks_value = row.iloc[col_idx]
-                        cleaned_marks = clean_marks_value(marks_value)
-                        
-                        theory_subject = TheorySubject(
-                            student_id=student_id,
-                            subject_name=subjects[i],
-                            subject_code=f"TS{year}{semester}{i+1:02d}",
-                            marks=cleaned_marks if cleaned_marks is not None else 0,
-                            grade=get_grade_from_marks(marks_value)
-                        )
-                        db.session.add(theory_subject)
-                
-                # Import lab data from columns 16+ (Internal, External, Total, Grade pattern)
-                lab_start_col = 16
-                lab_count = 0
-                
-                for i in range(0, 15, 4):  # Check every 4 columns for lab data
-                    if lab_start_col + i + 2 < len(df.columns):
-                        internal = row.iloc[lab_start_col + i]
-                        external = row.iloc[lab_start_col + i + 1] 
-                        total = row.iloc[lab_start_col + i + 2]
-                        
-                        # Check if this looks like lab data
-                        if pd.notna(total) and str(total) != 'nan':
-                            try:
-                                total_num = float(total)
-                                if 0 <= total_num <= 100:
-                                    lab_count += 1
-                                    cleaned_internal = clean_marks_value(internal)
-                                    cleaned_external = clean_marks_value(external) 
-                                    cleaned_total = clean_marks_value(total)
-                                    
-                                    lab_course = LabCourse(
-                                        student_id=student_id,
-                                        lab_name=f"Lab {lab_count} (Y{year}S{semester})",
-                                        lab_code=f"LAB{year}{semester}{lab_count:02d}",
-                                        internal_marks=cleaned_internal or 0,
-                                        external_marks=cleaned_external or 0,
-                                        total_marks=cleaned_total or 0,
-                                        grade=get_grade_from_marks(total)
-                                    )
-                                    db.session.add(lab_course)
-                                    
-                                    if lab_count >= 3:  # Limit to 3 labs
-                                        break
-                            except (ValueError, TypeError):
-                                continue
-                
-                print(f"Added: {student_id} - {student_name}")
-                
-            except Exception as e:
-                print(f"Error processing {student_id}: {e}")
-                continue
+            # A lab without a total (not taken) gets no row
+            for lab_id, (internal, external, total, grades, present) in zip(lab_ids, lab_columns):
+                if present[i]:
+                    db.session.add(LabCourse(enrollment=student, subject_id=lab_id,
+                                             internal_marks=int(internal[i]), external_marks=int(external[i]),
+                                             total_marks=int(total[i]), grade=str(grades[i])))
         
-        db.session.commit()
-        print(f"Successfully imported Year {year}, Semester {semester}")
+            print(f"Added: {student_id} - {student_name}")
+
+def import_correct_semester_data(excel_file, year, semester, batch_size=BATCH_SIZE):
+    """Import a semester workbook in batches, continuing after its last committed batch; True when complete"""
+    print(f"\nImporting {excel_file} -> Year {year}, Semester {semester}")
+    
+    try:
+        with phase('read_excel'):
+            raw = read_raw(excel_file)
+        with phase('layout'):
+            layout = detect_layout(raw)
+        with phase('extract'):
+            sheet = extract(raw, layout)
+        del raw
+        print(f"Processing {len(sheet.student_ids)} students: "
+              f"{len(layout.theory)} theory subjects, {len(layout.labs)} labs")
         
+        # Catalog rows for the term's subjects and labs, one per column block
+        with phase('catalog'):
+            subjects, labs = ensure_sheet_catalog(year, semester, [b.name for b in layout.theory],
+                                                  [b.name for b in layout.labs])
+            # Ids rather than objects: the session is cleared after every batch
+            subject_ids = [subject.id for subject in subjects]
+            lab_ids = [lab.id for lab in labs]
+        with phase('checkpoint'):
+            checkpoint = ImportCheckpoint.start(excel_file, file_digest(excel_file), year, semester,
+                                                len(sheet.student_ids))
+            db.session.commit()
+        checkpoint_id, done, total = checkpoint.id, checkpoint.rows_done, checkpoint.total_rows
+        finished = checkpoint.completed_at is not None
     except Exception as e:
         print(f"Error reading {excel_file}: {e}")
         db.session.rollback()
+        return False
+    
+    if finished:
+        print("Already imported, skipping")
+        return True
+    if done:
+        print(f"Resuming after row {done} of {total}")
+    
+    # Whole columns converted at once; the batches below only build rows
+    with phase('convert'):
+        theory = [(stored_marks(marks), grades) for marks, grades in sheet.theory]
+        lab_columns = [(stored_marks(internal), stored_marks(external), stored_marks(total), grades,
+                        (total >= 0) & (total <= 100))
+                       for internal, external, total, grades in sheet.labs]
+    
+    while True:
+        end = min(done + batch_size, total)
+        try:
+            add_students(sheet, theory, lab_columns, subject_ids, lab_ids, year, semester, range(done, end))
+            with phase('insert'):
+                db.session.flush()
+            with phase('commit'):
+                checkpoint = db.session.get(ImportCheckpoint, checkpoint_id)
+                checkpoint.rows_done = end
+                checkpoint.updated_at = datetime.utcnow()
+                if end == total:
+                    # Invalidate caches built from the previous data for this term
+                    TermVersion.bump(year, semester)
+                    checkpoint.completed_at = checkpoint.updated_at
+                db.session.commit()
+        except Exception as e:
+            print(f"Error importing rows {done + 1}-{end} of {excel_file}: {e}")
+            print(f"Rows 1-{done} are saved; run again with --resume to continue")
+            db.session.rollback()
+            return False
+        finally:
+            # Committed objects are not needed again; keep the session's memory bounded
+            db.session.expunge_all()
+        done = end
+        if done == total:
+            break
+        print(f"Committed {done}/{total} rows")
+    
+    print(f"Successfully imported Year {year}, Semester {semester}")
+    return True
 
 def main():
     """Main import function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resume', action='store_true', help='keep imported data and continue from the checkpoints')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='students per commit')
+    parser.add_argument('--no-prewarm', action='store_true', help='skip pre-rendering the results')
+    args = parser.parse_args()
+    
     with app.app_context():
-        print("Clearing existing data...")
-        db.drop_all()
-        db.create_all()
+        if not args.resume:
+            print("Clearing existing data...")
+            db.drop_all()
+            db.create_all()
         
         # Import each semester
-        files = [
-            ("attached_assets/1-1 SEMESTER RESULTS_1756310639227.xlsx", 1, 1),
-            ("attached_assets/1-2 SEMESTER RESULTS_1756310650480.xlsx", 1, 2), 
-            ("attached_assets/2-1 SEMESTER RESULTS_1756310657928.xlsx", 2, 1),
-            ("attached_assets/2-2 SEMESTER RESULTS_1756310665347.xlsx", 2, 2)
-        ]
-        
-        for excel_file, year, semester in files:
-            import_correct_semester_data(excel_file, year, semester)
+        failed = [excel_file for excel_file, year, semester in WORKBOOKS
+                  if not import_correct_semester_data(excel_file, year, semester, args.batch_size)]
         
         # Verify import
         print("\n=== IMPORT VERIFICATION ===")
         for year in [1, 2]:
             for semester in [1, 2]:
-                count = Student.query.filter_by(year=year, semester=semester).count()
+                count = Enrollment.query.filter_by(year=year, semester=semester).count()
                 print(f"Year {year}, Semester {semester}: {count} students")
+    
+    if failed:
+        sys.exit(f"\nNot imported: {', '.join(failed)}; fix the problem and run again with --resume")
+    if args.no_prewarm:
+        return
+    # Render every imported result before students start opening them
+    print("\n=== PRE-WARMING RESULTS ===")
+    prewarm_terms([(year, semester) for _, year, semester in WORKBOOKS])
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Freeze every result page into a static site for results day
+
+Results only change on import, so on peak day the pages can be served by
+any static file server (nginx, a CDN bucket) instead of Flask:
+
+    python freeze.py --output site/ --pdfs --workers 4
+
+Layout of the output directory:
+
+    index.html                           search form, answered from lookup.json
+    lookup.json                          roll number -> ["1-1", "1-2", ...]
+    result/<roll>/<year>/<semester>/     index.html, chart.svg, result.pdf (--pdfs)
+    static/, assets/                     stylesheets, scripts and built bundles
+    freeze-manifest.json                 digests used by the next run
+
+Re-running is incremental. Each student-term gets a digest of its result
+data plus the term's class statistics, and only pages whose digest changed
+are re-rendered and rewritten. Pages of students that disappeared are
+removed. A change to the templates, the asset bundles or --pdfs re-renders
+everything. Rendering runs in a pool of worker processes.
+
+Without --pdfs the PDF button still links to /download_pdf, so proxy that
+path (and nothing else) to the Flask app.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app import app
+from assets import STATIC_DIR, DIST_DIR, manifest_fingerprint
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+MANIFEST_NAME = 'freeze-manifest.json'
+SEARCH_SCRIPT = '<script src="/static/js/static-search.js"></script>'
+
+
+def write_file(path, data):
+    """Atomically replace path, so the file server never sends a partial file"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def page_dir(output, student_id, year, semester):
+    return os.path.join(output, 'result', student_id, str(year), str(semester))
+
+
+def layout_fingerprint(pdfs):
+    """Changes whenever every page must be re-rendered: templates, bundles or options"""
+    digest = hashlib.sha1(manifest_fingerprint().encode())
+    for name in sorted(os.listdir(TEMPLATES_DIR)):
+        with open(os.path.join(TEMPLATES_DIR, name), 'rb') as fh:
+            digest.update(name.encode() + fh.read())
+    digest.update(b'pdfs' if pdfs else b'')
+    return digest.hexdigest()
+
+
+def result_digests():
+    """(roll, year, semester) -> digest of everything shown on that result page, archived batches included"""
+    import analytics
+    from routes import get_result_data
+    from snapshot import load_snapshot
+
+    with app.app_context():
+        snapshot = load_snapshot()
+        stats = {}
+        digests = {}
+        for records in snapshot.by_roll.values():
+            for record in records:
+                term = (record.year, record.semester)
+                if term not in stats:
+                    stats[term] = analytics.get_term_matrix(*term).class_statistics()
+                payload = json.dumps([get_result_data(record), stats[term]], sort_keys=True)
+                digests[(record.student_id, record.year, record.semester)] = \
+                    hashlib.sha1(payload.encode()).hexdigest()
+    return digests
+
+
+def _freeze_chunk(output, keys, pdfs):
+    """Render one chunk of student-terms into the output tree; returns the count written"""
+    from flask import url_for
+    from app import db
+    from charts import render_chart
+    from routes import render_result_page, render_result_pdf, get_chart_data
+    from snapshot import find_result
+
+    written = 0
+    with app.test_request_context():
+        for student_id, year, semester in keys:
+            page = render_result_page(student_id, year, semester)
+            if page is None:
+                continue
+            target = page_dir(output, student_id, year, semester)
+            # Point the page's dynamic links at the files written next to it
+            chart_url = url_for('chart_image', student_id=student_id, year=year, semester=semester, fmt='svg')
+            page = page.replace(f'"{chart_url}"', '"chart.svg"')
+            write_file(os.path.join(target, 'chart.svg'),
+                       render_chart(get_chart_data(find_result(student_id, year, semester)), 'svg'))
+            if pdfs:
+                pdf_url = url_for('download_pdf', student_id=student_id, year=year, semester=semester)
+                page = page.replace(f'"{pdf_url}"', '"result.pdf"')
+                write_file(os.path.join(target, 'result.pdf'), render_result_pdf(student_id, year, semester))
+            write_file(os.path.join(target, 'index.html'), page)
+            db.session.remove()
+            written += 1
+    return written
+
+
+def copy_static(output):
+    shutil.copytree(STATIC_DIR, os.path.join(output, 'static'), dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns('dist'))
+    if os.path.isdir(DIST_DIR):
+        # Fingerprinted bundles are linked as /assets/<name>
+        shutil.copytree(DIST_DIR, os.path.join(output, 'assets'), dirs_exist_ok=True)
+
+
+def write_index(output, digests):
+    from flask import render_template
+
+    lookup = {}
+    for student_id, year, semester in sorted(digests):
+        lookup.setdefault(student_id, []).append(f"{year}-{semester}")
+    write_file(os.path.join(output, 'lookup.json'), json.dumps(lookup, separators=(',', ':')))
+
+    with app.test_request_context():
+        page = render_template('index.html')
+    write_file(os.path.join(output, 'index.html'), page.replace('</body>', f'{SEARCH_SCRIPT}\n</body>'))
+
+
+def load_freeze_manifest(output):
+    try:
+        with open(os.path.join(output, MANIFEST_NAME)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {'layout': None, 'entries': {}}
+
+
+def freeze(output, pdfs=False, workers=None, chunk_size=50, progress=print):
+    """Bring the static tree in output up to date; returns counts of what changed"""
+    started = time.monotonic()
+    output = os.path.abspath(output)
+    workers = workers or os.cpu_count() or 1
+    previous = load_freeze_manifest(output)
+    layout = layout_fingerprint(pdfs)
+    full = previous['layout'] != layout
+
+    digests = result_digests()
+    entries, changed = {}, []
+    for key, digest in digests.items():
+        name = '/'.join(map(str, key))
+        entries[name] = digest
+        if full or previous['entries'].get(name) != digest:
+            changed.append(key)
+    removed = [name for name in previous['entries'] if name not in entries]
+    progress(f"{len(digests)} student-terms: {len(changed)} to render, "
+             f"{len(digests) - len(changed)} unchanged, {len(removed)} to remove"
+             + (" (templates, bundles or options changed)" if full and previous['layout'] else ""))
+
+    copy_static(output)
+    written = 0
+    if changed:
+        from prewarm import _init_worker
+
+        chunks = [changed[i:i + chunk_size] for i in range(0, len(changed), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(0, 0)) as pool:
+            futures = [pool.submit(_freeze_chunk, output, chunk, pdfs) for chunk in chunks]
+            for done, future in enumerate(as_completed(futures), 1):
+                written += future.result()
+                if done % max(1, len(chunks) // 10) == 0 or done == len(chunks):
+                    progress(f"Rendered {written}/{len(changed)} pages")
+
+    for name in removed:
+        shutil.rmtree(os.path.join(output, 'result', *name.split('/')), ignore_errors=True)
+
+    write_index(output, digests)
+    # Written last: if a run is interrupted, the next one re-renders whatever was left
+    write_file(os.path.join(output, MANIFEST_NAME),
+               json.dumps({'layout': layout, 'pdfs': pdfs, 'entries': entries}, sort_keys=True))
+    return {'student_terms': len(digests), 'rendered': written, 'removed': len(removed),
+            'seconds': round(time.monotonic() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', required=True, help='directory for the static site')
+    parser.add_argument('--pdfs', action='store_true', help='also write each result PDF')
+    parser.add_argument('--workers', type=int, help='render processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    summary = freeze(args.output, pdfs=args.pdfs, workers=args.workers)
+    print(f"Done: rendered {summary['rendered']} of {summary['student_terms']} student-terms, "
+          f"removed {summary['removed']}, {summary['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
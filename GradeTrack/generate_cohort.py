@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Synthetic cohort generator for scale testing
+
+Writes realistic students, theory subjects and labs for any number of
+batches, branches and semesters straight into the database with bulk
+inserts, and can also emit result workbooks in the same layout as the
+sheets in attached_assets/ so the importers can be benchmarked.
+
+    python generate_cohort.py --students-per-class 600 --batches 23 24 --branches 05 32
+    python generate_cohort.py --students-per-class 60 --terms 1-1 1-2 --excel-dir /tmp/sheets --no-db
+"""
+import argparse
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field, asdict
+
+from curriculum import BRANCHES, branch_of, grade_for, term_subjects, term_labs
+
+# JNTU-style roll number: <batch><college>1A<branch><seq>, e.g. 232G1A3224
+COLLEGE_CODE = '2G'
+
+FIRST_NAMES = ["AKULA", "ANNAGIRI", "BANDI", "CHINTHA", "DASARI", "GADDAM", "KHAZI", "KONDA",
+               "MALLELA", "NALLAPU", "PALLE", "REDDY", "SHAIK", "THOTA", "VADDE", "YERRA"]
+LAST_NAMES = ["DINAKAR", "GOUTHAM", "NISHATH FATHIMA", "SRAVANI", "MAHESH", "LAKSHMI", "RAHUL",
+              "HARIKA", "VENKATESH", "DIVYA", "IRFAN", "PRANATHI", "SAI KIRAN", "TEJASWI"]
+
+ABSENT = "LONG ABSENT"
+
+
+@dataclass
+class MarksProfile:
+    """Shape of the generated marks distribution"""
+    theory_mean: float = 62.0
+    theory_std: float = 14.0
+    ability_std: float = 9.0        # per-student offset shared by all subjects
+    difficulty_std: float = 5.0     # per-subject offset shared by all students
+    lab_internal: tuple = (18, 30)
+    lab_external: tuple = (40, 70)
+    absent_rate: float = 0.01       # share of theory marks recorded as LONG ABSENT
+    fail_rate: float = 0.05         # extra share of theory marks forced below the pass mark
+    lab_fail_rate: float = 0.01
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as fh:
+            return cls(**json.load(fh))
+
+
+@dataclass
+class TermRecord:
+    """One student's generated results for one term"""
+    student_id: str
+    name: str
+    year: int
+    semester: int
+    theory: list = field(default_factory=list)  # (name, code, marks or ABSENT)
+    labs: list = field(default_factory=list)    # (name, code, internal, external, total)
+
+
+def grade_of(marks):
+    """Letter grade of generated marks; absent students fail"""
+    return 'F' if marks == ABSENT or marks is None else grade_for(marks)
+
+
+def subjects_for(year, semester):
+    """Theory subject names and codes for a term, from the curriculum"""
+    return [(name, code) for code, name, _ in term_subjects(year, semester)]
+
+
+def labs_for(year, semester):
+    return [(name, code) for code, name, _ in term_labs(year, semester)]
+
+
+def roll_number(batch, branch, seq):
+    """Sequence numbers run 01-99 then A0-Z9 like JNTU, and widen beyond that"""
+    if seq < 100:
+        suffix = f"{seq:02d}"
+    elif seq < 360:
+        suffix = f"{chr(ord('A') + (seq - 100) // 10)}{(seq - 100) % 10}"
+    else:
+        suffix = f"{seq:04d}"
+    return f"{batch}{COLLEGE_CODE}1A{branch}{suffix}"
+
+
+def parse_term(value):
+    year, semester = value.split('-')
+    return int(year), int(semester)
+
+
+def generate(batches, branches, terms, students_per_class, profile=None, seed=0):
+    """Yield TermRecord objects for every student of every class and term"""
+    profile = profile or MarksProfile()
+    rng = random.Random(seed)
+    clamp = lambda v, lo=0, hi=100: max(lo, min(hi, int(round(v))))
+
+    for batch in batches:
+        for branch in branches:
+            students = []
+            for seq in range(1, students_per_class + 1):
+                name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                students.append((roll_number(batch, branch, seq), name, rng.gauss(0, profile.ability_std)))
+
+            for year, semester in terms:
+                subjects = subjects_for(year, semester)
+                labs = labs_for(year, semester)
+                difficulty = [rng.gauss(0, profile.difficulty_std) for _ in subjects]
+
+                for student_id, name, ability in students:
+                    record = TermRecord(student_id, name, year, semester)
+                    for (subject_name, code), offset in zip(subjects, difficulty):
+                        roll = rng.random()
+                        if roll < profile.absent_rate:
+                            marks = ABSENT
+                        elif roll < profile.absent_rate + profile.fail_rate:
+                            marks = rng.randint(5, 39)
+                        else:
+                            marks = clamp(rng.gauss(profile.theory_mean + ability - offset, profile.theory_std))
+                        record.theory.append((subject_name, code, marks))
+                    for lab_name, code in labs:
+                        internal = rng.randint(*profile.lab_internal)
+                        if rng.random() < profile.lab_fail_rate:
+                            external = rng.randint(0, max(0, 39 - internal))
+                        else:
+                            external = clamp(rng.randint(*profile.lab_external) + ability / 3, 0, 70)
+                        record.labs.append((lab_name, code, internal, external, internal + external))
+                    yield record
+
+
+def write_database(records, chunk_size=20000):
+    """Bulk insert generated records, then build each term's summaries and statistics; returns counts"""
+    from sqlalchemy import select, func
+    from app import app, db
+    from models import Student, Enrollment, TheorySubject, LabCourse, TermVersion
+    from curriculum import ensure_term_catalog
+    import revaluation
+
+    counts = {'students': 0, 'enrollments': 0, 'theory_subjects': 0, 'lab_courses': 0}
+    terms = set()
+
+    with app.app_context():
+        conn = db.session.connection()
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        students, enrollments, theory, labs = [], [], [], []
+        catalogs = {}
+        # Rows are inserted with explicit ids so marks can reference them without a round trip
+        student_pks = dict(conn.execute(select(Student.student_id, Student.id)).all())
+        next_student = (conn.execute(select(func.max(Student.id))).scalar() or 0) + 1
+        next_enrollment = (conn.execute(select(func.max(Enrollment.id))).scalar() or 0) + 1
+
+        def catalog(year, semester):
+            """code -> subject id for a term, adding its subjects on first use"""
+            if (year, semester) not in catalogs:
+                entries = sum(ensure_term_catalog(year, semester), [])
+                catalogs[(year, semester)] = {s.code: s.id for s in entries}
+            return catalogs[(year, semester)]
+
+        def flush():
+            if students:
+                conn.execute(Student.__table__.insert(), students)
+            if enrollments:
+                conn.execute(Enrollment.__table__.insert(), enrollments)
+            if theory:
+                conn.execute(TheorySubject.__table__.insert(), theory)
+            if labs:
+                conn.execute(LabCourse.__table__.insert(), labs)
+            counts['students'] += len(students)
+            counts['enrollments'] += len(enrollments)
+            counts['theory_subjects'] += len(theory)
+            counts['lab_courses'] += len(labs)
+            students.clear(); enrollments.clear(); theory.clear(); labs.clear()
+
+        for record in records:
+            student_pk = student_pks.get(record.student_id)
+            if student_pk is None:
+                student_pk = student_pks[record.student_id] = next_student
+                next_student += 1
+                students.append({'id': student_pk, 'student_id': record.student_id, 'name': record.name})
+            enrollment_id = next_enrollment
+            next_enrollment += 1
+            enrollments.append({'id': enrollment_id, 'student_pk': student_pk,
+                                'year': record.year, 'semester': record.semester,
+                                'roll_number': record.student_id, 'student_name': record.name,
+                                'branch': branch_of(record.student_id)})
+            subjects = catalog(record.year, record.semester)
+            terms.add((record.year, record.semester))
+            for _, code, marks in record.theory:
+                theory.append({'enrollment_id': enrollment_id, 'subject_id': subjects[code],
+                               'marks': 0 if marks == ABSENT else marks, 'grade': grade_of(marks)})
+            for _, code, internal, external, total in record.labs:
+                labs.append({'enrollment_id': enrollment_id, 'subject_id': subjects[code],
+                             'internal_marks': internal, 'external_marks': external,
+                             'total_marks': total, 'grade': grade_of(total)})
+
+            if len(theory) >= chunk_size:
+                flush()
+        flush()
+
+        for year, semester in sorted(terms):
+            TermVersion.bump(year, semester)
+        db.session.commit()
+        # Summaries and statistics exactly as after an import
+        for year, semester in sorted(terms):
+            revaluation.rebuild_term(year, semester)
+
+    return counts
+
+
+def write_workbooks(records, out_dir):
+    """Write one workbook per class and term in the attached_assets sheet layout"""
+    from openpyxl import Workbook
+
+    os.makedirs(out_dir, exist_ok=True)
+    books = {}
+
+    def open_book(record, batch, branch):
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Sheet1')
+        theory_names = [name for name, _, _ in record.theory]
+        lab_names = [name for name, _, _, _, _ in record.labs]
+        lab_start = max(16, 2 + 2 * len(theory_names))
+        width = lab_start + 4 * len(lab_names)
+
+        banner, names, headers = [None] * width, [None] * width, [None] * width
+        banner[2], banner[lab_start] = 'THEORY  SUBJECTS', 'LABS'
+        headers[0], headers[1] = 'STUDENT ID', 'STUDENT NAME'
+        for i, name in enumerate(theory_names):
+            names[2 + 2 * i] = name
+            headers[2 + 2 * i:4 + 2 * i] = ['TOTAL', 'GRADE']
+        for i, name in enumerate(lab_names):
+            col = lab_start + 4 * i
+            names[col] = name
+            headers[col:col + 4] = ['INTERNAL', 'EXTERNAL', 'TOTAL', 'GRADE']
+        for row in (banner, names, headers):
+            ws.append(row)
+        path = os.path.join(out_dir, f"{record.year}-{record.semester} SEMESTER RESULTS_{batch}{branch}.xlsx")
+        return wb, ws, lab_start, width, path
+
+    for record in records:
+        batch, branch = record.student_id[:2], branch_of(record.student_id)
+        key = (batch, branch, record.year, record.semester)
+        if key not in books:
+            books[key] = open_book(record, batch, branch)
+        wb, ws, lab_start, width, _ = books[key]
+
+        row = [None] * width
+        row[0], row[1] = record.student_id, record.name
+        for i, (_, _, marks) in enumerate(record.theory):
+            row[2 + 2 * i] = marks
+            row[3 + 2 * i] = grade_of(marks)
+        for i, (_, _, internal, external, total) in enumerate(record.labs):
+            col = lab_start + 4 * i
+            row[col:col + 4] = [internal, external, total, grade_of(total)]
+        ws.append(row)
+
+    paths = []
+    for wb, _, _, _, path in books.values():
+        wb.save(path)
+        paths.append(path)
+    return sorted(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batches', nargs='+', default=['23'], help='two-digit admission years')
+    parser.add_argument('--branches', nargs='+', default=['32'], choices=sorted(BRANCHES))
+    parser.add_argument('--terms', nargs='+', default=[(1, 1)], type=parse_term, help='year-semester, e.g. 1-1 2-2')
+    parser.add_argument('--students-per-class', type=int, default=60)
+    parser.add_argument('--profile', help='JSON file overriding MarksProfile fields')
+    parser.add_argument('--absent-rate', type=float)
+    parser.add_argument('--fail-rate', type=float)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--excel-dir', help='also write result workbooks to this directory')
+    parser.add_argument('--no-db', action='store_true', help='skip the database inserts')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate tables first')
+    parser.add_argument('--prewarm', action='store_true', help='pre-render result pages and PDFs afterwards')
+    args = parser.parse_args()
+
+    profile = MarksProfile.from_file(args.profile) if args.profile else MarksProfile()
+    if args.absent_rate is not None:
+        profile.absent_rate = args.absent_rate
+    if args.fail_rate is not None:
+        profile.fail_rate = args.fail_rate
+    print(f"Marks profile: {asdict(profile)}")
+
+    make = lambda: generate(args.batches, args.branches, args.terms, args.students_per_class, profile, args.seed)
+
+    if not args.no_db:
+        if args.reset:
+            from app import app, db
+            with app.app_context():
+                db.drop_all()
+                db.create_all()
+        started = time.perf_counter()
+        counts = write_database(make())
+        elapsed = time.perf_counter() - started
+        print(f"Inserted {counts['students']} students, {counts['enrollments']} enrollments, "
+              f"{counts['theory_subjects']} theory rows and "
+              f"{counts['lab_courses']} lab rows in {elapsed:.1f}s")
+        if args.prewarm:
+            from prewarm import prewarm_terms
+            prewarm_terms(args.terms)
+
+    if args.excel_dir:
+        started = time.perf_counter()
+        paths = write_workbooks(make(), args.excel_dir)
+        print(f"Wrote {len(paths)} workbooks to {args.excel_dir} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
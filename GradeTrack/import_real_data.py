@@ -5,7 +5,8 @@ Properly imports real student data from Excel files with correct semester mappin
 """
 import pandas as pd
 from app import app, db
-from models import Student, TheorySubject, LabCourse, ClassStatistics
+from models import Enrollment, Subject, TheorySubject, LabCourse, ClassStatistics, TermVersion
+from curriculum import ensure_term_catalog, ensure_subject, theory_code, DEFAULT_THEORY_CREDITS
 import os
 
 def get_grade_from_marks(marks):
@@ -70,6 +71,9 @@ def import_semester_data_correctly(excel_file, year, semester):
         
         print(f"Processing {len(df)} student records")
         
+        # Catalog rows for the term's subjects
+        subjects, _ = ensure_term_catalog(year, semester)
+        
         for index, row in df.iterrows():
             try:
                 student_id = str(row.iloc[0]).strip()
@@ -80,26 +84,17 @@ def import_semester_data_correctly(excel_file, year, semester):
                     continue
                 
                 # Check if student already exists for this semester
-                existing_student = Student.query.filter_by(
-                    student_id=student_id, year=year, semester=semester
-                ).first()
+                existing_student = Enrollment.find(student_id, year, semester)
                 
                 if existing_student:
                     print(f"Student {student_id} already exists for Y{year}S{semester}, skipping...")
                     continue
                 
                 # Create new student record
-                student = Student(
-                    student_id=student_id,
-                    name=student_name,
-                    year=year,
-                    semester=semester
-                )
-                db.session.add(student)
+                student = Enrollment.create(student_id, student_name, year, semester)
                 
                 # Extract theory subject marks (usually columns 2-6 for first 5 subjects)
                 theory_count = 0
-                subject_names = []
                 
                 # Look for actual subject marks columns - skip header columns
                 for col_idx in range(2, len(df.columns)):
@@ -119,53 +114,20 @@ def import_semester_data_correctly(excel_file, year, semester):
                         if str(col_value) == "LONG ABSENT" or (isinstance(col_value, (int, float)) and 0 <= col_value <= 100):
                             theory_count += 1
                             
-                            # Generate subject name based on semester
-                            if year == 1 and semester == 1:
-                                subject_names = [
-                                    "ENGINEERING PHYSICS",
-                                    "LINEAR ALGEBRA & CALCULUS", 
-                                    "BASIC ELECTRICAL & ELECTRONICS ENGINEERING",
-                                    "ENGINEERING CHEMISTRY",
-                                    "PROBLEM SOLVING USING C"
-                                ]
-                            elif year == 1 and semester == 2:
-                                subject_names = [
-                                    "ENGINEERING MATHEMATICS-II",
-                                    "ENGINEERING PHYSICS-II", 
-                                    "BASIC MECHANICAL ENGINEERING",
-                                    "BASIC CIVIL ENGINEERING",
-                                    "ENGINEERING GRAPHICS",
-                                    "ENVIRONMENTAL STUDIES"
-                                ]
-                            elif year == 2 and semester == 1:
-                                subject_names = [
-                                    "MATHEMATICAL FOUNDATIONS FOR COMPUTER SCIENCE",
-                                    "COMPUTER PROGRAMMING", 
-                                    "DIGITAL LOGIC DESIGN",
-                                    "COMPUTER ORGANIZATION",
-                                    "DATA STRUCTURES"
-                                ]
-                            elif year == 2 and semester == 2:
-                                subject_names = [
-                                    "DESIGN AND ANALYSIS OF ALGORITHMS",
-                                    "DATABASE MANAGEMENT SYSTEMS", 
-                                    "FORMAL LANGUAGES AND AUTOMATA THEORY",
-                                    "COMPUTER NETWORKS",
-                                    "OPERATING SYSTEMS"
-                                ]
-                            
-                            # Use appropriate subject name
-                            if theory_count <= len(subject_names):
-                                subject_name = subject_names[theory_count - 1]
+                            # Use the catalog subject; extra columns get a generic entry
+                            if theory_count <= len(subjects):
+                                subject = subjects[theory_count - 1]
                             else:
-                                subject_name = f"Theory Subject {theory_count} (Y{year}S{semester})"
+                                subject = ensure_subject(year, semester, Subject.THEORY,
+                                                         theory_code(year, semester, theory_count),
+                                                         f"Theory Subject {theory_count} (Y{year}S{semester})",
+                                                         DEFAULT_THEORY_CREDITS, theory_count)
                             
                             cleaned_marks = clean_marks_value(col_value)
                             
                             theory_subject = TheorySubject(
-                                student_id=student_id,
-                                subject_name=subject_name,
-                                subject_code=f"TS{year}{semester}{theory_count:02d}",
+                                enrollment=student,
+                                subject=subject,
                                 marks=cleaned_marks if cleaned_marks is not None else 0,
                                 grade=get_grade_from_marks(col_value)
                             )
@@ -184,6 +146,8 @@ def import_semester_data_correctly(excel_file, year, semester):
                 print(f"Error processing row {index}: {e}")
                 continue
         
+        # Invalidate caches built from the previous data for this term
+        TermVersion.bump(year, semester)
         # Commit changes for this semester
         db.session.commit()
         print(f"Successfully imported Year {year}, Semester {semester}")
@@ -217,7 +181,7 @@ def main():
         # Verify import
         for year in [1, 2]:
             for semester in [1, 2]:
-                count = Student.query.filter_by(year=year, semester=semester).count()
+                count = Enrollment.query.filter_by(year=year, semester=semester).count()
                 print(f"Year {year}, Semester {semester}: {count} students")
 
 if __name__ == '__main__':
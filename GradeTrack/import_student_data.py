@@ -4,7 +4,8 @@ Imports real student data from Excel files and populates the database
 """
 import pandas as pd
 from app import app, db
-from models import Student, TheorySubject, LabCourse, ClassStatistics
+from models import Enrollment, Subject, TheorySubject, LabCourse, ClassStatistics, TermVersion
+from curriculum import ensure_subject, theory_code, lab_code, DEFAULT_THEORY_CREDITS, DEFAULT_LAB_CREDITS
 import os
 
 def get_grade_from_marks(marks):
@@ -69,22 +70,14 @@ def import_semester_data(excel_file, year, semester):
                     continue
                 
                 # Check if student already exists
-                existing_student = Student.query.filter_by(
-                    student_id=student_id, year=year, semester=semester
-                ).first()
+                existing_student = Enrollment.find(student_id, year, semester)
                 
                 if existing_student:
                     print(f"Student {student_id} already exists for Y{year}S{semester}, skipping...")
                     continue
                 
                 # Create new student
-                student = Student(
-                    student_id=student_id,
-                    name=student_name,
-                    year=year,
-                    semester=semester
-                )
-                db.session.add(student)
+                student = Enrollment.create(student_id, student_name, year, semester)
                 
                 # Theory subjects - columns 2 to approximately 14 (varies by semester)
                 theory_count = 0
@@ -103,10 +96,13 @@ def import_semester_data(excel_file, year, semester):
                         # Use actual column name if available, otherwise generate name
                         subject_name = col_name if not str(col_name).startswith('Unnamed') else f"Theory Subject {theory_count} (Y{year}S{semester})"
                         
+                        subject = ensure_subject(year, semester, Subject.THEORY,
+                                                 theory_code(year, semester, theory_count),
+                                                 subject_name, DEFAULT_THEORY_CREDITS, theory_count)
+                        
                         theory_subject = TheorySubject(
-                            student_id=student_id,
-                            subject_name=subject_name,
-                            subject_code=f"TS{year}{semester}{theory_count:02d}",
+                            enrollment=student,
+                            subject=subject,
                             marks=cleaned_marks if cleaned_marks is not None else 0,
                             grade=get_grade_from_marks(marks_value)
                         )
@@ -148,10 +144,12 @@ def import_semester_data(excel_file, year, semester):
                                     
                                     # Create lab course
                                     if current_lab_total is not None:
+                                        lab = ensure_subject(year, semester, Subject.LAB,
+                                                             lab_code(year, semester, lab_count),
+                                                             current_lab_name, DEFAULT_LAB_CREDITS, lab_count)
                                         lab_course = LabCourse(
-                                            student_id=student_id,
-                                            lab_name=current_lab_name,
-                                            lab_code=f"LAB{year}{semester}{lab_count:02d}",
+                                            enrollment=student,
+                                            subject=lab,
                                             internal_marks=current_lab_internal or 0,
                                             external_marks=current_lab_external or 0,
                                             total_marks=current_lab_total,
@@ -168,6 +166,8 @@ def import_semester_data(excel_file, year, semester):
                 print(f"Error processing row {index}: {e}")
                 continue
         
+        # Invalidate caches built from the previous data for this term
+        TermVersion.bump(year, semester)
         # Commit all changes
         db.session.commit()
         print(f"Successfully imported data for Year {year}, Semester {semester}")
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Results-day load test for the Academic Performance Tracker
+
+Seeds a throwaway SQLite database, starts the app on a local port and drives
+the /, /search, /result and /download_pdf routes with a weighted request mix.
+Prints a summary and writes JSON that can be compared across commits.
+
+    python loadtest.py --students 2000 --requests 5000 --concurrency 16
+    python loadtest.py --scenario pdf-rush --output bench_output.json
+    python loadtest.py --compare-encodings   # bandwidth/latency with and without compression
+    python loadtest.py --snapshot            # serve results from the in-memory snapshot
+    python loadtest.py --pdf-workers 0       # render PDFs inside the request (no job queue)
+
+PDF downloads that answer 202 are polled through their status URL like a
+client would; the pdf latency is the time until the PDF arrives.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+# Request mixes: operation -> weight
+SCENARIOS = {
+    'results-day': {'home': 10, 'search': 25, 'result_unique': 20, 'result_refresh': 30, 'pdf': 15},
+    'refresh-storm': {'home': 5, 'search': 10, 'result_unique': 5, 'result_refresh': 75, 'pdf': 5},
+    'pdf-rush': {'home': 5, 'search': 10, 'result_unique': 10, 'result_refresh': 25, 'pdf': 50},
+}
+
+# Share of students that receive the repeated refreshes
+HOT_FRACTION = 0.02
+
+# Pause between polls of a queued PDF's status URL
+PDF_POLL_SECONDS = 0.05
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def seed_database(student_count, year=1, semester=1):
+    """Seed student_count students for one term using the cohort generator"""
+    from itertools import islice
+    from app import app, db
+    from generate_cohort import BRANCHES, generate, write_database
+
+    branches = sorted(BRANCHES)
+    per_class = -(-student_count // len(branches))
+    records = [r for r in islice(generate(['23'], branches, [(year, semester)], per_class), student_count)]
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    write_database(records)
+
+    return [(r.student_id, r.year, r.semester) for r in records]
+
+
+def start_server():
+    """Run the app on a free local port in a background thread"""
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+class Client:
+    """Keep-alive HTTP client, one per worker thread"""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+        self.location = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+                self.location = response.getheader('Location')
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.conn.close()
+                    self.conn = None
+                return response.status, len(payload)
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+class Workload:
+    """Turns a scenario into concrete requests"""
+
+    def __init__(self, keys, mix, seed):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.unique = list(keys)
+        self.rng.shuffle(self.unique)
+        self.unique_pos = 0
+        self.hot = self.unique[:max(1, int(len(self.unique) * HOT_FRACTION))]
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+
+    def next_request(self):
+        with self.lock:
+            op = self.rng.choices(self.ops, self.weights)[0]
+            if op in ('search', 'result_unique'):
+                key = self.unique[self.unique_pos % len(self.unique)]
+                self.unique_pos += 1
+            else:
+                key = self.rng.choice(self.hot)
+        student_id, year, semester = key
+        if op == 'home':
+            return op, 'GET', '/', None
+        if op == 'search':
+            body = urlencode({'student_id': student_id, 'year': year, 'semester': semester})
+            return op, 'POST', '/search', body
+        if op == 'pdf':
+            return op, 'GET', f"/download_pdf/{student_id}/{year}/{semester}", None
+        return op, 'GET', f"/result/{student_id}/{year}/{semester}", None
+
+
+def fetch_pdf(client, path, headers, collected):
+    """Download a PDF, polling its status URL while the job queue renders it"""
+    headers = dict(headers or {}, Accept='application/json')
+    status, size = client.request('GET', path, None, headers)
+    if status != 202:
+        return status, size
+    status_url = client.location
+    while True:
+        time.sleep(PDF_POLL_SECONDS)
+        started = time.perf_counter()
+        status, size = client.request('GET', status_url, None, headers)
+        collected.append(('pdf_status', time.perf_counter() - started, status < 400, size))
+        if status != 202:
+            break
+    if status != 200:
+        return status, 0
+    return client.request('GET', path, None, headers)
+
+
+def run_load(port, workload, total_requests, concurrency, headers=None):
+    """Fire total_requests requests from concurrency threads and collect samples"""
+    samples = []
+    samples_lock = threading.Lock()
+    remaining = [total_requests]
+
+    def worker():
+        client = Client(port)
+        collected = []
+        while True:
+            with samples_lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            op, method, path, body = workload.next_request()
+            started = time.perf_counter()
+            try:
+                if op == 'pdf':
+                    status, size = fetch_pdf(client, path, headers, collected)
+                else:
+                    status, size = client.request(method, path, body, headers)
+                ok = status < 400
+            except Exception:
+                status, size, ok = 0, 0, False
+            collected.append((op, time.perf_counter() - started, ok, size))
+        with samples_lock:
+            samples.extend(collected)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles and error rate, overall and per operation"""
+    def stats(rows):
+        latencies = sorted(r[1] * 1000 for r in rows)
+        errors = sum(1 for r in rows if not r[2])
+        return {
+            'requests': len(rows),
+            'errors': errors,
+            'error_rate': round(errors / len(rows), 4) if rows else 0.0,
+            'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'max': round(latencies[-1], 3) if latencies else 0.0,
+            },
+            'bytes': sum(r[3] for r in rows),
+        }
+
+    by_op = {}
+    for row in samples:
+        by_op.setdefault(row[0], []).append(row)
+    return {'overall': stats(samples), 'operations': {op: stats(rows) for op, rows in sorted(by_op.items())}}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, results, encoding):
+    overall = results['overall']
+    print(f"\n=== {report['config']['scenario']} | {report['config']['students']} students | "
+          f"{report['config']['concurrency']} workers | Accept-Encoding: {encoding} ===")
+    print(f"{'operation':<16}{'reqs':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'errors':>8}{'KB/req':>10}")
+    rows = list(results['operations'].items()) + [('TOTAL', overall)]
+    for op, s in rows:
+        lat = s['latency_ms']
+        kb = s['bytes'] / s['requests'] / 1024 if s['requests'] else 0
+        print(f"{op:<16}{s['requests']:>8}{s['throughput_rps']:>10}{lat['p50']:>10}"
+              f"{lat['p95']:>10}{lat['p99']:>10}{s['error_rate']:>8.2%}{kb:>10.1f}")
+
+
+def compression_impact(plain, compressed):
+    """Bandwidth and latency change of the compressed run relative to the plain one"""
+    impact = {}
+    for op in sorted(set(plain['operations']) & set(compressed['operations'])) + ['overall']:
+        a = plain['overall'] if op == 'overall' else plain['operations'][op]
+        b = compressed['overall'] if op == 'overall' else compressed['operations'][op]
+        impact[op] = {
+            'bytes_per_request_plain': round(a['bytes'] / a['requests']) if a['requests'] else 0,
+            'bytes_per_request_compressed': round(b['bytes'] / b['requests']) if b['requests'] else 0,
+            'bandwidth_saved_pct': round(100 * (1 - b['bytes'] / a['bytes']), 1) if a['bytes'] else 0.0,
+            'p50_delta_ms': round(b['latency_ms']['p50'] - a['latency_ms']['p50'], 3),
+            'p95_delta_ms': round(b['latency_ms']['p95'] - a['latency_ms']['p95'], 3),
+        }
+    return impact
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=1000, help='students to seed')
+    parser.add_argument('--requests', type=int, default=2000, help='total requests to send')
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel client threads')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='results-day')
+    parser.add_argument('--warmup', type=int, default=50, help='untimed requests sent first')
+    parser.add_argument('--seed', type=int, default=1, help='workload random seed')
+    parser.add_argument('--db', help='SQLite file to seed (default: temporary file)')
+    parser.add_argument('--accept-encoding', default='gzip, br', help="Accept-Encoding header sent by clients")
+    parser.add_argument('--compare-encodings', action='store_true',
+                        help='run once uncompressed and once with --accept-encoding and report the difference')
+    parser.add_argument('--snapshot', action='store_true', help='serve results from the in-memory snapshot')
+    parser.add_argument('--pdf-workers', type=int, default=2, help='PDF job processes (0: render in the request)')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db) if args.db else os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'loadtest.db')
+    # Must be set before the app module is imported
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ['RESULT_SNAPSHOT'] = '1' if args.snapshot else '0'
+    os.environ['PDF_JOB_WORKERS'] = str(args.pdf_workers)
+    os.environ['PRERENDER_DIR'] = os.path.join(os.path.dirname(db_path), 'prerendered')
+    logging.disable(logging.INFO)
+
+    print(f"Seeding {args.students} students into {db_path}...")
+    seed_started = time.perf_counter()
+    keys = seed_database(args.students)
+    print(f"Seeded in {time.perf_counter() - seed_started:.1f}s")
+
+    from app import app  # after DATABASE_URL is set; the finally below needs it
+    server = start_server()
+    port = server.server_port
+    mix = SCENARIOS[args.scenario]
+    encodings = ['identity', args.accept_encoding] if args.compare_encodings else [args.accept_encoding]
+    runs = {}
+    try:
+        for encoding in encodings:
+            headers = {'Accept-Encoding': encoding}
+            if args.warmup:
+                run_load(port, Workload(keys, mix, args.seed + 1), args.warmup, args.concurrency, headers)
+            samples, elapsed = run_load(port, Workload(keys, mix, args.seed), args.requests,
+                                        args.concurrency, headers)
+            runs[encoding] = (summarize(samples, elapsed), elapsed)
+        pdf_jobs = app.extensions['pdf_jobs'].stats()
+    finally:
+        server.shutdown()
+        app.extensions['pdf_jobs'].shutdown()
+
+    results, elapsed = runs[encodings[-1]]
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'config': {
+            'scenario': args.scenario,
+            'mix': mix,
+            'students': args.students,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'accept_encoding': encodings[-1],
+            'snapshot': args.snapshot,
+            'pdf_workers': args.pdf_workers,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'results': results,
+        'pdf_jobs': pdf_jobs,
+    }
+    for encoding in encodings:
+        print_report(report, runs[encoding][0], encoding)
+
+    if args.compare_encodings:
+        report['encodings'] = {encoding: runs[encoding][0] for encoding in encodings}
+        report['compression_impact'] = compression_impact(runs['identity'][0], results)
+        print(f"\n{'operation':<16}{'plain B/req':>14}{'compressed':>12}{'saved':>8}{'p50 +ms':>10}{'p95 +ms':>10}")
+        for op, row in report['compression_impact'].items():
+            print(f"{op:<16}{row['bytes_per_request_plain']:>14}{row['bytes_per_request_compressed']:>12}"
+                  f"{row['bandwidth_saved_pct']:>7}%{row['p50_delta_ms']:>10}{row['p95_delta_ms']:>10}")
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0 if all(r['overall']['errors'] == 0 for r, _ in runs.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Schema migrations for databases created by older versions of the app
+
+db.create_all() only adds missing tables, so changes to existing tables are
+applied here. Applied steps are recorded in schema_migrations; every step
+checks the live schema first, so a fresh database just gets stamped.
+upgrade() runs at app start-up right after create_all().
+
+    python migrations.py            # apply pending migrations and list them
+"""
+import argparse
+import logging
+import uuid
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _rebuild(conn, table, ddl, select_sql, indexes=()):
+    """Replace a table by one with a new definition, filled from select_sql
+
+    Follows SQLite's documented create-copy-drop-rename sequence. Steps use
+    the DDL of their own schema version rather than the current models, so
+    later model changes cannot alter what an old migration does.
+    """
+    conn.exec_driver_sql(f"CREATE TABLE new_{table} ({ddl})")
+    copied = conn.exec_driver_sql(f"INSERT INTO new_{table} {select_sql}").rowcount
+    total = conn.exec_driver_sql(f"SELECT COUNT(*) FROM {table}").scalar()
+    if copied != total:
+        logger.warning("%s: dropped %d rows that belong to no student", table, total - copied)
+    conn.exec_driver_sql(f"DROP TABLE {table}")
+    conn.exec_driver_sql(f"ALTER TABLE new_{table} RENAME TO {table}")
+    for name, columns in indexes:
+        conn.exec_driver_sql(f"CREATE INDEX {name} ON {table} ({columns})")
+
+
+def _bump_all_terms(conn, term_table):
+    """New version token for every term, so cached pages and matrices are rebuilt"""
+    for year, semester in conn.exec_driver_sql(f"SELECT DISTINCT year, semester FROM {term_table}").all():
+        conn.execute(text("DELETE FROM term_versions WHERE year = :y AND semester = :s"), {'y': year, 's': semester})
+        conn.execute(text("INSERT INTO term_versions (year, semester, version, updated_at) VALUES (:y, :s, :v, :t)"),
+                     {'y': year, 's': semester, 'v': uuid.uuid4().hex, 't': datetime.utcnow()})
+
+
+def subject_catalog(conn):
+    """Move subject/lab names and codes out of the marks tables into subjects"""
+    from curriculum import DEFAULT_REGULATION, DEFAULT_THEORY_CREDITS, DEFAULT_LAB_CREDITS, THEORY_SUBJECTS, LAB_COURSES
+
+    if 'subject_code' not in _columns(conn, 'theory_subjects'):
+        return
+
+    def credits_for(catalog, year, semester, name, default):
+        for listed, credits in catalog.get((DEFAULT_REGULATION, year, semester), []):
+            if listed == name:
+                return credits
+        return default
+
+    sources = [
+        ('theory_subjects', 'subject_code', 'subject_name', 'theory', THEORY_SUBJECTS, DEFAULT_THEORY_CREDITS,
+         'marks INTEGER NOT NULL, grade VARCHAR(2) NOT NULL', 'marks, grade'),
+        ('lab_courses', 'lab_code', 'lab_name', 'lab', LAB_COURSES, DEFAULT_LAB_CREDITS,
+         'internal_marks INTEGER NOT NULL, external_marks INTEGER NOT NULL, total_marks INTEGER NOT NULL, '
+         'grade VARCHAR(2) NOT NULL', 'internal_marks, external_marks, total_marks, grade'),
+    ]
+    for table, code_col, name_col, kind, catalog, default, marks_ddl, marks_cols in sources:
+        terms = conn.exec_driver_sql(
+            f"SELECT s.year, s.semester, t.{code_col}, MIN(t.{name_col}) FROM {table} t "
+            f"JOIN students s ON s.student_id = t.student_id "
+            f"GROUP BY s.year, s.semester, t.{code_col} ORDER BY s.year, s.semester, t.{code_col}").all()
+        positions = {}
+        for year, semester, code, name in terms:
+            params = {'r': DEFAULT_REGULATION, 'y': year, 's': semester, 'c': code}
+            positions[(year, semester)] = positions.get((year, semester), 0) + 1
+            if conn.execute(text("SELECT 1 FROM subjects WHERE regulation = :r AND year = :y "
+                                 "AND semester = :s AND code = :c"), params).first():
+                continue
+            conn.execute(text("INSERT INTO subjects (regulation, year, semester, kind, code, name, credits, position) "
+                              "VALUES (:r, :y, :s, :k, :c, :n, :cr, :p)"),
+                         dict(params, k=kind, n=name, cr=credits_for(catalog, year, semester, name, default),
+                              p=positions[(year, semester)]))
+
+        _rebuild(conn, table,
+                 "id INTEGER NOT NULL PRIMARY KEY, "
+                 "student_id VARCHAR(20) NOT NULL REFERENCES students (student_id), "
+                 f"subject_id INTEGER NOT NULL REFERENCES subjects (id), {marks_ddl}",
+                 f"(id, student_id, subject_id, {marks_cols}) "
+                 f"SELECT t.id, t.student_id, sub.id, {', '.join('t.' + c for c in marks_cols.split(', '))} "
+                 f"FROM {table} t JOIN students s ON s.student_id = t.student_id "
+                 f"JOIN subjects sub ON sub.regulation = '{DEFAULT_REGULATION}' AND sub.year = s.year "
+                 f"AND sub.semester = s.semester AND sub.code = t.{code_col}",
+                 [(f"ix_{table}_subject_id", 'subject_id')])
+
+    # Credits changed, so every term's cached results are stale
+    _bump_all_terms(conn, 'students')
+
+
+def enrollments(conn):
+    """Split students into an identity table and per-term enrollments; marks reference enrollments"""
+    if 'year' not in _columns(conn, 'students'):
+        return
+
+    # Each legacy students row was one roll number in one term: it becomes an enrollment with the same id
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS enrollments (id INTEGER NOT NULL PRIMARY KEY, "
+        "student_pk INTEGER NOT NULL REFERENCES students (id), year INTEGER NOT NULL, semester INTEGER NOT NULL, "
+        "UNIQUE (student_pk, year, semester))")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_enrollments_term ON enrollments (year, semester)")
+    conn.exec_driver_sql("INSERT INTO enrollments (id, student_pk, year, semester) "
+                         "SELECT id, id, year, semester FROM students")
+
+    for table, marks_ddl, marks_cols in [
+        ('theory_subjects', 'marks INTEGER NOT NULL, grade VARCHAR(2) NOT NULL', 'marks, grade'),
+        ('lab_courses', 'internal_marks INTEGER NOT NULL, external_marks INTEGER NOT NULL, '
+         'total_marks INTEGER NOT NULL, grade VARCHAR(2) NOT NULL',
+         'internal_marks, external_marks, total_marks, grade'),
+    ]:
+        _rebuild(conn, table,
+                 "id INTEGER NOT NULL PRIMARY KEY, "
+                 "enrollment_id INTEGER NOT NULL REFERENCES enrollments (id), "
+                 f"subject_id INTEGER NOT NULL REFERENCES subjects (id), {marks_ddl}",
+                 f"(id, enrollment_id, subject_id, {marks_cols}) "
+                 f"SELECT t.id, s.id, t.subject_id, {', '.join('t.' + c for c in marks_cols.split(', '))} "
+                 f"FROM {table} t JOIN students s ON s.student_id = t.student_id",
+                 [(f"ix_{table}_enrollment_id", 'enrollment_id'), (f"ix_{table}_subject_id", 'subject_id')])
+
+    _rebuild(conn, 'students',
+             "id INTEGER NOT NULL PRIMARY KEY, student_id VARCHAR(20) NOT NULL UNIQUE, name VARCHAR(100) NOT NULL",
+             "(id, student_id, name) SELECT id, student_id, name FROM students")
+
+
+def summaries(conn):
+    """Columns for stored summaries and revaluation counts; revaluation.py fills them on first use"""
+    # Checked one by one: create_all() may have made enrollments with them already (migration 2)
+    for table, column, ddl in [
+        ('enrollments', 'cgpa', 'FLOAT'),
+        ('enrollments', 'percentage', 'FLOAT'),
+        ('enrollments', 'passed', 'BOOLEAN'),
+        ('class_statistics', 'cgpa_total', 'FLOAT'),
+        ('class_statistics', 'graded_students', 'INTEGER'),
+        ('class_statistics', 'term_version', 'VARCHAR(32)'),
+        ('term_versions', 'revision', "INTEGER NOT NULL DEFAULT '0'"),
+    ]:
+        if column not in _columns(conn, table):
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_enrollments_rank ON enrollments (year, semester, passed, cgpa)")
+
+
+def roster(conn):
+    """Roll number, name and branch copied into enrollments, with the indexes roster.py pages by"""
+    for column, ddl in [('roll_number', 'VARCHAR(20)'), ('student_name', 'VARCHAR(100)'), ('branch', 'VARCHAR(2)')]:
+        if column not in _columns(conn, 'enrollments'):
+            conn.exec_driver_sql(f"ALTER TABLE enrollments ADD COLUMN {column} {ddl}")
+    conn.exec_driver_sql(
+        "UPDATE enrollments SET "
+        "roll_number = (SELECT student_id FROM students WHERE students.id = enrollments.student_pk), "
+        "student_name = (SELECT name FROM students WHERE students.id = enrollments.student_pk) "
+        "WHERE roll_number IS NULL")
+    conn.exec_driver_sql("UPDATE enrollments SET branch = substr(roll_number, 7, 2) WHERE branch IS NULL")
+    for name, columns in [('ix_enrollments_roll', 'year, semester, roll_number'),
+                          ('ix_enrollments_branch', 'year, semester, branch, roll_number'),
+                          ('ix_enrollments_name', 'year, semester, student_name'),
+                          ('ix_enrollments_sgpa', 'year, semester, cgpa')]:
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON enrollments ({columns})")
+
+
+# (version, name, step), applied in order
+MIGRATIONS = [
+    (1, 'subject_catalog', subject_catalog),
+    (2, 'enrollments', enrollments),
+    (3, 'summaries', summaries),
+    (4, 'roster', roster),
+]
+
+
+def applied_versions(conn):
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations "
+        "(version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)")
+    return {row[0] for row in conn.exec_driver_sql("SELECT version FROM schema_migrations")}
+
+
+def upgrade():
+    """Apply pending migrations, each in its own transaction (needs an app context)"""
+    with db.engine.begin() as conn:
+        done = applied_versions(conn)
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        with db.engine.begin() as conn:
+            step(conn)
+            conn.execute(text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                         {'v': version, 'n': name, 't': datetime.utcnow()})
+        logger.info("Applied migration %d (%s)", version, name)
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+
+    # Importing app already ran upgrade(); report the result
+    with app.app_context():
+        with db.engine.begin() as conn:
+            done = applied_versions(conn)
+    for version, name, _ in MIGRATIONS:
+        print(f"{version:>3} {name:<30} {'applied' if version in done else 'pending'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,112 @@
+import uuid
+from datetime import datetime
 from app import db
 from sqlalchemy import func
+from curriculum import branch_of
 
 class Student(db.Model):
-    """Student model for storing basic student information"""
+    """Student identity: one row per roll number"""
     __tablename__ = 'students'
     
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.String(20), unique=True, nullable=False)
+    student_id = db.Column(db.String(20), unique=True, nullable=False)  # roll number
     name = db.Column(db.String(100), nullable=False)
+    
+    # Relationships
+    enrollments = db.relationship('Enrollment', back_populates='student', lazy=True, cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<Student {self.student_id}: {self.name}>'
+    
+    @staticmethod
+    def get_grade_point(grade):
+        """Convert grade to grade point"""
+        grade_mapping = {
+            'S': 10, 'A': 9, 'B': 8, 'C': 7, 'D': 6, 'E': 5, 'F': 0
+        }
+        return grade_mapping.get(grade, 0)
+
+class Enrollment(db.Model):
+    """A student's results for one year and semester"""
+    __tablename__ = 'enrollments'
+    __table_args__ = (db.UniqueConstraint('student_pk', 'year', 'semester'),
+                      db.Index('ix_enrollments_term', 'year', 'semester'),
+                      db.Index('ix_enrollments_rank', 'year', 'semester', 'passed', 'cgpa'),
+                      db.Index('ix_enrollments_roll', 'year', 'semester', 'roll_number'),
+                      db.Index('ix_enrollments_branch', 'year', 'semester', 'branch', 'roll_number'),
+                      db.Index('ix_enrollments_name', 'year', 'semester', 'student_name'),
+                      db.Index('ix_enrollments_sgpa', 'year', 'semester', 'cgpa'))
+    
+    id = db.Column(db.Integer, primary_key=True)
+    student_pk = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)  # students.id, not the roll number
     year = db.Column(db.Integer, nullable=False)  # 1 or 2
     semester = db.Column(db.Integer, nullable=False)  # 1 or 2
     
+    # Stored summary (see revaluation.py); NULL until the term's summaries are built
+    cgpa = db.Column(db.Float, nullable=True)
+    percentage = db.Column(db.Float, nullable=True)
+    passed = db.Column(db.Boolean, nullable=True)
+    
+    # Copied from the student when the enrollment is created, so roster.py can page a term by index
+    roll_number = db.Column(db.String(20), nullable=True)
+    student_name = db.Column(db.String(100), nullable=True)
+    branch = db.Column(db.String(2), nullable=True)
+    
     # Relationships
-    theory_subjects = db.relationship('TheorySubject', backref='student', lazy=True, cascade='all, delete-orphan')
-    lab_courses = db.relationship('LabCourse', backref='student', lazy=True, cascade='all, delete-orphan')
+    student = db.relationship('Student', back_populates='enrollments', lazy='joined')
+    theory_subjects = db.relationship('TheorySubject', backref='enrollment', lazy=True, cascade='all, delete-orphan')
+    lab_courses = db.relationship('LabCourse', backref='enrollment', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
-        return f'<Student {self.student_id}: {self.name}>'
+        return f'<Enrollment {self.student_id} Y{self.year}S{self.semester}>'
+    
+    @property
+    def student_id(self):
+        return self.student.student_id
+    
+    @property
+    def name(self):
+        return self.student.name
+    
+    @staticmethod
+    def find(student_id, year, semester):
+        """Enrollment of a roll number in a term, or None"""
+        return (Enrollment.query.join(Student)
+                .filter(Student.student_id == student_id, Enrollment.year == year, Enrollment.semester == semester)
+                .first())
+    
+    @staticmethod
+    def create(student_id, name, year, semester, students=None):
+        """Add an enrollment, creating the student on first sight (caller commits)
+        
+        students, when given, maps roll numbers to the Student rows the caller
+        already loaded; it is used instead of a query and gains new students.
+        """
+        if students is None:
+            student = Student.query.filter_by(student_id=student_id).first()
+        else:
+            student = students.get(student_id)
+        if student is None:
+            student = Student(student_id=student_id, name=name)
+            db.session.add(student)
+            if students is not None:
+                students[student_id] = student
+        enrollment = Enrollment(student=student, year=year, semester=semester, roll_number=student_id,
+                                student_name=student.name, branch=branch_of(student_id))
+        db.session.add(enrollment)
+        return enrollment
     
     def calculate_cgpa(self):
         """Calculate CGPA based on all subjects and labs"""
         total_credits = 0
         total_grade_points = 0
         
-        # Calculate from theory subjects
-        for subject in self.theory_subjects:
-            grade_point = self.get_grade_point(subject.grade)
+        # Theory subjects and labs, weighted by their catalog credits
+        for row in self.theory_subjects + self.lab_courses:
+            grade_point = self.get_grade_point(row.grade)
             if grade_point > 0:  # Exclude F grades
-                total_credits += 4  # Assuming 4 credits per theory subject
-                total_grade_points += grade_point * 4
-        
-        # Calculate from lab courses
-        for lab in self.lab_courses:
-            grade_point = self.get_grade_point(lab.grade)
-            if grade_point > 0:  # Exclude F grades
-                total_credits += 2  # Assuming 2 credits per lab
-                total_grade_points += grade_point * 2
+                total_credits += row.subject.credits
+                total_grade_points += grade_point * row.subject.credits
         
         if total_credits == 0:
             return 0.0
@@ -75,25 +146,49 @@ class Student(db.Model):
         
         return 'PASS'
     
-    @staticmethod
-    def get_grade_point(grade):
-        """Convert grade to grade point"""
-        grade_mapping = {
-            'S': 10, 'A': 9, 'B': 8, 'C': 7, 'D': 6, 'E': 5, 'F': 0
-        }
-        return grade_mapping.get(grade, 0)
+    get_grade_point = staticmethod(Student.get_grade_point)
+
+class Subject(db.Model):
+    """Curriculum entry: one theory subject or lab of a term under a regulation"""
+    __tablename__ = 'subjects'
+    __table_args__ = (db.UniqueConstraint('regulation', 'year', 'semester', 'code'),)
+    
+    THEORY = 'theory'
+    LAB = 'lab'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    regulation = db.Column(db.String(10), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    semester = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'theory' or 'lab'
+    code = db.Column(db.String(20), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    credits = db.Column(db.Float, nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # order on the result sheet
+    
+    def __repr__(self):
+        return f'<Subject {self.regulation} {self.code}: {self.name} ({self.credits} credits)>'
 
 class TheorySubject(db.Model):
     """Theory subject model for storing subject marks and grades"""
     __tablename__ = 'theory_subjects'
     
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.String(20), db.ForeignKey('students.student_id'), nullable=False)
-    subject_name = db.Column(db.String(100), nullable=False)
-    subject_code = db.Column(db.String(20), nullable=False)
+    enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.id'), nullable=False, index=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False, index=True)
     marks = db.Column(db.Integer, nullable=False)
     grade = db.Column(db.String(2), nullable=False)
     
+    subject = db.relationship('Subject', lazy='joined')
+    
+    @property
+    def subject_name(self):
+        return self.subject.name
+    
+    @property
+    def subject_code(self):
+        return self.subject.code
+    
     def __repr__(self):
         return f'<TheorySubject {self.subject_name}: {self.marks} ({self.grade})>'
 
@@ -102,14 +197,23 @@ class LabCourse(db.Model):
     __tablename__ = 'lab_courses'
     
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.String(20), db.ForeignKey('students.student_id'), nullable=False)
-    lab_name = db.Column(db.String(100), nullable=False)
-    lab_code = db.Column(db.String(20), nullable=False)
+    enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.id'), nullable=False, index=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False, index=True)
     internal_marks = db.Column(db.Integer, nullable=False)
     external_marks = db.Column(db.Integer, nullable=False)
     total_marks = db.Column(db.Integer, nullable=False)
     grade = db.Column(db.String(2), nullable=False)
     
+    subject = db.relationship('Subject', lazy='joined')
+    
+    @property
+    def lab_name(self):
+        return self.subject.name
+    
+    @property
+    def lab_code(self):
+        return self.subject.code
+    
     def __repr__(self):
         return f'<LabCourse {self.lab_name}: {self.total_marks} ({self.grade})>'
 
@@ -125,6 +229,122 @@ class ClassStatistics(db.Model):
     failed_students = db.Column(db.Integer, nullable=False)
     average_cgpa = db.Column(db.Float, nullable=False)
     topper_student_id = db.Column(db.String(20), nullable=True)
+    # Kept by revaluation.py: average_cgpa = cgpa_total / graded_students (students with a positive CGPA)
+    cgpa_total = db.Column(db.Float, nullable=True)
+    graded_students = db.Column(db.Integer, nullable=True)
+    term_version = db.Column(db.String(32), nullable=True)  # import the numbers were built from
     
     def __repr__(self):
         return f'<ClassStatistics Y{self.year}S{self.semester}: {self.total_students} students>'
+
+class SubjectStatistics(db.Model):
+    """Marks aggregates of one subject, kept as sums so a revaluation can adjust them"""
+    __tablename__ = 'subject_statistics'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False, unique=True)
+    students = db.Column(db.Integer, nullable=False)
+    marks_total = db.Column(db.Integer, nullable=False)
+    marks_squares = db.Column(db.Integer, nullable=False)
+    failed = db.Column(db.Integer, nullable=False)
+    
+    subject = db.relationship('Subject', lazy='joined')
+    
+    def __repr__(self):
+        return f'<SubjectStatistics {self.subject.code}: {self.students} students>'
+    
+    def summary(self):
+        """Same fields as TermMatrix.subject_statistics() for the aggregates kept here"""
+        n = self.students
+        mean = self.marks_total / n if n else None
+        return {
+            'code': self.subject.code,
+            'name': self.subject.name,
+            'students': n,
+            'mean': round(mean, 2) if n else None,
+            'std': round(max(self.marks_squares / n - mean * mean, 0.0) ** 0.5, 2) if n else None,
+            'failed': self.failed,
+            'pass_rate': round(1 - self.failed / n, 4) if n else None,
+        }
+
+class ImportCheckpoint(db.Model):
+    """How far the import of a workbook got; committed with every batch so an interrupted import resumes"""
+    __tablename__ = 'import_checkpoints'
+    __table_args__ = (db.UniqueConstraint('source', 'year', 'semester'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(255), nullable=False)  # workbook path as given to the importer
+    digest = db.Column(db.String(40), nullable=False)  # SHA-1 of the file: a changed workbook starts over
+    year = db.Column(db.Integer, nullable=False)
+    semester = db.Column(db.Integer, nullable=False)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)  # sheet rows committed so far
+    total_rows = db.Column(db.Integer, nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ImportCheckpoint {self.source} Y{self.year}S{self.semester}: {self.rows_done}/{self.total_rows}>'
+    
+    @staticmethod
+    def start(source, digest, year, semester, total_rows):
+        """Checkpoint to continue from: the stored one for this file, or a new one (caller commits)"""
+        row = ImportCheckpoint.query.filter_by(source=source, year=year, semester=semester).first()
+        if row is None:
+            row = ImportCheckpoint(source=source, year=year, semester=semester)
+            db.session.add(row)
+        if row.digest != digest:
+            row.digest = digest
+            row.rows_done = 0
+            row.completed_at = None
+        row.total_rows = total_rows
+        row.updated_at = datetime.utcnow()
+        return row
+
+class TermVersion(db.Model):
+    """Changes whenever a term's results are (re)imported, so caches know when to rebuild"""
+    __tablename__ = 'term_versions'
+    __table_args__ = (db.UniqueConstraint('year', 'semester'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    semester = db.Column(db.Integer, nullable=False)
+    # Random token rather than a counter: a drop_all() + re-import must never repeat an old value
+    version = db.Column(db.String(32), nullable=False)
+    # Revaluations since the import; pages stay keyed by version, in-memory caches by token()
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<TermVersion Y{self.year}S{self.semester}: {self.version}>'
+    
+    @staticmethod
+    def current(year, semester):
+        """Current version token for a term ('' if it was never imported)"""
+        version = db.session.query(TermVersion.version).filter_by(year=year, semester=semester).scalar()
+        return version or ''
+    
+    @staticmethod
+    def bump(year, semester):
+        """Give the term a new version; commits with the caller's transaction"""
+        row = TermVersion.query.filter_by(year=year, semester=semester).first()
+        if row is None:
+            row = TermVersion(year=year, semester=semester)
+            db.session.add(row)
+        row.version = uuid.uuid4().hex
+        row.revision = 0
+        row.updated_at = datetime.utcnow()
+        return row.version
+    
+    @staticmethod
+    def token(year, semester):
+        """Version plus revision: changes on every import and every revaluation ('' if never imported)"""
+        row = db.session.query(TermVersion.version, TermVersion.revision).filter_by(year=year, semester=semester).first()
+        return f"{row.version}.{row.revision}" if row else ''
+    
+    @staticmethod
+    def revise(year, semester):
+        """Count a revaluation of the term; commits with the caller's transaction"""
+        row = TermVersion.query.filter_by(year=year, semester=semester).one()
+        row.revision += 1
+        row.updated_at = datetime.utcnow()
+        return row.revision
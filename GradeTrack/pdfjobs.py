@@ -0,0 +1,194 @@
+"""
+Background PDF generation
+
+ReportLab renders take 10-100 ms of CPU each. When they ran inside the
+request, a burst of downloads tied up every web worker and cheap page
+views queued behind them. /download_pdf now serves a PDF straight from the
+prerender store (prewarm.py) when one exists. Otherwise it queues a job on
+this process's pool of PDF_JOB_WORKERS render processes and answers 202
+with a status URL. The client polls that URL until the PDF is ready, and
+the finished file lands in the prerender store, so any web worker can
+serve it.
+
+Jobs are keyed by (roll number, year, semester, term version token), so
+repeated clicks share one job and a re-import or revaluation starts a new
+one. The job table is
+kept in memory; it is a dedup and status aid only, because the stored file
+is what counts. Queue depth and wait/render latency percentiles are
+reported by stats() (admin /api/stats). With PDF_JOB_WORKERS=0 PDFs are
+rendered inside the request as before.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+QUEUED, DONE, FAILED = 'queued', 'done', 'failed'
+
+
+class Job:
+    __slots__ = ('key', 'state', 'submitted', 'finished', 'render_seconds', 'error')
+
+    def __init__(self, key):
+        self.key = key
+        self.state = QUEUED
+        self.submitted = time.monotonic()
+        self.finished = None
+        self.render_seconds = None
+        self.error = None
+
+
+def _render_job(student_id, year, semester, token):
+    """Runs in a pool process: render one PDF into the prerender store"""
+    from app import app, db
+    from dbwatch import check_database_swap
+    from models import TermVersion
+    from routes import render_result_pdf
+
+    started = time.perf_counter()
+    with app.test_request_context():
+        try:
+            check_database_swap()
+            if TermVersion.token(year, semester) != token:
+                return None  # re-imported or revalued meanwhile; the caller will ask again
+            pdf = render_result_pdf(student_id, year, semester)
+            if pdf is not None and not app.extensions['prerender'].save(
+                    'pdf', student_id, year, semester, TermVersion.current(year, semester), pdf):
+                # Fail the job rather than let /pdf_status resubmit it forever
+                raise ValueError(f"PDF of {student_id!r} cannot be stored")
+        finally:
+            db.session.remove()
+    return time.perf_counter() - started
+
+
+def _init_worker(nice):
+    # Spawned workers start the app here. It has to load before prewarm (which app.py
+    # imports itself), and this module must not import it at module level for the same reason
+    import app
+    from prewarm import _init_worker as init_render_worker
+    init_render_worker(nice, 0)
+
+
+def _job_key(student_id, year, semester):
+    from models import TermVersion
+    return (student_id, year, semester, TermVersion.token(year, semester))
+
+
+class PdfJobQueue:
+    """Process-pool PDF renders with an in-memory job table"""
+
+    def __init__(self, workers=2, max_queued=500, keep_seconds=60.0, nice=5):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.keep_seconds = keep_seconds
+        self.nice = nice
+        self._pool = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._waits = deque(maxlen=1000)    # seconds from submit to done
+        self._renders = deque(maxlen=1000)  # seconds spent rendering
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn, not fork: the web process has threads and open SQLite connections
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker, initargs=(self.nice,))
+        return self._pool
+
+    def _prune(self, now):
+        for key in [k for k, job in self._jobs.items()
+                    if job.finished is not None and now - job.finished > self.keep_seconds]:
+            del self._jobs[key]
+
+    def submit(self, student_id, year, semester):
+        """Job for the PDF (an existing one if already queued), or None if the queue is full"""
+        key = _job_key(student_id, year, semester)
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            job = self._jobs.get(key)
+            if job is not None and job.state != FAILED:
+                return job
+            if self._depth() >= self.max_queued:
+                self.counters['rejected'] += 1
+                return None
+            job = self._jobs[key] = Job(key)
+            self.counters['submitted'] += 1
+            pool = self._get_pool()
+        try:
+            future = pool.submit(_render_job, *key)
+        except BrokenProcessPool as e:
+            # A worker died (killed, out of memory); start a fresh pool for the next job
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+                job.state, job.error, job.finished = FAILED, repr(e), time.monotonic()
+                self.counters['failed'] += 1
+            pool.shutdown(wait=False)
+            return job
+        future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def _finish(self, job, future):
+        with self._lock:
+            job.finished = time.monotonic()
+            error = future.exception()
+            if error is not None:
+                job.state, job.error = FAILED, repr(error)
+                self.counters['failed'] += 1
+                return
+            job.state = DONE
+            job.render_seconds = future.result()
+            self.counters['completed'] += 1
+            self._waits.append(job.finished - job.submitted)
+            if job.render_seconds is not None:
+                self._renders.append(job.render_seconds)
+
+    def find(self, student_id, year, semester):
+        key = _job_key(student_id, year, semester)
+        with self._lock:
+            return self._jobs.get(key)
+
+    def _depth(self):
+        """Jobs waiting or rendering; call with the lock held"""
+        return sum(1 for job in self._jobs.values() if job.state == QUEUED)
+
+    def stats(self):
+        with self._lock:
+            depth = self._depth()
+            waits = sorted(self._waits)
+            renders = sorted(self._renders)
+            counters = dict(self.counters)
+
+        def summary(values):
+            if not values:
+                return {'count': 0}
+            pick = lambda pct: round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 1)
+            return {'count': len(values), 'p50_ms': pick(50), 'p95_ms': pick(95), 'max_ms': round(values[-1] * 1000, 1)}
+
+        return dict(counters, workers=self.workers, depth=depth,
+                    wait=summary(waits), render=summary(renders))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+def init_pdf_jobs(app):
+    """Create the app's PdfJobQueue from PDF_JOB_* config"""
+    queue = PdfJobQueue(app.config.setdefault('PDF_JOB_WORKERS', int(os.environ.get('PDF_JOB_WORKERS', 2))),
+                        app.config.setdefault('PDF_JOB_MAX_QUEUED', 500),
+                        app.config.setdefault('PDF_JOB_KEEP_SECONDS', 60.0),
+                        app.config.setdefault('PDF_JOB_NICE', 5))
+    app.extensions['pdf_jobs'] = queue
+    return queue
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Pre-warm rendered results after an import
+
+Without this, the first visitor for each student after an import pays for
+the queries, the template render and the ReportLab PDF. prewarm_terms()
+runs at the end of final_import.py (and generate_cohort.py --prewarm), or
+by hand:
+
+    python prewarm.py --year 1 --semester 1 --workers 2 --rate 200
+
+For each changed term it recomputes the class statistics, then renders
+every enrollment's result page and PDF in a bounded process pool. The
+output goes to PRERENDER_DIR (default instance/prerendered/) under
+<year>-<semester>/<version>/, and the web app serves those files until the
+next import bumps the term version.
+Workers run at a lower CPU priority (--nice) and can be capped at --rate
+renders per second, so live traffic keeps priority. Pages and PDFs take
+about 18 KB per student-term on disk.
+"""
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from sqlalchemy import select
+
+from app import app, db
+from models import Student, Enrollment, TermVersion
+
+SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class PrerenderStore:
+    """Rendered pages and PDFs on disk, keyed by term version"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, kind, student_id, year, semester, version):
+        if not SAFE_ID.match(student_id):
+            raise ValueError(f"Roll number {student_id!r} cannot be used as a file name")
+        if kind == 'result':
+            # Pages link fingerprinted bundles, so a rebuilt manifest makes them stale too
+            from assets import manifest_fingerprint
+            name = f"{student_id}.{manifest_fingerprint()}.html"
+        else:
+            name = f"{student_id}.pdf"
+        return os.path.join(self.root, f"{year}-{semester}", version, name)
+
+    def exists(self, kind, student_id, year, semester):
+        version = TermVersion.current(year, semester)
+        return bool(version and SAFE_ID.match(student_id)
+                    and os.path.exists(self._path(kind, student_id, year, semester, version)))
+
+    def load(self, kind, student_id, year, semester):
+        """Stored page (str) or PDF (bytes) for the term's current version, or None"""
+        if not SAFE_ID.match(student_id):
+            return None
+        version = TermVersion.current(year, semester)
+        if not version:
+            return None
+        try:
+            with open(self._path(kind, student_id, year, semester, version), 'rb') as fh:
+                data = fh.read()
+        except OSError:
+            return None
+        return data.decode('utf-8') if kind == 'result' else data
+
+    def save(self, kind, student_id, year, semester, version, data):
+        """Store a page or PDF; False (nothing stored) for roll numbers that load() would not return"""
+        if not SAFE_ID.match(student_id):
+            return False
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        path = self._path(kind, student_id, year, semester, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, path)  # readers never see a half-written file
+        return True
+
+    def discard(self, kind, year, semester, student_id=None):
+        """Delete stored output of the current version: one student's, or the whole term's; returns how many"""
+        version = TermVersion.current(year, semester)
+        if not version:
+            return 0
+        if student_id is not None:
+            paths = [self._path(kind, student_id, year, semester, version)] if SAFE_ID.match(student_id) else []
+        else:
+            term_dir = os.path.join(self.root, f"{year}-{semester}", version)
+            suffix = '.html' if kind == 'result' else '.pdf'
+            paths = [os.path.join(term_dir, name) for name in os.listdir(term_dir)
+                     if name.endswith(suffix)] if os.path.isdir(term_dir) else []
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def prune(self, year, semester, keep_version):
+        """Delete output of older versions of a term"""
+        term_dir = os.path.join(self.root, f"{year}-{semester}")
+        if not os.path.isdir(term_dir):
+            return
+        for name in os.listdir(term_dir):
+            if name != keep_version:
+                shutil.rmtree(os.path.join(term_dir, name), ignore_errors=True)
+
+
+def init_prerender(app):
+    root = app.config.setdefault('PRERENDER_DIR', os.environ.get('PRERENDER_DIR')
+                                 or os.path.join(app.instance_path, 'prerendered'))
+    app.extensions['prerender'] = PrerenderStore(root)
+
+
+def update_class_statistics(year, semester):
+    """Store the term's class statistics, topper and per-student summaries (see revaluation.py)"""
+    from revaluation import rebuild_term
+    return rebuild_term(year, semester)
+
+
+_worker = {}
+
+
+def _init_worker(nice, interval):
+    if nice:
+        os.nice(nice)
+    # Connections inherited from the parent must not be shared across processes
+    with app.app_context():
+        db.engine.dispose(close=False)
+    _worker['interval'] = interval
+
+
+def _render_chunk(year, semester, version, student_ids, kinds):
+    """Render and store one chunk of a term; returns how many students were done"""
+    from routes import render_result_page, render_result_pdf
+
+    store = app.extensions['prerender']
+    interval = _worker.get('interval', 0)
+    done = 0
+    with app.test_request_context():
+        # Stop early if another import replaced the term meanwhile
+        if TermVersion.current(year, semester) != version:
+            return done
+        for student_id in student_ids:
+            started = time.monotonic()
+            if 'result' in kinds:
+                page = render_result_page(student_id, year, semester)
+                if page is not None:
+                    store.save('result', student_id, year, semester, version, page)
+            if 'pdf' in kinds:
+                pdf = render_result_pdf(student_id, year, semester)
+                if pdf is not None:
+                    store.save('pdf', student_id, year, semester, version, pdf)
+            db.session.remove()
+            done += 1
+            # Throttle: each worker renders at most one student per interval
+            remaining = interval - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+    return done
+
+
+def prewarm_terms(terms, workers=None, rate=None, nice=10, kinds=('result', 'pdf'), chunk_size=25,
+                  progress=print):
+    """Recompute class statistics and pre-render pages/PDFs for the given (year, semester) terms"""
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    plan = []
+    with app.app_context():
+        for year, semester in terms:
+            version = TermVersion.current(year, semester)
+            if not version:
+                continue
+            stats = update_class_statistics(year, semester)
+            progress(f"Y{year}S{semester}: class statistics {stats}")
+            student_ids = db.session.execute(
+                select(Student.student_id).join(Enrollment)
+                .where(Enrollment.year == year, Enrollment.semester == semester)
+                .order_by(Student.student_id)).scalars().all()
+            plan.append((year, semester, version, student_ids))
+        db.session.remove()
+        db.engine.dispose()
+
+    total = sum(len(ids) for _, _, _, ids in plan)
+    chunks = iter([(year, semester, version, ids[i:i + chunk_size])
+                   for year, semester, version, ids in plan for i in range(0, len(ids), chunk_size)])
+    interval = workers / rate if rate else 0
+    started = time.monotonic()
+    completed = 0
+    last_report = started
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(nice, interval)) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            # Keep at most two chunks per worker queued, so memory stays bounded
+            while not exhausted and len(pending) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(_render_chunk, *chunk, tuple(kinds)))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                completed += future.result()
+            now = time.monotonic()
+            if now - last_report >= 2 or not pending:
+                elapsed = now - started
+                per_second = completed / elapsed if elapsed else 0
+                eta = (total - completed) / per_second if per_second else 0
+                progress(f"Pre-warmed {completed}/{total} student-terms "
+                         f"({completed / max(total, 1):.0%}, {per_second:.0f}/s, ETA {eta:.0f}s)")
+                last_report = now
+
+    with app.app_context():
+        store = app.extensions['prerender']
+        for year, semester, version, _ in plan:
+            if TermVersion.current(year, semester) == version:
+                store.prune(year, semester, version)
+
+    return {'terms': len(plan), 'student_terms': completed, 'seconds': round(time.monotonic() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--year', type=int, help='only this year (default: every imported term)')
+    parser.add_argument('--semester', type=int, help='only this semester')
+    parser.add_argument('--workers', type=int, help='worker processes (default: half the CPUs)')
+    parser.add_argument('--rate', type=float, help='max renders per second across all workers')
+    parser.add_argument('--nice', type=int, default=10, help='CPU niceness added to the workers')
+    parser.add_argument('--kinds', nargs='+', choices=['result', 'pdf'], default=['result', 'pdf'])
+    args = parser.parse_args()
+
+    with app.app_context():
+        terms = db.session.execute(select(TermVersion.year, TermVersion.semester)
+                                   .order_by(TermVersion.year, TermVersion.semester)).all()
+    terms = [(y, s) for y, s in terms
+             if (args.year is None or y == args.year) and (args.semester is None or s == args.semester)]
+    summary = prewarm_terms(terms, workers=args.workers, rate=args.rate, nice=args.nice, kinds=args.kinds)
+    print(f"Done: {summary['student_terms']} student-terms in {summary['terms']} terms, {summary['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+Opt-in request profiling
+
+Off unless PROFILE_SAMPLE_RATE or PROFILE_SLOW_MS is set (config or
+environment):
+
+- PROFILE_SAMPLE_RATE (e.g. 0.01): that fraction of requests runs under
+  cProfile. The full call tree is saved as a .prof file (open it with
+  pstats or snakeviz), and the top functions are stored in the summary.
+- PROFILE_SLOW_MS (e.g. 500): while a request runs, a sampler thread
+  records its stack every PROFILE_STACK_INTERVAL_MS (5). That is cheap
+  enough to leave on, because slowness is only known at the end. Requests
+  that took longer than the threshold are saved with those stacks as a
+  collapsed call tree (flamegraph.pl input).
+
+Every capture records wall and CPU time, plus the time spent in SQL (with
+the slowest statement), template rendering and ReportLab document builds.
+Captures are written to PROFILE_DIR (default instance/profiles/). Only the
+newest PROFILE_KEEP (200) are kept, and /admin/profiles (admin token)
+lists the slowest of them.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import request
+
+SAFE_NAME = re.compile(r'^[0-9A-Za-z_.-]+$')
+EXCLUDED_PREFIXES = ('/static/', '/assets/', '/admin/profiles')
+MAX_STACK_DEPTH = 64
+
+_local = threading.local()
+
+
+class Capture:
+    """Measurements of one request in progress"""
+
+    def __init__(self, method, path, sampled):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        self.thread_id = threading.get_ident()
+        self.profiler = cProfile.Profile() if sampled else None
+        self.status = None
+        self.phases = Counter()        # name -> seconds
+        self.sql_count = 0
+        self.slowest_sql = (0.0, None)
+        self.stacks = Counter()        # collapsed stack -> samples
+        self._open = {}                # phase name -> list of start times (phases can nest)
+
+    def begin(self, name):
+        self._open.setdefault(name, []).append(time.perf_counter())
+
+    def end(self, name):
+        starts = self._open.get(name)
+        if starts:
+            self.phases[name] += time.perf_counter() - starts.pop()
+
+
+def current_capture():
+    return getattr(_local, 'capture', None)
+
+
+@contextmanager
+def phase(name):
+    """Time a block as a named phase of the current request (no-op when it is not profiled)"""
+    capture = current_capture()
+    if capture is None:
+        yield
+        return
+    capture.begin(name)
+    try:
+        yield
+    finally:
+        capture.end(name)
+
+
+@contextmanager
+def capturing(capture):
+    """Make capture current in this thread outside a request, e.g. to time an import's phases"""
+    _local.capture = capture
+    try:
+        yield capture
+    finally:
+        _local.capture = None
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Background thread that samples the stacks of watched request threads"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._watched = {}
+        self._wakeup = threading.Condition()
+        self._thread = None
+
+    def watch(self, capture):
+        with self._wakeup:
+            self._watched[capture.thread_id] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def unwatch(self, capture):
+        with self._wakeup:
+            if self._watched.get(capture.thread_id) is capture:
+                del self._watched[capture.thread_id]
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._watched:
+                    self._wakeup.wait()  # idle: no wake-ups while no request is running
+                watched = list(self._watched.items())
+            frames = sys._current_frames()
+            for thread_id, capture in watched:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    capture.stacks[_collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+def _top_functions(profiler, count=25):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({'function': f"{os.path.basename(filename)}:{line}({function})", 'calls': calls,
+                     'total_ms': round(total * 1000, 2), 'cumulative_ms': round(cumulative * 1000, 2)})
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:count]
+
+
+class RequestProfiler:
+    """Decides which requests to profile and writes their captures to a rotating directory"""
+
+    def __init__(self, directory, sample_rate=0.0, slow_ms=0.0, keep=200, stack_interval_ms=5.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.keep = keep
+        self.sampler = StackSampler(stack_interval_ms / 1000)
+        self.stack_interval_ms = stack_interval_ms
+        self.counters = {'requests': 0, 'sampled': 0, 'slow': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def start(self):
+        if not self.enabled or request.path.startswith(EXCLUDED_PREFIXES):
+            return
+        capture = Capture(request.method, request.full_path.rstrip('?'), random.random() < self.sample_rate)
+        _local.capture = capture
+        if self.slow_ms > 0:
+            self.sampler.watch(capture)
+        if capture.profiler is not None:
+            capture.profiler.enable()
+
+    def record_status(self, response):
+        capture = current_capture()
+        if capture is not None:
+            capture.status = response.status_code
+        return response
+
+    def finish(self, error=None):
+        capture = current_capture()
+        if capture is None:
+            return
+        _local.capture = None
+        if capture.profiler is not None:
+            capture.profiler.disable()
+        self.sampler.unwatch(capture)
+        total_ms = (time.perf_counter() - capture.started) * 1000
+        slow = 0 < self.slow_ms <= total_ms
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters['sampled'] += capture.profiler is not None
+            self.counters['slow'] += slow
+        if capture.profiler is not None or slow:
+            self.save(capture, total_ms, 'slow' if slow else 'sampled', error)
+
+    def save(self, capture, total_ms, reason, error=None):
+        slug = re.sub(r'[^0-9A-Za-z]+', '-', capture.path.split('?')[0]).strip('-')[:60] or 'root'
+        name = f"{capture.started_at:%Y%m%dT%H%M%S%f}-{int(total_ms)}ms-{slug}"
+        summary = {
+            'name': name,
+            'method': capture.method,
+            'path': capture.path,
+            'status': capture.status if error is None else 500,
+            'error': repr(error) if error is not None else None,
+            'reason': reason,
+            'started_at': capture.started_at.isoformat() + 'Z',
+            'total_ms': round(total_ms, 2),
+            'cpu_ms': round((time.thread_time() - capture.cpu_started) * 1000, 2),
+            'sql': {'ms': round(capture.phases['sql'] * 1000, 2), 'count': capture.sql_count,
+                    'slowest_ms': round(capture.slowest_sql[0] * 1000, 2), 'slowest': capture.slowest_sql[1]},
+            'phases_ms': {key: round(value * 1000, 2) for key, value in capture.phases.items() if key != 'sql'},
+            'stack_interval_ms': self.stack_interval_ms,
+            'stacks': [[count, stack] for stack, count in capture.stacks.most_common(50)],
+            'functions': _top_functions(capture.profiler) if capture.profiler is not None else [],
+            'profile_file': f"{name}.prof" if capture.profiler is not None else None,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        if capture.profiler is not None:
+            capture.profiler.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+        with open(os.path.join(self.directory, f"{name}.json"), 'w') as fh:
+            json.dump(summary, fh)
+        self.prune()
+
+    def prune(self):
+        """Delete the oldest captures beyond keep (names start with the timestamp)"""
+        summaries = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in summaries[:max(0, len(summaries) - self.keep)]:
+            for path in (name, name[:-len('.json')] + '.prof'):
+                try:
+                    os.remove(os.path.join(self.directory, path))
+                except FileNotFoundError:
+                    pass
+
+    def captures(self):
+        """Saved summaries without their stacks and functions, slowest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        rows = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as fh:
+                    summary = json.load(fh)
+            except (OSError, ValueError):
+                continue  # pruned or being written meanwhile
+            summary.pop('stacks', None)
+            summary.pop('functions', None)
+            rows.append(summary)
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def path_of(self, filename):
+        """Absolute path of a capture file, or None for names outside the directory"""
+        if not SAFE_NAME.match(filename) or not filename.endswith(('.json', '.prof')):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    capture = current_capture()
+    if capture is not None:
+        capture.begin('sql')
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    capture = current_capture()
+    if capture is not None:
+        starts = capture._open.get('sql')
+        elapsed = time.perf_counter() - starts[-1] if starts else 0.0
+        capture.end('sql')
+        capture.sql_count += 1
+        if elapsed > capture.slowest_sql[0]:
+            capture.slowest_sql = (elapsed, ' '.join(statement.split())[:500])
+
+
+def _before_render(sender, template, context, **extra):
+    capture = current_capture()
+    if capture is not None:
+        capture.begin('template')
+
+
+def _template_rendered(sender, template, context, **extra):
+    capture = current_capture()
+    if capture is not None:
+        capture.end('template')
+
+
+def init_profiling(app):
+    """Create the app's RequestProfiler from PROFILE_* config and register its hooks"""
+    from flask import before_render_template, template_rendered
+    from sqlalchemy import event
+    from app import db
+
+    profiler = RequestProfiler(
+        app.config.setdefault('PROFILE_DIR', os.environ.get('PROFILE_DIR')
+                              or os.path.join(app.instance_path, 'profiles')),
+        app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.environ.get('PROFILE_SAMPLE_RATE', 0))),
+        app.config.setdefault('PROFILE_SLOW_MS', float(os.environ.get('PROFILE_SLOW_MS', 0))),
+        app.config.setdefault('PROFILE_KEEP', 200),
+        app.config.setdefault('PROFILE_STACK_INTERVAL_MS', 5.0))
+    app.extensions['profiler'] = profiler
+    app.before_request(profiler.start)
+    app.after_request(profiler.record_status)
+    app.teardown_request(profiler.finish)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_template_rendered, app)
+    return profiler
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Reconcile the database with the result workbooks
+
+Proves that what the database holds for a term is what its workbooks say.
+Each workbook is read into a frame with one row per (roll number, subject
+code), holding the values the importer stores: marks as truncated
+integers (0 when blank or absent), the sheet's grade, the subject name of
+its column block, and lab rows only where the lab has a total. Workbooks are parsed in parallel worker
+processes (--workers), since reading them is the slow part. Each term's
+results are loaded from the database with one query. The two frames are
+then hash-joined on the key, and every difference is classified:
+
+    missing_student   in a workbook, no enrollment for the term
+    extra_student     enrolled for the term, in none of its workbooks
+    name              student name differs
+    subject           the code's subject name differs (once per code)
+    missing_row       subject in the workbook, not in the database
+    extra_row         subject in the database, not in the workbook (or twice)
+    mismatch          marks, internal, external or grade differ
+
+Like the importer, a roll number that appears again (later in a sheet or in
+a later workbook of the same term) is ignored after its first row. Pass
+every workbook of a term, or the students of the others show up as
+extra_student.
+
+    python reconcile.py                     # the workbooks final_import.py imports
+    python reconcile.py --workbook exports/*.xlsx --csv differences.csv
+    python reconcile.py --database instance/academic_tracker.db.shadow
+
+Exits with status 1 if anything differs; --csv writes every difference.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+KEY = ['student_id', 'code']
+FIELDS = ['total', 'internal', 'external', 'grade']
+ISSUES = ['missing_student', 'extra_student', 'name', 'subject', 'missing_row', 'extra_row', 'mismatch']
+NO_VALUE = -1  # internal and external of theory rows, on both sides
+
+
+def sheet_frames(path, year, semester):
+    """A workbook's (students, results) frames, with the values the importer would store"""
+    from curriculum import theory_code, lab_code
+    from sheet_layout import read_sheet, stored_marks
+
+    sheet = read_sheet(path)
+    ids = np.array(sheet.student_ids, dtype=object)
+    index = np.arange(len(ids))
+    students = pd.DataFrame({'student_id': ids, 'name': sheet.names, 'sheet_index': index})
+
+    frames = []
+    for position, ((marks, grades), block) in enumerate(zip(sheet.theory, sheet.layout.theory), 1):
+        frames.append(pd.DataFrame({
+            'student_id': ids, 'sheet_index': index, 'code': theory_code(year, semester, position),
+            'subject': block.name, 'total': stored_marks(marks), 'internal': NO_VALUE, 'external': NO_VALUE,
+            'grade': grades}))
+    for position, ((internal, external, total, grades), block) in enumerate(zip(sheet.labs, sheet.layout.labs), 1):
+        present = (total >= 0) & (total <= 100)  # a lab without a total was not taken: no row
+        frames.append(pd.DataFrame({
+            'student_id': ids[present], 'sheet_index': index[present], 'code': lab_code(year, semester, position),
+            'subject': block.name, 'total': stored_marks(total[present]), 'internal': stored_marks(internal[present]),
+            'external': stored_marks(external[present]), 'grade': grades[present]}))
+    results = (pd.concat(frames, ignore_index=True) if frames
+               else pd.DataFrame(columns=['sheet_index'] + KEY + ['subject'] + FIELDS))
+    return students, results
+
+
+def database_frames(connection, year, semester):
+    """A term's (students, results) frames from the database"""
+    from sqlalchemy import text
+
+    term = {'year': year, 'semester': semester}
+    students = pd.read_sql(text(
+        "SELECT st.student_id, st.name FROM enrollments e JOIN students st ON st.id = e.student_pk "
+        "WHERE e.year = :year AND e.semester = :semester"), connection, params=term)
+    results = pd.read_sql(text(
+        f"SELECT st.student_id, s.code, s.name AS subject, t.marks AS total, {NO_VALUE} AS internal, {NO_VALUE} AS external, t.grade "
+        "FROM theory_subjects t JOIN enrollments e ON e.id = t.enrollment_id "
+        "JOIN students st ON st.id = e.student_pk JOIN subjects s ON s.id = t.subject_id "
+        "WHERE e.year = :year AND e.semester = :semester "
+        "UNION ALL "
+        "SELECT st.student_id, s.code, s.name, l.total_marks, l.internal_marks, l.external_marks, l.grade "
+        "FROM lab_courses l JOIN enrollments e ON e.id = l.enrollment_id "
+        "JOIN students st ON st.id = e.student_pk JOIN subjects s ON s.id = l.subject_id "
+        "WHERE e.year = :year AND e.semester = :semester"), connection, params=term)
+    return students, results
+
+
+def _difference(frame, issue, field=None, sheet=None, database=None):
+    return pd.DataFrame({
+        'student_id': frame['student_id'].to_numpy() if 'student_id' in frame else None,
+        'code': frame['code'].to_numpy() if 'code' in frame else None,
+        'issue': issue,
+        'field': field,
+        'sheet': frame[sheet].astype(str).to_numpy() if sheet else None,
+        'database': frame[database].astype(str).to_numpy() if database else None,
+        'source': frame['source'].to_numpy() if 'source' in frame else None,
+    })
+
+
+def reconcile_term(sheets, db_students, db_results):
+    """Every difference between a term's workbooks and its database rows, as one frame
+
+    sheets: (source, students, results) per workbook, in import order
+    """
+    from curriculum import subject_key
+
+    students = pd.concat([frame.assign(source=source) for source, frame, _ in sheets], ignore_index=True)
+    results = pd.concat([frame.assign(source=source) for source, _, frame in sheets], ignore_index=True)
+    # The importer keeps a roll number's first row and skips the rest
+    students = students.drop_duplicates('student_id')
+    results = results.merge(students[['source', 'sheet_index']], on=['source', 'sheet_index'])
+
+    differences = []
+    people = students.merge(db_students, on='student_id', how='outer', suffixes=('_sheet', '_db'), indicator=True)
+    differences.append(_difference(people[people['_merge'] == 'left_only'], 'missing_student'))
+    differences.append(_difference(people[people['_merge'] == 'right_only'], 'extra_student'))
+    both = people[people['_merge'] == 'both']
+    renamed = both[both['name_sheet'].str.strip() != both['name_db'].str.strip()]
+    differences.append(_difference(renamed, 'name', 'name', 'name_sheet', 'name_db'))
+
+    # Codes follow the sheet position, so a code must also name the same subject on both sides
+    subjects = results.drop_duplicates('code')[['code', 'subject', 'source']].merge(
+        db_results.drop_duplicates('code')[['code', 'subject']], on='code', suffixes=('_sheet', '_db'))
+    relabeled = subjects[subjects['subject_sheet'].map(subject_key) != subjects['subject_db'].map(subject_key)]
+    differences.append(_difference(relabeled, 'subject', 'subject', 'subject_sheet', 'subject_db'))
+
+    # Rows of students missing on either side are already reported as a whole
+    enrolled = set(both['student_id'])
+    repeated = db_results.duplicated(KEY)
+    differences.append(_difference(db_results[repeated & db_results['student_id'].isin(enrolled)], 'extra_row'))
+    rows = results.merge(db_results[~repeated], on=KEY, how='outer', suffixes=('_sheet', '_db'), indicator=True)
+    rows = rows[rows['student_id'].isin(enrolled)]
+    differences.append(_difference(rows[rows['_merge'] == 'left_only'], 'missing_row'))
+    differences.append(_difference(rows[rows['_merge'] == 'right_only'], 'extra_row'))
+    matched = rows[rows['_merge'] == 'both'].copy()
+    for field in FIELDS:
+        sheet, database = f'{field}_sheet', f'{field}_db'
+        if field == 'grade':
+            differs = matched[sheet].astype(str).str.upper() != matched[database].astype(str).str.upper()
+        else:
+            # The outer join made these float; both sides are whole numbers
+            matched[sheet], matched[database] = matched[sheet].astype(int), matched[database].astype(int)
+            differs = matched[sheet] != matched[database]
+        differences.append(_difference(matched[differs.to_numpy()], 'mismatch', field, sheet, database))
+    return pd.concat(differences, ignore_index=True), len(students), len(results)
+
+
+def term_of(path):
+    match = re.match(r'(\d)-(\d)', os.path.basename(path))
+    if not match:
+        sys.exit(f"Cannot tell the term of {path} from its name; pass --term")
+    return int(match.group(1)), int(match.group(2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workbook', nargs='+', help='workbooks to reconcile (default: final_import.WORKBOOKS)')
+    parser.add_argument('--term', help='year-semester of every --workbook, e.g. 2-1 (default: from the file names)')
+    parser.add_argument('--database', help='SQLite file to reconcile instead of the app\'s database')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='processes that parse workbooks')
+    parser.add_argument('--examples', type=int, default=10, help='differences printed per term and issue')
+    parser.add_argument('--csv', help='write every difference to this file')
+    parser.add_argument('--json', help='write the counts per term and issue to this file')
+    args = parser.parse_args()
+
+    if args.database:
+        if not os.path.exists(args.database):
+            parser.exit(1, f"No database at {args.database}\n")
+        # Must be set before the app module is imported
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(args.database)}"
+    from app import app, db
+
+    if args.workbook:
+        term = tuple(map(int, args.term.split('-'))) if args.term else None
+        workbooks = [(path, *(term or term_of(path))) for path in args.workbook]
+    else:
+        from final_import import WORKBOOKS
+        workbooks = WORKBOOKS
+
+    started = time.perf_counter()
+    # spawn, not fork: this process has the app's threads and database connections
+    with ProcessPoolExecutor(max_workers=max(1, args.workers),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        parsed = list(pool.map(sheet_frames, *zip(*workbooks)))
+    read = time.perf_counter()
+
+    terms = {}
+    for (path, year, semester), (students, results) in zip(workbooks, parsed):
+        terms.setdefault((year, semester), []).append((os.path.basename(path), students, results))
+
+    report, all_differences = {}, []
+    with app.app_context(), db.engine.connect() as connection:
+        for (year, semester), sheets in sorted(terms.items()):
+            db_students, db_results = database_frames(connection, year, semester)
+            differences, student_count, row_count = reconcile_term(sheets, db_students, db_results)
+            counts = differences['issue'].value_counts()
+            report[f"{year}-{semester}"] = {'workbooks': [source for source, _, _ in sheets],
+                                            'students': student_count, 'rows': row_count,
+                                            'differences': {issue: int(counts.get(issue, 0)) for issue in ISSUES}}
+            all_differences.append(differences.assign(year=year, semester=semester))
+
+            print(f"\n=== Year {year}, Semester {semester}: {student_count} students, {row_count} rows in "
+                  f"{len(sheets)} workbook(s), {len(db_students)} enrolled, {len(db_results)} rows in the database ===")
+            if differences.empty:
+                print("No differences")
+            for issue in ISSUES:
+                found = differences[differences['issue'] == issue]
+                if found.empty:
+                    continue
+                print(f"{issue}: {len(found)}")
+                for row in found.head(args.examples).itertuples():
+                    detail = f" {row.field}: sheet {row.sheet}, database {row.database}" if row.field else ''
+                    print(f"  {' '.join(filter(None, [row.student_id, row.code]))}{detail}")
+
+    differences = pd.concat(all_differences, ignore_index=True) if all_differences else pd.DataFrame()
+    print(f"\n{len(differences)} differences in {len(terms)} term(s); "
+          f"workbooks read in {read - started:.2f}s, compared in {time.perf_counter() - read:.2f}s")
+    if args.csv:
+        columns = ['year', 'semester', 'student_id', 'code', 'issue', 'field', 'sheet', 'database', 'source']
+        differences.reindex(columns=columns).to_csv(args.csv, index=False)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    if len(differences):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Apply revaluation results without re-importing the term
+
+After revaluation only a handful of marks change, but a re-import replaces
+every row of the term and makes every cached page stale. revalue() changes
+one theory or lab row of one student instead:
+
+- the row is regraded: an explicit grade (the university's) wins, else the
+  grade is derived from the marks with the curriculum.py bands
+- the student's stored summary (enrollments.cgpa, percentage, passed) is
+  recomputed from that student's own rows
+- the term's class_statistics and the subject's subject_statistics are
+  adjusted by the difference between the old and new values
+- rank and topper are read from the ix_enrollments_rank index instead of
+  sorting the class
+
+The summaries are built for a whole term once by rebuild_term(), which
+prewarm.py calls after each import. revalue() calls it as well when they
+are missing or belong to an older import.
+
+Afterwards, only the cached output that shows the change is dropped:
+
+- the student's pre-rendered page and PDF
+- every pre-rendered page of the term, but only if the class statistics
+  shown on it changed (PDFs do not show them)
+- this process's coalesced copies of the same pages
+
+The term's revision is bumped, so analytics matrices, result snapshots and
+PDF jobs in every process pick the change up.
+
+    python revaluation.py 232G1A3224 1 1 TS1103 --marks 72
+    python revaluation.py 232G1A3224 1 1 LAB1102 --internal 27 --external 60
+
+POST /api/revaluation (admin) takes the same fields as JSON.
+"""
+import argparse
+import json
+
+from sqlalchemy import select, update, delete, func, tuple_, case
+
+from app import app, db
+from models import (Student, Enrollment, Subject, TheorySubject, LabCourse, ClassStatistics,
+                    SubjectStatistics, TermVersion)
+from curriculum import LETTER_GRADES, grade_for
+
+
+class RevaluationError(ValueError):
+    """Rejected update; status is the HTTP status the API answers with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _term(year, semester):
+    return (Enrollment.year == year) & (Enrollment.semester == semester)
+
+
+def rebuild_term(year, semester):
+    """Store summaries, class statistics and subject statistics of a whole term (commits)"""
+    import analytics
+
+    matrix = analytics.get_term_matrix(year, semester)
+    enrollment_ids = dict(db.session.execute(
+        select(Student.student_id, Enrollment.id).join(Enrollment).where(_term(year, semester))).all())
+    if matrix.student_ids:
+        db.session.execute(update(Enrollment), [
+            {'id': enrollment_ids[student_id], 'cgpa': float(matrix.sgpa[i]),
+             'percentage': float(matrix.percentage[i]), 'passed': bool(matrix.passed[i])}
+            for i, student_id in enumerate(matrix.student_ids)])
+
+    stats = matrix.class_statistics()
+    toppers = matrix.toppers(1)
+    positive = matrix.sgpa[matrix.sgpa > 0]
+    row = ClassStatistics.query.filter_by(year=year, semester=semester).first()
+    if row is None:
+        row = ClassStatistics(year=year, semester=semester)
+        db.session.add(row)
+    row.total_students = stats['total_students']
+    row.passed_students = stats['passed']
+    row.failed_students = stats['failed']
+    row.average_cgpa = stats['average_cgpa']
+    row.topper_student_id = toppers[0]['student_id'] if toppers else None
+    row.cgpa_total = round(float(positive.sum()), 2)
+    row.graded_students = int(positive.size)
+    row.term_version = TermVersion.current(year, semester)
+
+    subject_ids = select(Subject.id).where(Subject.year == year, Subject.semester == semester)
+    db.session.execute(delete(SubjectStatistics).where(SubjectStatistics.subject_id.in_(subject_ids)))
+    for table, marks in [(TheorySubject, TheorySubject.marks), (LabCourse, LabCourse.total_marks)]:
+        aggregates = db.session.execute(
+            select(table.subject_id, func.count(), func.sum(marks), func.sum(marks * marks),
+                   func.sum(case((table.grade == 'F', 1), else_=0)))
+            .join(Enrollment, Enrollment.id == table.enrollment_id)
+            .where(_term(year, semester)).group_by(table.subject_id)).all()
+        db.session.add_all(SubjectStatistics(subject_id=subject_id, students=n, marks_total=total,
+                                             marks_squares=squares, failed=failed)
+                           for subject_id, n, total, squares, failed in aggregates)
+    db.session.commit()
+    return stats
+
+
+def ensure_summaries(year, semester):
+    """Build the term's summaries unless they match the current import; True if they were rebuilt"""
+    built_for = db.session.execute(select(ClassStatistics.term_version)
+                                   .filter_by(year=year, semester=semester)).scalar()
+    if built_for and built_for == TermVersion.current(year, semester):
+        return False
+    rebuild_term(year, semester)
+    return True
+
+
+def topper(year, semester):
+    """Roll number of the best stored summary: passed first, then CGPA, ties by roll number"""
+    best = db.session.execute(
+        select(Enrollment.passed, Enrollment.cgpa).where(_term(year, semester))
+        .order_by(Enrollment.passed.desc(), Enrollment.cgpa.desc()).limit(1)).first()
+    if best is None:
+        return None
+    # Both lookups are ranges of ix_enrollments_rank; only the tied students are joined
+    return db.session.execute(
+        select(func.min(Student.student_id)).join(Enrollment)
+        .where(_term(year, semester), Enrollment.passed == best.passed, Enrollment.cgpa == best.cgpa)).scalar()
+
+
+def rank(enrollment):
+    """Competition rank within the term, same order as TermMatrix.rank"""
+    ahead = db.session.execute(
+        select(func.count()).select_from(Enrollment)
+        .where(_term(enrollment.year, enrollment.semester),
+               tuple_(Enrollment.passed, Enrollment.cgpa) > tuple_(enrollment.passed, enrollment.cgpa))).scalar()
+    return ahead + 1
+
+
+def _summary(enrollment):
+    return {'cgpa': enrollment.cgpa, 'percentage': enrollment.percentage,
+            'result': 'PASS' if enrollment.passed else 'FAIL'}
+
+
+def _class_summary(stats):
+    return {'total_students': stats.total_students, 'passed': stats.passed_students,
+            'failed': stats.failed_students, 'average_cgpa': stats.average_cgpa,
+            'topper_student_id': stats.topper_student_id}
+
+
+def _check_marks(value, name, low=0, high=100):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise RevaluationError(f"{name} must be a whole number")
+    if not low <= value <= high:
+        raise RevaluationError(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _apply_marks(row, marks, internal, external, grade):
+    """Set the row's marks and grade; returns (old marks, new marks) counted in the subject totals"""
+    if isinstance(row, LabCourse):
+        if marks is not None or (internal is None and external is None):
+            raise RevaluationError(f"{row.lab_code} is a lab: give internal and/or external marks")
+        old = row.total_marks
+        row.internal_marks = _check_marks(internal, 'internal') if internal is not None else row.internal_marks
+        row.external_marks = _check_marks(external, 'external') if external is not None else row.external_marks
+        row.total_marks = _check_marks(row.internal_marks + row.external_marks, 'total')
+        new = row.total_marks
+    else:
+        if marks is None or internal is not None or external is not None:
+            raise RevaluationError(f"{row.subject_code} is a theory subject: give marks")
+        old = row.marks
+        row.marks = new = _check_marks(marks, 'marks')
+    row.grade = grade or grade_for(new)
+    return old, new
+
+
+def revalue(student_id, year, semester, code, marks=None, internal=None, external=None, grade=None):
+    """Update one subject or lab of a student's result and everything derived from it (commits)"""
+    if grade is not None and grade not in LETTER_GRADES:
+        raise RevaluationError(f"grade must be one of {', '.join(LETTER_GRADES)}")
+    enrollment = Enrollment.find(student_id, year, semester)
+    if enrollment is None:
+        raise RevaluationError(f"No result for {student_id} in year {year}, semester {semester}", 404)
+    row = next((r for r in enrollment.theory_subjects + enrollment.lab_courses if r.subject.code == code), None)
+    if row is None:
+        raise RevaluationError(f"{student_id} has no subject {code} in year {year}, semester {semester}", 404)
+
+    rebuilt = ensure_summaries(year, semester)
+    stats = ClassStatistics.query.filter_by(year=year, semester=semester).one()
+    subject_stats = SubjectStatistics.query.filter_by(subject_id=row.subject_id).first()
+    shown_before = (stats.passed_students, stats.failed_students, stats.average_cgpa)
+    before = _summary(enrollment)
+    old_grade = row.grade
+    old_marks, new_marks = _apply_marks(row, marks, internal, external, grade)
+
+    was_passed, old_cgpa = enrollment.passed, enrollment.cgpa
+    enrollment.cgpa = enrollment.calculate_cgpa()
+    enrollment.percentage = enrollment.calculate_percentage()
+    enrollment.passed = enrollment.get_result_status() == 'PASS'
+
+    # Class statistics by delta; the average is over students with a positive CGPA, as in TermMatrix
+    if enrollment.passed != was_passed:
+        change = 1 if enrollment.passed else -1
+        stats.passed_students += change
+        stats.failed_students -= change
+    stats.cgpa_total = round(stats.cgpa_total + max(enrollment.cgpa, 0) - max(old_cgpa, 0), 2)
+    stats.graded_students += (enrollment.cgpa > 0) - (old_cgpa > 0)
+    stats.average_cgpa = round(stats.cgpa_total / stats.graded_students, 2) if stats.graded_students else 0.0
+    if subject_stats is not None:
+        subject_stats.marks_total += new_marks - old_marks
+        subject_stats.marks_squares += new_marks * new_marks - old_marks * old_marks
+        subject_stats.failed += (row.grade == 'F') - (old_grade == 'F')
+
+    TermVersion.revise(year, semester)
+    db.session.flush()
+    stats.topper_student_id = topper(year, semester)
+    db.session.commit()
+
+    class_changed = (stats.passed_students, stats.failed_students, stats.average_cgpa) != shown_before
+    invalidated = invalidate(student_id, year, semester, class_changed)
+    return {
+        'student_id': student_id,
+        'year': year,
+        'semester': semester,
+        'code': code,
+        'grade': {'before': old_grade, 'after': row.grade},
+        'marks': {'before': old_marks, 'after': new_marks},
+        'summary': {'before': before, 'after': _summary(enrollment), 'rank': rank(enrollment)},
+        'class_statistics': _class_summary(stats),
+        'subject_statistics': subject_stats.summary() if subject_stats is not None else None,
+        'summaries_rebuilt': rebuilt,
+        'invalidated': invalidated,
+    }
+
+
+def invalidate(student_id, year, semester, class_changed):
+    """Drop the stored and coalesced output that shows the student's result"""
+    store = app.extensions['prerender']
+    counts = {'pages': store.discard('result', year, semester, student_id),
+              'pdfs': store.discard('pdf', year, semester, student_id)}
+    if class_changed:
+        # Every page of the term shows the class statistics
+        counts['pages'] += store.discard('result', year, semester)
+
+    def stale(key):
+        return key[1:] == (student_id, year, semester) or (
+            class_changed and key[0] == 'result' and key[2:] == (year, semester))
+
+    counts['coalesced'] = app.extensions['coalescer'].discard(stale)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('student_id')
+    parser.add_argument('year', type=int)
+    parser.add_argument('semester', type=int)
+    parser.add_argument('code', help='subject or lab code')
+    parser.add_argument('--marks', type=int, help='new marks of a theory subject')
+    parser.add_argument('--internal', type=int, help='new internal marks of a lab')
+    parser.add_argument('--external', type=int, help='new external marks of a lab')
+    parser.add_argument('--grade', help='official grade (default: derived from the marks)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            result = revalue(args.student_id, args.year, args.semester, args.code,
+                             marks=args.marks, internal=args.internal, external=args.external, grade=args.grade)
+        except RevaluationError as e:
+            parser.exit(1, f"Error: {e}\n")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
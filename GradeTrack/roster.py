@@ -0,0 +1,148 @@
+"""
+Class roster: a term's students, one page at a time
+
+Pages are found by keyset, not OFFSET: the cursor of a page is the sort
+key of its last row, and the next page starts with the rows after it. With
+an index on (year, semester, sort key), every page reads only its own rows
+from the index, so page 500 costs what page 1 does. The sort keys live on
+enrollments (migration 4 copies roll number, name and branch there; cgpa
+and passed are the stored summaries), and each sort has its index:
+
+    roll    roll_number                ix_enrollments_roll (ix_enrollments_branch with a branch)
+    name    student_name, id           ix_enrollments_name
+    sgpa    cgpa, id                   ix_enrollments_sgpa
+    rank    passed, cgpa, id           ix_enrollments_rank
+
+The result (pass/fail) and branch filters are index prefixes or checked on
+the rows read, which makes a page cost at most its size divided by the
+share of students that match. Ranks are competition ranks (passed first,
+then SGPA, ties share a rank) and are only numbered when sorting by rank
+in the default order. They are carried in the cursor rather than counted.
+With a branch filter they are ranks within the branch.
+"""
+import base64
+import json
+
+from sqlalchemy import select, func, tuple_
+
+from app import db
+from models import Enrollment, ClassStatistics
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# sort -> (key columns, default order)
+SORTS = {
+    'roll': ((Enrollment.roll_number,), 'asc'),
+    'name': ((Enrollment.student_name, Enrollment.id), 'asc'),
+    'sgpa': ((Enrollment.cgpa, Enrollment.id), 'desc'),
+    'rank': ((Enrollment.passed, Enrollment.cgpa, Enrollment.id), 'desc'),
+}
+RESULTS = {'pass': True, 'fail': False}
+
+
+class RosterError(ValueError):
+    """Invalid roster request; status is the HTTP status the API answers with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise RosterError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise RosterError("Invalid cursor")
+    return values
+
+
+def _rank_start(year, semester, result, branch):
+    """Rank of the first listed student: failed students come after every passed one"""
+    if result != 'fail':
+        return 1
+    if branch is None:
+        stats = ClassStatistics.query.filter_by(year=year, semester=semester).first()
+        return stats.passed_students + 1
+    return db.session.execute(
+        select(func.count()).select_from(Enrollment)
+        .where(Enrollment.year == year, Enrollment.semester == semester,
+               Enrollment.branch == branch, Enrollment.passed.is_(True))).scalar() + 1
+
+
+def roster_page(year, semester, sort='roll', order=None, result=None, branch=None, after=None, limit=PAGE_SIZE):
+    """One page of a term's roster as a dict with its rows and the cursor of the next page (None at the end)"""
+    import revaluation
+
+    if sort not in SORTS:
+        raise RosterError(f"sort must be one of {', '.join(SORTS)}")
+    columns, default_order = SORTS[sort]
+    order = order or default_order
+    if order not in ('asc', 'desc'):
+        raise RosterError("order must be asc or desc")
+    if result is not None and result not in RESULTS:
+        raise RosterError("result must be pass or fail")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise RosterError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    numbered = sort == 'rank' and order == 'desc'
+
+    # SGPA and results are the stored summaries; built once per import
+    revaluation.ensure_summaries(year, semester)
+
+    query = select(Enrollment.id, Enrollment.roll_number, Enrollment.student_name, Enrollment.branch,
+                   Enrollment.cgpa, Enrollment.percentage, Enrollment.passed) \
+        .where(Enrollment.year == year, Enrollment.semester == semester)
+    if result is not None:
+        query = query.where(Enrollment.passed.is_(RESULTS[result]))
+    if branch is not None:
+        query = query.where(Enrollment.branch == branch)
+
+    # Rank state (rank and position of the last row) rides along in the cursor
+    rank = position = 0
+    previous = None
+    if after is not None:
+        values = decode_cursor(after, len(columns) + (2 if numbered else 0))
+        if numbered:
+            rank, position = values[-2:]
+            values = values[:-2]
+            previous = tuple(values[:2])  # a tie can continue on this page
+    elif numbered:
+        position = _rank_start(year, semester, result, branch) - 1
+    # With a result filter passed is fixed; leaving it out of the key lets SQLite seek on it
+    keyed = slice(1, None) if sort == 'rank' and result is not None else slice(None)
+    if after is not None:
+        key = tuple_(*columns[keyed])
+        query = query.where(key > tuple_(*values[keyed]) if order == 'asc' else key < tuple_(*values[keyed]))
+    query = query.order_by(*(column.asc() if order == 'asc' else column.desc() for column in columns[keyed]))
+
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    students = []
+    for row in rows:
+        entry = {'student_id': row.roll_number, 'name': row.student_name, 'branch': row.branch,
+                 'sgpa': row.cgpa, 'percentage': row.percentage,
+                 'result': 'PASS' if row.passed else 'FAIL'}
+        if numbered:
+            position += 1
+            standing = (row.passed, row.cgpa)
+            if standing != previous:
+                rank = position
+            previous = standing
+            entry['rank'] = rank
+        students.append(entry)
+
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        values = [getattr(last, column.key) for column in columns]
+        next_cursor = encode_cursor(values + ([rank, position] if numbered else []))
+    return {'year': year, 'semester': semester, 'sort': sort, 'order': order, 'result': result,
+            'branch': branch, 'students': students, 'next': next_cursor}
@@ -1,6 +1,6 @@
-from flask import render_template, request, redirect, url_for, jsonify, make_response
+from flask import render_template, request, redirect, url_for, jsonify, make_response, Response, stream_with_context, send_file, abort
 from app import app, db
-from models import Student, TheorySubject, LabCourse, ClassStatistics
+from models import Student, Enrollment, TheorySubject, LabCourse, ClassStatistics
 from sqlalchemy import func
 import json
 from reportlab.lib.pagesizes import letter, A4
@@ -10,6 +10,15 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 from io import BytesIO
 import logging
+from charts import build_chart_drawing, chart_cache, CONTENT_TYPES
+from auth import require_admin
+import export_results
+import analytics
+import revaluation
+import roster
+from curriculum import BRANCHES
+from profiling import phase
+from snapshot import find_result
 
 @app.route('/')
 def index():
@@ -27,11 +36,7 @@ def search_student():
         return redirect(url_for('index'))
     
     # Check if student exists
-    student = Student.query.filter_by(
-        student_id=student_id, 
-        year=year, 
-        semester=semester
-    ).first()
+    student = find_result(student_id, year, semester)
     
     if not student:
         return render_template('index.html', error="Student not found for the specified year and semester.")
@@ -41,16 +46,28 @@ def search_student():
 @app.route('/result/<student_id>/<int:year>/<int:semester>')
 def result(student_id, year, semester):
     """Display student result page"""
-    # Get student data
-    student = Student.query.filter_by(
-        student_id=student_id, 
-        year=year, 
-        semester=semester
-    ).first()
+    # Concurrent requests for the same page share one render; pre-warmed pages skip it
+    page = app.extensions['coalescer'].get(('result', student_id, year, semester),
+                                           lambda: load_prerendered('result', student_id, year, semester)
+                                           or render_result_page(student_id, year, semester))
     
-    if not student:
+    if page is None:
         return redirect(url_for('index'))
     
+    return page
+
+def load_prerendered(kind, student_id, year, semester):
+    """Page or PDF stored by prewarm.py for the term's current version, or None"""
+    return app.extensions['prerender'].load(kind, student_id, year, semester)
+
+def render_result_page(student_id, year, semester):
+    """Result page HTML, or None if the student has no result for the term"""
+    # Get the student's results for this term (from the in-memory snapshot when enabled)
+    student = find_result(student_id, year, semester)
+    
+    if not student:
+        return None
+    
     # Get class statistics
     stats = get_class_statistics(year, semester)
     
@@ -64,17 +81,203 @@ def result(student_id, year, semester):
 
 @app.route('/download_pdf/<student_id>/<int:year>/<int:semester>')
 def download_pdf(student_id, year, semester):
-    """Generate and download PDF report"""
-    student = Student.query.filter_by(
-        student_id=student_id, 
-        year=year, 
-        semester=semester
-    ).first()
+    """Download the PDF report, or queue it and answer 202 while it is rendered"""
+    jobs = app.extensions['pdf_jobs']
     
-    if not student:
+    def load_pdf():
+        pdf = load_prerendered('pdf', student_id, year, semester)
+        if pdf is None and not jobs.enabled:
+            pdf = render_result_pdf(student_id, year, semester)
+        return pdf
+    
+    pdf = app.extensions['coalescer'].get(('pdf', student_id, year, semester), load_pdf)
+    
+    if pdf is None:
+        if jobs.enabled:
+            return queue_pdf(student_id, year, semester, retry_failed=True)
         return redirect(url_for('index'))
     
-    # Create PDF
+    response = make_response(pdf)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'attachment; filename="{student_id}_result.pdf"'
+    
+    return response
+
+@app.route('/pdf_status/<student_id>/<int:year>/<int:semester>')
+def pdf_status(student_id, year, semester):
+    """Poll a queued PDF: 202 while it renders, 200 with the download URL once ready"""
+    if app.extensions['prerender'].exists('pdf', student_id, year, semester):
+        return jsonify({'state': 'done',
+                        'download_url': url_for('download_pdf', student_id=student_id, year=year, semester=semester)})
+    return queue_pdf(student_id, year, semester)
+
+def queue_pdf(student_id, year, semester, retry_failed=False):
+    """Make sure a render job exists for the PDF and describe it (202, 404, 500 or 503)"""
+    jobs = app.extensions['pdf_jobs']
+    job = jobs.find(student_id, year, semester)
+    # No live job in this process: first request, another web worker took it, or it finished
+    # without a file (re-imported meanwhile)
+    if job is None or job.state == 'done' or (job.state == 'failed' and retry_failed):
+        if not find_result(student_id, year, semester):
+            return jsonify({'error': 'Result not found'}), 404
+        job = jobs.submit(student_id, year, semester)
+        if job is None:
+            response = jsonify({'state': 'busy', 'error': 'PDF queue is full, try again shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+    if job.state == 'failed':
+        return jsonify({'state': 'failed', 'error': job.error}), 500
+    
+    status_url = url_for('pdf_status', student_id=student_id, year=year, semester=semester)
+    download_url = url_for('download_pdf', student_id=student_id, year=year, semester=semester)
+    if request.path == download_url and request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'text/html':
+        # Browsers following the PDF link get a page that retries the download
+        response = make_response(render_template('pdf_pending.html', download_url=download_url), 202)
+    else:
+        response = jsonify({'state': job.state, 'status_url': status_url, 'download_url': download_url})
+        response.status_code = 202
+    response.headers['Location'] = status_url
+    response.headers['Retry-After'] = '1'
+    return response
+
+def render_result_pdf(student_id, year, semester):
+    """PDF bytes of a student's result, or None if there is no result for the term"""
+    student = find_result(student_id, year, semester)
+    return build_result_pdf(student) if student else None
+
+@app.route('/chart/<student_id>/<int:year>/<int:semester>.<fmt>')
+def chart_image(student_id, year, semester, fmt):
+    """Server-rendered performance chart, used when Chart.js is unavailable"""
+    if fmt not in CONTENT_TYPES:
+        return make_response('Unsupported chart format', 404)
+    
+    student = find_result(student_id, year, semester)
+    
+    if not student:
+        return make_response('Student not found', 404)
+    
+    try:
+        image = chart_cache.get((student_id, year, semester), get_chart_data(student), fmt)
+    except Exception as e:
+        logging.warning("Chart rendering failed for %s (%s): %s", student_id, fmt, e)
+        return make_response('Chart format not available', 404)
+    
+    response = make_response(image)
+    response.headers['Content-Type'] = CONTENT_TYPES[fmt]
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+@app.route('/api/result/<student_id>/<int:year>/<int:semester>')
+def api_result(student_id, year, semester):
+    """A student's result for one term as JSON"""
+    student = find_result(student_id, year, semester)
+    
+    if not student:
+        return jsonify({'error': 'Result not found'}), 404
+    
+    return jsonify(get_result_data(student))
+
+@app.route('/export/<int:year>/<int:semester>.<fmt>')
+@require_admin
+def export_term(year, semester, fmt):
+    """Stream a whole term's results as CSV, Parquet or XLSX"""
+    if fmt not in export_results.FORMATS:
+        return make_response('Unsupported export format', 404)
+    missing = export_results.missing_package(fmt)
+    if missing:
+        # Checked here: once the streaming response starts, the status is already 200
+        return make_response(f'{fmt} export needs the {missing} package', 501)
+    
+    chunks = export_results.export_chunks(year, semester, fmt)
+    response = Response(stream_with_context(chunks), mimetype=export_results.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="results_Y{year}S{semester}.{fmt}"'
+    return response
+
+@app.route('/api/stats')
+@require_admin
+def runtime_stats():
+    """Request coalescing, compression and PDF queue counters of this process"""
+    return jsonify({
+        'coalescing': app.extensions['coalescer'].stats(),
+        'compression': app.extensions['compressor'].stats,
+        'pdf_jobs': app.extensions['pdf_jobs'].stats(),
+        'profiling': app.extensions['profiler'].counters,
+        'slow_queries': app.extensions['query_log'].counters if 'query_log' in app.extensions else None,
+    })
+
+@app.route('/api/analytics/<int:year>/<int:semester>')
+@require_admin
+def analytics_report(year, semester):
+    """Whole-cohort analytics report as JSON"""
+    return jsonify(analytics.get_term_matrix(year, semester).report())
+
+@app.route('/roster/<int:year>/<int:semester>')
+@require_admin
+def roster_view(year, semester):
+    """A term's class roster, one page at a time (see roster.py)"""
+    try:
+        page = roster_page_from_args(year, semester)
+    except roster.RosterError as e:
+        abort(e.status, description=str(e))
+    return render_template('roster.html', page=page, branches=BRANCHES, sorts=roster.SORTS,
+                           token=request.args.get('token'))
+
+@app.route('/api/roster/<int:year>/<int:semester>')
+@require_admin
+def api_roster(year, semester):
+    """One roster page as JSON: sort, order, result, branch, after (the previous page's next) and limit"""
+    try:
+        return jsonify(roster_page_from_args(year, semester))
+    except roster.RosterError as e:
+        return jsonify({'error': str(e)}), e.status
+
+def roster_page_from_args(year, semester):
+    args = request.args
+    return roster.roster_page(year, semester, sort=args.get('sort', 'roll'), order=args.get('order') or None,
+                              result=args.get('result') or None, branch=args.get('branch') or None,
+                              after=args.get('after') or None,
+                              limit=args.get('limit', roster.PAGE_SIZE, type=int))
+
+@app.route('/admin/profiles')
+@require_admin
+def profiles():
+    """Slowest captured request profiles (see profiling.py)"""
+    profiler = app.extensions['profiler']
+    return render_template('profiles.html', profiler=profiler, captures=profiler.captures()[:100],
+                           token=request.args.get('token'))
+
+@app.route('/admin/profiles/<filename>')
+@require_admin
+def profile_file(filename):
+    """One capture: the JSON summary with its call tree, or the cProfile .prof file"""
+    path = app.extensions['profiler'].path_of(filename)
+    if path is None:
+        abort(404)
+    return send_file(path, as_attachment=filename.endswith('.prof'))
+
+@app.route('/api/revaluation', methods=['POST'])
+@require_admin
+def revaluation_update():
+    """Apply one revaluated mark: JSON with student_id, year, semester, code and marks or internal/external"""
+    data = request.get_json(silent=True) or {}
+    try:
+        student_id, code = str(data['student_id']).strip(), str(data['code']).strip()
+        year, semester = int(data['year']), int(data['semester'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Expected JSON with student_id, year, semester, code '
+                                 'and marks (theory) or internal/external (lab)'}), 400
+    try:
+        result = revaluation.revalue(student_id, year, semester, code, marks=data.get('marks'),
+                                     internal=data.get('internal'), external=data.get('external'),
+                                     grade=data.get('grade'))
+    except revaluation.RevaluationError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(result)
+
+def build_result_pdf(student):
+    """Build the ReportLab result document for a student and return the PDF bytes"""
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, 
                           topMargin=72, bottomMargin=18)
@@ -197,44 +400,51 @@ def download_pdf(student_id, year, semester):
     ]))
     
     elements.append(lab_table)
+    elements.append(Spacer(1, 30))
     
-    # Build PDF
-    doc.build(elements)
+    # Performance chart (same drawing as the result page fallback image)
+    chart_header = Paragraph("PERFORMANCE CHART", styles['Heading3'])
+    elements.append(chart_header)
+    elements.append(Spacer(1, 10))
+    elements.append(build_chart_drawing(get_chart_data(student)))
     
-    # FileResponse
-    buffer.seek(0)
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename="{student_id}_result.pdf"'
+    # Build PDF
+    with phase('reportlab'):
+        doc.build(elements)
     
-    return response
+    return buffer.getvalue()
 
 def get_class_statistics(year, semester):
     """Get class statistics for the given year and semester"""
-    # Get all students for this year and semester
-    students = Student.query.filter_by(year=year, semester=semester).all()
-    
-    if not students:
-        return {
-            'total_students': 0,
-            'passed': 0,
-            'failed': 0,
-            'average_cgpa': 0.0
-        }
-    
-    total_students = len(students)
-    passed = sum(1 for s in students if s.get_result_status() == 'PASS')
-    failed = total_students - passed
-    
-    # Calculate average CGPA
-    cgpas = [s.calculate_cgpa() for s in students if s.calculate_cgpa() > 0]
-    average_cgpa = round(sum(cgpas) / len(cgpas), 2) if cgpas else 0.0
-    
+    # Computed from the cached marks matrix instead of loading every Student
+    return analytics.get_term_matrix(year, semester).class_statistics()
+
+def get_result_data(student):
+    """JSON-ready result of a student for one term"""
     return {
-        'total_students': total_students,
-        'passed': passed,
-        'failed': failed,
-        'average_cgpa': average_cgpa
+        'student_id': student.student_id,
+        'name': student.name,
+        'year': student.year,
+        'semester': student.semester,
+        'theory_subjects': [{
+            'code': subject.subject_code,
+            'name': subject.subject_name,
+            'credits': subject.subject.credits,
+            'marks': subject.marks,
+            'grade': subject.grade,
+        } for subject in student.theory_subjects],
+        'lab_courses': [{
+            'code': lab.lab_code,
+            'name': lab.lab_name,
+            'credits': lab.subject.credits,
+            'internal_marks': lab.internal_marks,
+            'external_marks': lab.external_marks,
+            'total_marks': lab.total_marks,
+            'grade': lab.grade,
+        } for lab in student.lab_courses],
+        'cgpa': student.calculate_cgpa(),
+        'percentage': student.calculate_percentage(),
+        'result': student.get_result_status(),
     }
 
 def get_chart_data(student):
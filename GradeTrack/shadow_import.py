@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Reload all results without taking the site down
+
+final_import.py clears and refills the database it is pointed at, so run
+against the live file the site shows missing and partial results for the
+whole import, and readers wait on its write locks. This script leaves the
+live file alone until the new data is complete:
+
+1. final_import.py runs against a side file next to the live database
+   (<database>.shadow). The web app never opens that file.
+2. The side file is validated: SQLite integrity and foreign keys, every
+   workbook checkpoint finished, marks and grades in range, no enrollment
+   without results, the same schema version, and no term missing or
+   shrinking by more than --max-shrink compared with the live data.
+3. It is swapped in with os.replace(), under an exclusive lock on the live
+   file so no write is in progress. The rename is atomic, so readers see
+   either the old file or the new one. The previous file is kept as
+   <database>.previous for --rollback.
+4. Results are pre-rendered from the new file (unless --no-prewarm).
+
+Web processes notice the new inode within DATABASE_SWAP_CHECK_SECONDS and
+reconnect (see dbwatch.py). Both files use SQLite's default rollback
+journal, so the database is always a single file that can be renamed.
+
+    python shadow_import.py                  # build, validate, swap, pre-warm
+    python shadow_import.py --resume         # continue an interrupted build of the side file
+    python shadow_import.py --rollback       # swap the previous database back in
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from app import app, db
+from migrations import MIGRATIONS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LETTER_GRADES = ('S', 'A', 'B', 'C', 'D', 'E', 'F')
+
+
+def live_path():
+    with app.app_context():
+        return db.engine.url.database
+
+
+def build_shadow(shadow, resume=False, batch_size=None):
+    """Run final_import.py against the side file; True if it exited cleanly"""
+    if not resume:
+        for path in (shadow, shadow + '-journal'):
+            if os.path.exists(path):
+                os.remove(path)
+    command = [sys.executable, os.path.join(HERE, 'final_import.py'), '--no-prewarm']
+    if resume:
+        command.append('--resume')
+    if batch_size:
+        command += ['--batch-size', str(batch_size)]
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{shadow}")
+    return subprocess.run(command, cwd=HERE, env=env).returncode == 0
+
+
+def term_counts(conn):
+    return {(year, semester): count for year, semester, count in conn.execute(
+        "SELECT year, semester, COUNT(*) FROM enrollments GROUP BY year, semester")}
+
+
+def validate(shadow, live=None, max_shrink=0.1):
+    """Problems that should stop the swap (empty if none), and the enrollment counts per term"""
+    problems = []
+    conn = sqlite3.connect(f"file:{shadow}?mode=ro", uri=True)
+    try:
+        integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if integrity != 'ok':
+            return [f"integrity check failed: {integrity}"], {}
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+            problems.append("side file is in WAL mode; it must be a single file to be renamed")
+        if conn.execute("PRAGMA foreign_key_check").fetchone():
+            problems.append("rows reference missing students, enrollments or subjects")
+
+        applied = {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+        missing = [name for version, name, _ in MIGRATIONS if version not in applied]
+        if missing:
+            problems.append(f"schema is missing migrations: {', '.join(missing)}")
+
+        for source, done, total in conn.execute(
+                "SELECT source, rows_done, total_rows FROM import_checkpoints WHERE completed_at IS NULL"):
+            problems.append(f"{source} stopped after {done} of {total} rows (use --resume)")
+
+        checks = [
+            ("enrollments without any theory or lab result",
+             "SELECT COUNT(*) FROM enrollments e WHERE NOT EXISTS (SELECT 1 FROM theory_subjects t "
+             "WHERE t.enrollment_id = e.id) AND NOT EXISTS (SELECT 1 FROM lab_courses l WHERE l.enrollment_id = e.id)"),
+            ("theory marks outside 0-100", "SELECT COUNT(*) FROM theory_subjects WHERE marks NOT BETWEEN 0 AND 100"),
+            ("lab totals outside 0-100", "SELECT COUNT(*) FROM lab_courses WHERE total_marks NOT BETWEEN 0 AND 100"),
+            ("unknown grades",
+             f"SELECT (SELECT COUNT(*) FROM theory_subjects WHERE grade NOT IN {LETTER_GRADES}) "
+             f"+ (SELECT COUNT(*) FROM lab_courses WHERE grade NOT IN {LETTER_GRADES})"),
+            ("terms without a version", "SELECT COUNT(*) FROM (SELECT DISTINCT year, semester FROM enrollments) e "
+             "WHERE NOT EXISTS (SELECT 1 FROM term_versions v WHERE v.year = e.year AND v.semester = e.semester)"),
+        ]
+        for description, sql in checks:
+            count = conn.execute(sql).fetchone()[0]
+            if count:
+                problems.append(f"{count} {description}")
+
+        counts = term_counts(conn)
+    finally:
+        conn.close()
+
+    if not counts:
+        problems.append("no results were imported")
+    if live and os.path.exists(live):
+        conn = sqlite3.connect(f"file:{live}?mode=ro", uri=True)
+        try:
+            old_counts = term_counts(conn)
+        finally:
+            conn.close()
+        for (year, semester), old in sorted(old_counts.items()):
+            new = counts.get((year, semester), 0)
+            if new < old * (1 - max_shrink):
+                problems.append(f"Y{year}S{semester} would go from {old} to {new} students")
+    return problems, counts
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def swap(new, live, previous):
+    """Atomically make new the live database, keeping the replaced file as previous"""
+    if os.path.exists(new + '-journal'):
+        raise RuntimeError(f"{new} has an unfinished transaction")
+    _fsync(new)
+    lock = None
+    if os.path.exists(live):
+        # Waits for any write in progress and holds off new ones while the name changes
+        lock = sqlite3.connect(live, timeout=30, isolation_level=None)
+        lock.execute("BEGIN EXCLUSIVE")
+    try:
+        if lock is not None:
+            if os.path.exists(previous):
+                os.remove(previous)
+            os.link(live, previous)
+        os.replace(new, live)
+        _fsync(os.path.dirname(live))
+    finally:
+        if lock is not None:
+            lock.execute("ROLLBACK")  # releases the lock on the old file
+            lock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resume', action='store_true', help='continue building the existing side file')
+    parser.add_argument('--batch-size', type=int, help='students per commit while building')
+    parser.add_argument('--max-shrink', type=float, default=0.1,
+                        help='largest fraction of a term\'s students that may disappear (default 0.1)')
+    parser.add_argument('--force', action='store_true', help='swap even if validation found problems')
+    parser.add_argument('--no-prewarm', action='store_true', help='skip pre-rendering after the swap')
+    parser.add_argument('--rollback', action='store_true', help='swap the previous database back in')
+    args = parser.parse_args()
+
+    live = live_path()
+    shadow, previous = live + '.shadow', live + '.previous'
+
+    if args.rollback:
+        if not os.path.exists(previous):
+            parser.exit(1, f"No previous database at {previous}\n")
+        # The current file becomes the new .previous, so a rollback can itself be undone
+        restore = live + '.restore'
+        os.replace(previous, restore)
+        swap(restore, live, previous)
+        print(f"Restored the previous database into {live}")
+        return
+
+    print(f"Building {shadow}")
+    started = time.monotonic()
+    if not build_shadow(shadow, args.resume, args.batch_size):
+        parser.exit(1, "Import into the side file failed; the live database is unchanged. "
+                       "Fix the problem and re-run with --resume.\n")
+    built = time.monotonic()
+
+    problems, counts = validate(shadow, live, args.max_shrink)
+    for (year, semester), count in sorted(counts.items()):
+        print(f"Year {year}, Semester {semester}: {count} students")
+    if problems:
+        print("Validation found problems:")
+        for problem in problems:
+            print(f"  - {problem}")
+        if not args.force:
+            parser.exit(1, "Not swapped; the live database is unchanged (--force to swap anyway).\n")
+
+    swap(shadow, live, previous)
+    with app.app_context():
+        db.engine.dispose()  # this process's pooled connections still point at the old file
+    print(f"Swapped in the new database (built in {built - started:.1f}s; "
+          f"previous file kept as {os.path.basename(previous)})")
+
+    if not args.no_prewarm:
+        from prewarm import prewarm_terms
+        print("\n=== PRE-WARMING RESULTS ===")
+        prewarm_terms(sorted(counts))
+
+
+if __name__ == '__main__':
+    main()
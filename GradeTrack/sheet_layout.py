@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Header-driven column layout of result workbooks
+
+The importers used to hard-code positions (theory TOTALs in columns
+2, 4, 6, 8, 10 and labs every 4 columns from column 16, at most 3 labs).
+As a result they silently dropped the sixth subject of 2-1/2-2, the last
+two labs of 1-1, and read the 1-2 labs one column off. detect_layout()
+reads the header rows instead:
+
+    row with the subject and lab names (one per block, merged cells)
+    row with STUDENT ID, STUDENT NAME and each block's TOTAL/GRADE or
+    INTERNAL/EXTERNAL/TOTAL/GRADE columns
+
+A block with INTERNAL and EXTERNAL columns is a lab, and a block with only
+TOTAL is a theory subject. Layouts are cached by a fingerprint of the
+header rows, so sheets in the same format (every class of a term) are
+parsed once. extract() then converts all rows in one vectorized pass:
+blank and LONG ABSENT marks become NaN. Grades come from each block's
+GRADE column, which is the university's official grade. A grade is only
+derived from the marks when that cell is blank or not a letter grade.
+
+    python sheet_layout.py "attached_assets/1-2 SEMESTER RESULTS_1756310650480.xlsx"
+"""
+import hashlib
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from curriculum import GRADE_BANDS, LETTER_GRADES
+from profiling import phase
+
+HEADER_SCAN_ROWS = 10
+ID_HEADER = 'STUDENT ID'
+NAME_HEADER = 'STUDENT NAME'
+
+
+
+class LayoutError(ValueError):
+    """The header rows do not look like a result sheet"""
+
+
+@dataclass(frozen=True)
+class Block:
+    """One subject or lab: its name and the column of each role (TOTAL, GRADE, ...)"""
+    name: str
+    columns: tuple  # ((role, column index), ...)
+
+    def column(self, role):
+        return dict(self.columns).get(role)
+
+
+@dataclass(frozen=True)
+class SheetLayout:
+    fingerprint: str
+    header_row: int
+    id_column: int
+    name_column: int
+    theory: tuple
+    labs: tuple
+
+    @property
+    def first_data_row(self):
+        return self.header_row + 1
+
+
+@dataclass
+class SheetData:
+    """Rows of a sheet as arrays; marks are float with NaN for blank/absent"""
+    layout: SheetLayout
+    student_ids: list
+    names: list
+    theory: list  # one (marks, grades) pair per layout.theory block
+    labs: list    # one (internal, external, total, grades) tuple per layout.labs block
+
+
+_layouts = {}
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    return ' '.join(str(value).replace('\xa0', ' ').split())
+
+
+def header_fingerprint(rows):
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update('\x1f'.join(_text(v).upper() for v in row).encode())
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def _parse(rows, header_row, fingerprint):
+    roles = [_text(v).upper() for v in rows[header_row]]
+    names = [_text(v) for v in rows[header_row - 1]] if header_row else [''] * len(roles)
+    starts = [c for c, name in enumerate(names) if name and c > max(roles.index(ID_HEADER), 1)]
+
+    theory, labs = [], []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(roles)
+        columns = {}
+        for c in range(start, end):
+            if roles[c] and roles[c] not in columns:
+                columns[roles[c]] = c
+        block = Block(names[start], tuple(columns.items()))
+        if 'INTERNAL' in columns and 'EXTERNAL' in columns and 'TOTAL' in columns:
+            labs.append(block)
+        elif 'TOTAL' in columns:
+            theory.append(block)
+
+    if NAME_HEADER not in roles:
+        raise LayoutError(f"no {NAME_HEADER} column in header row {header_row}")
+    return SheetLayout(fingerprint, header_row, roles.index(ID_HEADER), roles.index(NAME_HEADER),
+                       tuple(theory), tuple(labs))
+
+
+def detect_layout(raw):
+    """Layout of a sheet read with header=None, cached by header fingerprint"""
+    top = raw.head(HEADER_SCAN_ROWS).values.tolist()
+    header_row = next((r for r, row in enumerate(top) if any(_text(v).upper() == ID_HEADER for v in row)), None)
+    if header_row is None:
+        raise LayoutError(f"no {ID_HEADER} header in the first {HEADER_SCAN_ROWS} rows")
+    fingerprint = header_fingerprint(top[:header_row + 1])
+    layout = _layouts.get(fingerprint)
+    if layout is None:
+        layout = _layouts[fingerprint] = _parse(top, header_row, fingerprint)
+    return layout
+
+
+def _marks(frame, column):
+    if column is None:
+        return np.full(len(frame), np.nan)
+    return pd.to_numeric(frame.iloc[:, column], errors='coerce').to_numpy(dtype=float)
+
+
+def _grades(frame, column, marks):
+    with phase('grading'):
+        derived = grades(marks)
+        if column is None:
+            return derived
+        sheet = frame.iloc[:, column].map(_text).str.upper().to_numpy()
+        return np.where(np.isin(sheet, LETTER_GRADES), sheet, derived)
+
+
+def _theory(frame, block):
+    marks = _marks(frame, block.column('TOTAL'))
+    return marks, _grades(frame, block.column('GRADE'), marks)
+
+
+def _lab(frame, block):
+    internal, external, total = (_marks(frame, block.column(role)) for role in ('INTERNAL', 'EXTERNAL', 'TOTAL'))
+    return internal, external, total, _grades(frame, block.column('GRADE'), total)
+
+
+def extract(raw, layout=None):
+    """All student rows of a sheet (read with header=None) as SheetData"""
+    layout = layout or detect_layout(raw)
+    data = raw.iloc[layout.first_data_row:]
+    ids = data.iloc[:, layout.id_column].map(_text)
+    names = data.iloc[:, layout.name_column].map(_text)
+    keep = ((ids != '') & (ids.str.lower() != 'nan') & (ids.str.upper() != ID_HEADER)
+            & (names != '') & (names.str.lower() != 'nan')).to_numpy()
+    data = data[keep]
+    return SheetData(
+        layout=layout,
+        student_ids=ids[keep].tolist(),
+        names=names[keep].tolist(),
+        theory=[_theory(data, block) for block in layout.theory],
+        labs=[_lab(data, block) for block in layout.labs],
+    )
+
+
+def read_raw(path):
+    """First sheet of a workbook as untyped cells, for detect_layout() and extract()"""
+    return pd.read_excel(path, header=None, dtype=object)
+
+
+def read_sheet(path):
+    return extract(read_raw(path))
+
+
+def grades(marks):
+    """Letter grades for a marks array; NaN (blank, absent) is F"""
+    conditions = [marks >= bound for bound, _ in GRADE_BANDS]
+    return np.select(conditions, [grade for _, grade in GRADE_BANDS], default='F')
+
+
+def stored_marks(marks):
+    """Marks as stored in the database: truncated to int, 0 when blank or absent"""
+    return np.nan_to_num(marks, nan=0).astype(int)
+
+
+def main():
+    for path in sys.argv[1:]:
+        sheet = read_sheet(path)
+        layout = sheet.layout
+        print(f"{path}: {len(sheet.student_ids)} students, header row {layout.header_row}, "
+              f"fingerprint {layout.fingerprint[:12]}")
+        for block in layout.theory:
+            print(f"  theory  {block.name:<50} {dict(block.columns)}")
+        for block in layout.labs:
+            print(f"  lab     {block.name:<50} {dict(block.columns)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Slow-query log with query plans
+
+With SLOW_QUERY_MS set (config or environment; 0 logs every statement),
+engine events time each statement. Statements over the threshold are
+appended as JSON lines to SLOW_QUERY_LOG (default
+instance/slow_queries.jsonl), with:
+
+- the normalized SQL: literals and IN/VALUES lists collapsed, so every
+  roll number's lookup is the same statement shape
+- the shape of the parameters (types, or rows x columns for executemany)
+- the duration and the call site (first frame in this app's code)
+- on SQLite, EXPLAIN QUERY PLAN the first time this process sees the
+  shape, with full-table scans listed separately
+
+The log rotates to <log>.1 at SLOW_QUERY_LOG_MAX_BYTES (10 MB). This
+script ranks statement shapes by total time:
+
+    python sqllog.py                  # top 20 shapes by total time
+    python sqllog.py --top 50 --log /path/to/slow_queries.jsonl
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(\(\?, \.\.\.\))(?:, \(\?, \.\.\.\))+")
+
+
+def normalize(statement):
+    """Statement shape: whitespace, literals and IN/VALUES lists collapsed"""
+    shape = ' '.join(statement.split())
+    shape = _STRING.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _LIST.sub('(?, ...)', shape)
+    return _ROWS.sub(r'\1, ...', shape)
+
+
+def fingerprint(shape):
+    return hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+def parameters_shape(parameters, executemany):
+    if executemany:
+        rows = list(parameters) if not isinstance(parameters, (list, tuple)) else parameters
+        width = len(rows[0]) if rows else 0
+        return f"{len(rows)} rows x {width}"
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def call_site():
+    """First frame in this app's code outside this module, as 'file.py:line in function'"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and not filename.endswith('sqllog.py'):
+            return f"{os.path.relpath(filename, APP_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def explain(dbapi_connection, statement, parameters, executemany):
+    """EXPLAIN QUERY PLAN lines on SQLite (indented by depth), or None if it cannot be explained"""
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    try:
+        rows = dbapi_connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    except Exception:
+        return None  # DDL, PRAGMA and friends have no plan
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return lines
+
+
+def scans(plan):
+    """Tables read in full: SCAN steps that use no index"""
+    tables = []
+    for line in plan or ():
+        step = line.strip()
+        if step.startswith('SCAN ') and ' INDEX ' not in step:
+            tables.append(step[len('SCAN '):].removeprefix('TABLE '))  # older SQLite says SCAN TABLE x
+    return tables
+
+
+class SlowQueryLog:
+    """Times statements through engine events and appends the slow ones to a JSON lines file"""
+
+    def __init__(self, path, threshold_ms, max_bytes=10 * 1024 * 1024):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.max_bytes = max_bytes
+        self.counters = {'statements': 0, 'slow': 0, 'plans': 0}
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def attach(self, engine):
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(self._local, 'started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self._local.started = None
+        self.counters['statements'] += 1
+        if elapsed < self.threshold:
+            return
+        shape = normalize(statement)
+        key = fingerprint(shape)
+        record = {
+            'at': datetime.utcnow().isoformat() + 'Z',
+            'fingerprint': key,
+            'sql': shape,
+            'params': parameters_shape(parameters, executemany),
+            'ms': round(elapsed * 1000, 3),
+            'rows': cursor.rowcount if cursor.rowcount >= 0 else None,
+            'site': call_site(),
+            'pid': os.getpid(),
+        }
+        with self._lock:
+            first = key not in self._seen
+            self._seen.add(key)
+            self.counters['slow'] += 1
+        if first and conn.dialect.name == 'sqlite':
+            record['plan'] = explain(cursor.connection, statement, parameters, executemany)
+            record['scans'] = scans(record['plan'])
+            self.counters['plans'] += 1
+        self.write(record)
+        logger.warning("Slow query %.1f ms at %s: %s", record['ms'], record['site'], shape[:200])
+
+    def write(self, record):
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            try:
+                if os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+            except FileNotFoundError:
+                pass
+            # Opened per record: other processes (workers) append to the same file
+            with open(self.path, 'a') as fh:
+                fh.write(line)
+
+
+def init_query_log(app):
+    """Attach a SlowQueryLog to the app's engine when SLOW_QUERY_MS is set"""
+    from app import db
+
+    env = os.environ.get('SLOW_QUERY_MS')
+    threshold = app.config.setdefault('SLOW_QUERY_MS', float(env) if env else None)
+    if threshold is None:
+        return None
+    query_log = SlowQueryLog(
+        app.config.setdefault('SLOW_QUERY_LOG', os.environ.get('SLOW_QUERY_LOG')
+                              or os.path.join(app.instance_path, 'slow_queries.jsonl')),
+        threshold, app.config.setdefault('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    with app.app_context():
+        query_log.attach(db.engine)
+    app.extensions['query_log'] = query_log
+    return query_log
+
+
+def read_log(path):
+    for name in (path + '.1', path):
+        try:
+            with open(name) as fh:
+                for line in fh:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # a line cut off by a crash
+        except FileNotFoundError:
+            continue
+
+
+def summarize(records):
+    """Statement shapes ranked by total time"""
+    shapes = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'sites': Counter(),
+                                  'sql': None, 'plan': None, 'scans': []})
+    for record in records:
+        shape = shapes[record['fingerprint']]
+        shape['count'] += 1
+        shape['total_ms'] += record['ms']
+        shape['max_ms'] = max(shape['max_ms'], record['ms'])
+        shape['sites'][record.get('site')] += 1
+        shape['sql'] = record['sql']
+        if record.get('plan') is not None:
+            shape['plan'], shape['scans'] = record['plan'], record.get('scans', [])
+    ranked = sorted(shapes.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+    return [dict(shape, fingerprint=key, mean_ms=shape['total_ms'] / shape['count']) for key, shape in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--log', help='log file (default: the app\'s SLOW_QUERY_LOG)')
+    parser.add_argument('--top', type=int, default=20, help='number of statement shapes to show')
+    args = parser.parse_args()
+
+    path = args.log
+    if path is None:
+        from app import app
+        path = app.config.get('SLOW_QUERY_LOG') or os.path.join(app.instance_path, 'slow_queries.jsonl')
+
+    summary = summarize(read_log(path))
+    if not summary:
+        print(f"No slow queries logged in {path}")
+        return
+    total = sum(shape['total_ms'] for shape in summary)
+    print(f"{len(summary)} statement shapes, {sum(s['count'] for s in summary)} slow executions, "
+          f"{total:.1f} ms in total ({path})\n")
+    for rank, shape in enumerate(summary[:args.top], 1):
+        print(f"{rank:>3}. {shape['total_ms']:10.1f} ms total  {shape['count']:>6} x  "
+              f"mean {shape['mean_ms']:.2f} ms  max {shape['max_ms']:.2f} ms  [{shape['fingerprint']}]")
+        print(f"     {shape['sql'][:300]}")
+        for site, count in shape['sites'].most_common(3):
+            print(f"     at {site} ({count}x)")
+        if shape['scans']:
+            print(f"     FULL SCAN: {', '.join(shape['scans'])}")
+        for line in shape['plan'] or ():
+            print(f"     | {line}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
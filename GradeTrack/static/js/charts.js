@@ -10,6 +10,12 @@ function initializePerformanceChart(chartData) {
         return;
     }
 
+    // Chart.js failed to load (offline CDN, blocked script): show the server-rendered image
+    if (typeof Chart === 'undefined') {
+        showChartFallback(ctx);
+        return;
+    }
+
     // Chart configuration matching the screenshot design
     const chart = new Chart(ctx, {
         type: 'bar',
@@ -169,6 +175,19 @@ function initializePerformanceChart(chartData) {
     return chart;
 }
 
+/**
+ * Swap the canvas for the server-rendered chart image
+ */
+function showChartFallback(canvas) {
+    const img = document.getElementById('performanceChartFallback');
+    if (!img) {
+        return;
+    }
+    img.src = img.dataset.src;
+    img.classList.remove('d-none');
+    canvas.classList.add('d-none');
+}
+
 /**
  * Initialize chart when DOM is loaded
  */
@@ -0,0 +1,45 @@
+/**
+ * Search form for the frozen static site (see freeze.py)
+ * Looks the roll number up in lookup.json instead of posting to /search
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.querySelector('form');
+    if (!form) {
+        return;
+    }
+    let lookup = null;
+
+    function showError(message) {
+        let alert = form.parentElement.querySelector('.alert');
+        if (!alert) {
+            alert = document.createElement('div');
+            alert.className = 'alert alert-danger';
+            alert.setAttribute('role', 'alert');
+            form.parentElement.insertBefore(alert, form);
+        }
+        alert.textContent = message;
+    }
+
+    form.addEventListener('submit', async function(event) {
+        event.preventDefault();
+        const studentId = form.student_id.value.trim();
+        const term = `${form.year.value}-${form.semester.value}`;
+
+        if (!lookup) {
+            try {
+                lookup = await (await fetch('/lookup.json')).json();
+            } catch (error) {
+                showError('Results could not be loaded. Please try again.');
+                return;
+            }
+        }
+
+        const terms = lookup[studentId] || [];
+        if (!terms.includes(term)) {
+            showError('Student not found for the specified year and semester.');
+            return;
+        }
+        window.location.href = `/result/${encodeURIComponent(studentId)}/${form.year.value}/${form.semester.value}/`;
+    });
+});